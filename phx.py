@@ -0,0 +1,328 @@
+# Author: Phoenix Geohysics Ltd.
+# Creation: 2026-10-18
+
+# One entry point for the recording and stats tools. Only argparse is imported up front, each command imports the
+# modules it needs, and "serve" runs many commands read from stdin in the same interpreter. The phxrec*.py scripts only
+# call run() with their command, so the options and output of each recording tool live here.
+import argparse as ap
+import os, sys, shlex
+
+## Line printed after each command in serve mode, followed by the exit status of the command
+SERVE_DONE = "#done"
+## Stats commands and their script in the phxstatsfile folder, which parses the rest of the command line itself so the
+## folder keeps working on its own
+STATS_SCRIPTS = {"tojson": "phxstatstojson", "statsshrink": "phxstatsshrink", "statsmerge": "phxstatsmerge",
+                 "survey": "phxstatssurvey"}
+
+def dir_path(path):
+    if os.path.isdir(path):
+        return path
+    else:
+        raise ap.ArgumentTypeError(f"readable_dir:{path} is not a valid path")
+
+def file_path(path):
+    if os.path.isfile(path):
+        return path
+    else:
+        raise ap.ArgumentTypeError(f"readable_file:{path} is not a valid path")
+
+def out_path(path):
+    if os.path.isdir(os.path.dirname(path) or "."):
+        return path
+    else:
+        raise ap.ArgumentTypeError(f"readable_dir:{path} is not a valid path")
+
+def segment_length(text):
+    """! Parse a data file length: seconds for every extension, or extension=seconds pairs separated by commas"""
+    try:
+        if "=" not in text:
+            return int(text)
+        return {extension.strip(): int(seconds) for extension, seconds in (pair.split("=") for pair in text.split(","))}
+    except ValueError:
+        raise ap.ArgumentTypeError(f"{text} is not a number of seconds or a list of extension=seconds")
+
+def cmd_recid(args):
+    import phxrecording as phrec
+    print(phrec.getrecid(args.id, args.start))
+    return 0
+
+def cmd_start(args):
+    import phxrecording as phrec
+    print(phrec.recmetafile_getstarttimestamp(os.path.join(args.inpath, "recmeta.json")))
+    return 0
+
+def cmd_recmeta(args):
+    import phxrecording as phrec
+    written = phrec.recmetafile_changestartstop(args.inpath, args.outpath, args.start, args.stop)
+    print(written)
+    return 0 if written else 1
+
+def cmd_filelist(args):
+    import phxrecording as phrec
+    print("\n".join(phrec.shrink_sourcefilelist(args.inpath, args.start, args.stop, args.duration)))
+    if args.gaps:
+        for folder, extension, gapstart, gapstop in phrec.recording_segmentindex(args.inpath, args.duration).gaps(args.start, args.stop):
+            print(f"Gap in {folder}/*.{extension}: {gapstart} - {gapstop}")
+    return 0
+
+def cmd_finish(args):
+    import phxrecording as phrec
+    print(phrec.shrink_destfilerename(args.inpath, args.outpath, args.start, args.stop, args.duration))
+    phrec.shrink_moddatafilerecid(args.outpath, args.start, args.verify)
+    return 0
+
+def cmd_shrink(args):
+    import phxrecording as phrec
+    result = phrec.shrink_recording(args.inpath, args.outpath, args.start, args.stop, args.jobs,
+                                    args.maxinflight * 1024 * 1024, args.link, args.trim, args.checksum,
+                                    args.journal, args.duration)
+    if "error" in result:
+        print("Error:", result["error"])
+        return 1
+    for phase, seconds in result["timing"].items():
+        print(f"{phase}: {seconds:.3f}s")
+    print(result["files"], "files written.")
+    if result.get("resumed"):
+        print(result["resumed"], "of them were already finished by an earlier run.")
+    print("New recording created at", result["destpath"])
+    return 0
+
+def cmd_merge(args):
+    import phxrecording as phrec
+    result = phrec.merge_recordings(args.inpaths, args.outpath, args.jobs, args.link, args.checksum, args.duration)
+    if "error" in result:
+        print("Error:", result["error"])
+        return 1
+    for phase, seconds in result["timing"].items():
+        print(f"{phase}: {seconds:.3f}s")
+    print(result["files"], "files written.")
+    print("New recording created at", result["destpath"])
+    return 0
+
+def cmd_batch(args):
+    import phxrecording as phrec
+    import json
+    def print_progress(finished, total, result):
+        if "error" in result:
+            print(f"[{finished}/{total}] FAILED {result['source']}: {result['error']}")
+        else:
+            print(f"[{finished}/{total}] {result['source']} -> {result['destpath']} ({sum(result['timing'].values()):.3f}s)")
+    results = phrec.shrink_batch(phrec.shrink_readmanifest(args.manifest), args.processes, args.jobs, 0, args.link,
+                                 print_progress, args.trim, args.checksum, args.journal, args.duration)
+    failed = [result for result in results if "error" in result]
+    print(len(results) - len(failed), "jobs finished,", len(failed), "failed.")
+    if args.report:
+        with open(args.report, "w") as file:
+            file.write(json.dumps(results, indent="\t"))
+    return 1 if len(failed) > 0 else 0
+
+def cmd_verify(args):
+    import phxrecording as phrec
+    result = phrec.recording_verify(args.inpath, args.jobs)
+    if "error" in result:
+        print("Error:", result["error"])
+        return 1
+    for name in result["missing"]:
+        print("MISSING", name)
+    for name in result["mismatch"]:
+        print("MISMATCH", name)
+    failed = len(result["missing"]) + len(result["mismatch"])
+    print(result["checked"], "files checked with", result["algorithm"] + ",", failed, "failed.")
+    return 1 if failed > 0 else 0
+
+def cmd_find(args):
+    import phxrecording as phrec
+    index = phrec.archive_index(args.inpath, args.index, args.rebuild, args.depth, args.jobs)
+    found = index.covering(args.start, args.stop, args.instruments)
+    for record in found:
+        print(record["instrument"], record["start"], record["stop"], record["rec_status"], record["path"])
+    for record in index.records:
+        if "error" in record:
+            print("Error:", record["path"], record["error"])
+    print(len(found), "of", len(index.records), "recordings found.")
+    return 0
+
+def cmd_stats(args):
+    import importlib
+    script = importlib.import_module("phxstatsfile." + STATS_SCRIPTS[args.command])
+    return script.main(args.extras, "phx " + args.command)
+
+def cmd_serve(args):
+    """! Run one command per stdin line, printing SERVE_DONE and its exit status after each, until end of input or exit"""
+    for line in sys.stdin:
+        line = line.strip()
+        if line == "" or line.startswith("#"):
+            continue
+        if line in ("exit", "quit"):
+            break
+        argv = shlex.split(line, posix=(os.name != "nt"))
+        if os.name == "nt":
+            argv = [arg[1:-1] if len(arg) > 1 and arg[0] == arg[-1] == '"' else arg for arg in argv]
+        if len(argv) > 0 and argv[0] == "serve":
+            status = 2
+            print("serve can not be nested")
+        else:
+            status = run(argv)
+        print(SERVE_DONE, status, flush=True)
+    return 0
+
+def add_window(parser, required=True):
+    parser.add_argument('-s', '--start', dest='start', type=int, default=0, required=required,
+                        help='New recording start time in unix timestamp')
+    parser.add_argument('-e', '--stop', dest='stop', type=int, default=0, required=required,
+                        help='New recording stop time in unix timestamp')
+
+def add_segment(parser):
+    # Same default as phxrecording.DATAFILE_DURATION, repeated so building the parser does not import phxrecording
+    parser.add_argument('-L', '--segment', dest='duration', type=segment_length, default=360,
+                        help='Seconds covered by each data file, or extension=seconds pairs such as td_24k=360,td_150=3600, '
+                             'default 360')
+
+def add_copy(parser):
+    # The link modes and default checksum are repeated here so building the parser does not import phxrecording
+    parser.add_argument('-j', '--jobs', dest='jobs', type=int, default=1,
+                        help='Number of data files copied at the same time, default 1')
+    parser.add_argument('-l', '--link', dest='link', choices=("copy", "hard", "reflink"), default='copy',
+                        help='How unchanged data files are put into the new recording, default copy')
+    parser.add_argument('-t', '--trim', dest='trim', action='store_true',
+                        help='Allow start and stop inside a data file')
+    parser.add_argument('-c', '--checksum', dest='checksum', nargs='?', const="blake2b", default=None,
+                        help='Write a manifest.json of checksums computed while copying, default blake2b')
+    parser.add_argument('-J', '--journal', dest='journal', action='store_true',
+                        help='Stage the new recording and journal the finished files, so running it again after a crash resumes')
+    add_segment(parser)
+
+def build_parser():
+    parser = ap.ArgumentParser(prog='phx', description='Tools for managing Phoenix instrument recordings and stats files.')
+    parser.add_argument('--profile', dest='profile',
+                        help='Write the time, bytes and file counts of each phase to this JSON file')
+    commands = parser.add_subparsers(dest='command', metavar='command', required=True)
+    common = ap.ArgumentParser(add_help=False)
+    common.add_argument('--profile', dest='profile', default=ap.SUPPRESS,
+                        help='Write the time, bytes and file counts of each phase to this JSON file')
+
+    sub = commands.add_parser('recid', parents=[common], help='Get the recording ID from the instrument ID and start timestamp')
+    sub.add_argument('-i', '--id', dest='id', type=int, required=True, help='Instrument ID')
+    sub.add_argument('-s', '--start', dest='start', type=int, required=True, help='Start time in unix timestamp')
+    sub.set_defaults(func=cmd_recid)
+
+    sub = commands.add_parser('start', parents=[common], help='Get the start timestamp of a recording')
+    sub.add_argument('-i', '--infile', dest='inpath', type=dir_path, required=True, help='Recording path')
+    sub.set_defaults(func=cmd_start)
+
+    sub = commands.add_parser('recmeta', parents=[common], help='Change the start and stop time of a recmeta.json')
+    sub.add_argument('-i', '--infile', dest='inpath', type=file_path, required=True, help='Source recmeta.json path')
+    sub.add_argument('-o', '--outfile', dest='outpath', type=out_path, required=True, help='Output recmeta.json path')
+    add_window(sub, False)
+    sub.set_defaults(func=cmd_recmeta)
+
+    sub = commands.add_parser('filelist', parents=[common], help='List the files a shrinked recording needs')
+    sub.add_argument('-i', '--infile', dest='inpath', type=dir_path, required=True, help='Recording path')
+    add_window(sub)
+    sub.add_argument('-g', '--gaps', dest='gaps', action='store_true', help='Also report the time ranges with no data file')
+    add_segment(sub)
+    sub.set_defaults(func=cmd_filelist)
+
+    sub = commands.add_parser('finish', parents=[common], help='Rename the copied files and change their recording ID')
+    sub.add_argument('-i', '--infile', dest='inpath', type=dir_path, required=True, help='Source recording path')
+    sub.add_argument('-o', '--outfile', dest='outpath', type=dir_path, required=True, help='Destination recording path')
+    add_window(sub)
+    sub.add_argument('-v', '--verify', dest='verify', action='store_true', help='Read the recording IDs back after changing them')
+    add_segment(sub)
+    sub.set_defaults(func=cmd_finish)
+
+    sub = commands.add_parser('shrink', parents=[common], help='Make a shrinked copy of a recording with new start and stop time')
+    sub.add_argument('-i', '--infile', dest='inpath', type=dir_path, required=True, help='Source recording path')
+    sub.add_argument('-o', '--outfile', dest='outpath', type=dir_path, required=True, help='Folder to create the new recording in')
+    add_window(sub)
+    sub.add_argument('-b', '--maxinflight', dest='maxinflight', type=int, default=0,
+                     help='Maximum MB of data files being copied at the same time, default 0 (no limit)')
+    add_copy(sub)
+    sub.set_defaults(func=cmd_shrink)
+
+    sub = commands.add_parser('merge', parents=[common], help='Join consecutive recordings of one instrument into one recording')
+    sub.add_argument('-i', '--infile', dest='inpaths', type=dir_path, nargs='+', required=True, help='Source recording paths')
+    sub.add_argument('-o', '--outfile', dest='outpath', type=dir_path, required=True, help='Folder to create the new recording in')
+    sub.add_argument('-j', '--jobs', dest='jobs', type=int, default=1,
+                     help='Number of data files copied at the same time, default 1')
+    sub.add_argument('-l', '--link', dest='link', choices=("copy", "hard", "reflink"), default='copy',
+                     help='How unchanged data files are put into the new recording, default copy')
+    sub.add_argument('-c', '--checksum', dest='checksum', nargs='?', const="blake2b", default=None,
+                     help='Write a manifest.json of checksums computed while copying, default blake2b')
+    add_segment(sub)
+    sub.set_defaults(func=cmd_merge)
+
+    sub = commands.add_parser('batch', parents=[common], help='Shrink the recordings listed in a CSV or JSON manifest')
+    sub.add_argument('-m', '--manifest', dest='manifest', type=file_path, required=True, help='Manifest file path')
+    sub.add_argument('-p', '--processes', dest='processes', type=int, default=None,
+                     help='Number of recordings shrinked at the same time, default the number of CPUs')
+    sub.add_argument('-r', '--report', dest='report', help='Write the per job results to this JSON file')
+    add_copy(sub)
+    sub.set_defaults(func=cmd_batch)
+
+    sub = commands.add_parser('verify', parents=[common], help='Check a recording against its manifest.json')
+    sub.add_argument('-i', '--infile', dest='inpath', type=dir_path, required=True, help='Recording path')
+    sub.add_argument('-j', '--jobs', dest='jobs', type=int, default=4, help='Number of files checked at the same time, default 4')
+    sub.set_defaults(func=cmd_verify)
+
+    sub = commands.add_parser('find', parents=[common], help='Find the recordings of an archive with data in a time range')
+    sub.add_argument('-i', '--infile', dest='inpath', type=dir_path, required=True, help='Archive path')
+    sub.add_argument('-s', '--start', dest='start', type=int, default=0, help='Start of the time range in unix timestamp')
+    sub.add_argument('-e', '--stop', dest='stop', type=int, default=2**63,
+                     help='End of the time range in unix timestamp, default no end')
+    sub.add_argument('-n', '--instrument', dest='instruments', action='append',
+                     help='Only list the recordings of this instrument ID, can be given more than once')
+    sub.add_argument('-x', '--index', dest='index',
+                     help='Load the archive index from this JSON file, scanning the archive and saving it when missing')
+    sub.add_argument('-r', '--rebuild', dest='rebuild', action='store_true',
+                     help='Scan the archive and save the index file even when it exists')
+    sub.add_argument('-d', '--depth', dest='depth', type=int, default=3,
+                     help='Folder levels below the archive path searched for recordings, default 3')
+    sub.add_argument('-j', '--jobs', dest='jobs', type=int, default=16,
+                     help='Number of folders listed or recmeta.json read at the same time, default 16')
+    sub.set_defaults(func=cmd_find)
+
+    for command, help in (('tojson', 'Convert a stats file to JSON'),
+                          ('statsshrink', 'Pick a subset of minutes of a stats file into a new stats file'),
+                          ('statsmerge', 'Join consecutive stats files into one, filling the minutes between them'),
+                          ('survey', 'Combine the stats files of all recordings in a survey folder into one table')):
+        sub = commands.add_parser(command, help=help + ', see phx.py ' + command + ' -h', add_help=False)
+        sub.set_defaults(func=cmd_stats)
+
+    sub = commands.add_parser('serve', help='Read commands from stdin, one per line, and run them in this process')
+    sub.set_defaults(func=cmd_serve)
+    return parser
+
+def run(argv):
+    """! Run one command line
+
+    @param argv The command line arguments, without the program name
+    @return The exit status
+    """
+    parser = build_parser()
+    try:
+        args, extras = parser.parse_known_args(argv)
+        if len(extras) > 0 and args.func is not cmd_stats:
+            parser.error("unrecognized arguments: " + " ".join(extras))
+        args.extras = extras
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) else 2
+    profile = None
+    if args.profile:
+        from phxstatsfile import phxstatsfile as stats
+        profile = stats.Profile()
+        stats.addhook(profile)
+    try:
+        return args.func(args)
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) else 2
+    except (IOError, OSError, ValueError, KeyError) as e:
+        print("Error:", e)
+        return 1
+    finally:
+        if profile is not None:
+            stats.removehook(profile)
+            profile.tojsonfile(args.profile)
+
+if __name__ == "__main__":
+    sys.exit(run(sys.argv[1:]))
@@ -0,0 +1,204 @@
+# Author: Phoenix Geohysics Ltd.
+# Creation: 2026-10-18
+
+import phxrecording as phrec
+from phxstatsfile import phxstatsfile as stats
+import argparse as ap
+import json, os, struct, time, tempfile, random, datetime, zoneinfo
+import multiprocessing as mp
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Synthetic data generators
+def make_stats(filepath, minutes, channels, starttime=1715188093, instid=10766):
+    """! Write a synthetic stats file
+
+    @param filepath the path to the stats file to write
+    @param minutes number of minute blocks
+    @param channels number of channels
+    @return number of bytes written
+    """
+    header = bytearray(stats.MHEADER_SIZE)
+    header[0], header[1] = 0x16, 0x01
+    header[2:2 + len(str(instid))] = str(instid).encode()
+    struct.pack_into('I', header, 10, starttime)
+    header[14] = channels
+    rng = random.Random(minutes * 1000 + channels)
+    block = bytearray(stats.HEADER_SIZE + stats.PAYLOAD_SIZE * channels)
+    with open(filepath, "wb") as file:
+        written = file.write(header)
+        for i in range(minutes):
+            struct.pack_into(stats.MIN_FORMAT, block, stats.HEADER_SIZE - 4, 40, 12000 + i % 1000)
+            for j in range(channels):
+                low, high = -rng.random(), rng.random()
+                struct.pack_into(stats.CHAN_FORMAT, block, stats.HEADER_SIZE + stats.PAYLOAD_SIZE * j,
+                                 j, low, high, (low + high) / 2, i % 3 == 0, i % 5 == 0)
+            written += file.write(block)
+    return written
+
+def make_recording(parent, minutes, channels, segsize, starttime=1715188093, instid=10766,
+                   extensions=("td_24k", "td_150")):
+    """! Write a synthetic recording folder: recmeta.json, stats, and channel folders of data files
+
+    @param parent the folder to create the recording in
+    @param minutes recording duration in minutes, rounded down to whole data files
+    @param channels number of channels
+    @param segsize size of each data file in bytes
+    @return the recording path
+    """
+    start_str = datetime.datetime.fromtimestamp(starttime, zoneinfo.ZoneInfo("UTC")).strftime("%Y-%m-%d-%H%M%S")
+    recpath = os.path.join(parent, str(instid) + "_" + start_str)
+    os.makedirs(recpath)
+    num_files = minutes * 60 // phrec.DATAFILE_DURATION
+    stop = starttime + num_files * phrec.DATAFILE_DURATION
+    with open(os.path.join(recpath, "recmeta.json"), "w") as file:
+        file.write(json.dumps({phrec.JSON_NAME_RECSTATS: "completed", phrec.JSON_NAME_START: starttime,
+                               phrec.JSON_NAME_STOP: stop, phrec.JSON_NAME_ACQ: stop - starttime}, indent="\t"))
+    make_stats(os.path.join(recpath, "stats"), minutes, channels, starttime, instid)
+    data = bytearray(os.urandom(segsize))
+    struct.pack_into('I', data, phrec.DATAFILE_RECID_OFFSET, starttime)
+    for channel in range(channels):
+        os.makedirs(os.path.join(recpath, str(channel)))
+        for seq in range(1, num_files + 1):
+            for ext in extensions:
+                name = f"{instid}_{starttime:X}_{channel}_{seq:08X}.{ext}"
+                with open(os.path.join(recpath, str(channel), name), "wb") as file:
+                    file.write(data)
+    return recpath
+
+# Benchmarks, each returns (bytes processed, minutes processed)
+def bench_getstatsinfo(ctx):
+    stats.getstatsinfo(ctx["stats"])
+    return os.path.getsize(ctx["stats"]), ctx["minutes"]
+
+def bench_getstatsdata(ctx):
+    stats.getstatsdata(ctx["stats"])
+    return os.path.getsize(ctx["stats"]), ctx["minutes"]
+
+def bench_tojsonfile(ctx):
+    stats.tojsonfile(ctx["stats"], os.path.join(ctx["work"], "stats.json"))
+    return os.path.getsize(ctx["stats"]), ctx["minutes"]
+
+def bench_shrinkto(ctx):
+    written = stats.shrinkto(ctx["stats"], os.path.join(ctx["work"], "stats_shrinked"), 1, ctx["minutes"] - 1)
+    return written, ctx["minutes"] - 1
+
+def bench_shrinkcopyto(ctx):
+    written = stats.shrinkcopyto(ctx["stats"], os.path.join(ctx["work"], "stats_shrinked"), 1, ctx["minutes"] - 1)
+    return written, ctx["minutes"] - 1
+
+def bench_shrink_sourcefilelist(ctx):
+    phrec.shrink_sourcefilelist(ctx["recording"], *ctx["window"])
+    return 0, (ctx["window"][1] - ctx["window"][0]) // 60
+
+def bench_shrink_recording(ctx):
+    destparent = tempfile.mkdtemp(dir=ctx["work"])
+    phrec.shrink_recording(ctx["recording"], destparent, *ctx["window"], jobs=ctx["jobs"])
+    size = 0
+    for root, dirs, files in os.walk(destparent):
+        size += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return size, (ctx["window"][1] - ctx["window"][0]) // 60
+
+BENCHMARKS = {
+    "getstatsinfo": bench_getstatsinfo,
+    "getstatsdata": bench_getstatsdata,
+    "tojsonfile": bench_tojsonfile,
+    "shrinkto": bench_shrinkto,
+    "shrinkcopyto": bench_shrinkcopyto,
+    "shrink_sourcefilelist": bench_shrink_sourcefilelist,
+    "shrink_recording": bench_shrink_recording,
+}
+
+def peak_rss_mb():
+    """! Peak resident memory of the current process in MB, None where the resource module is not available"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KB elsewhere
+    return peak / (1024 * 1024) if os.uname().sysname == "Darwin" else peak / 1024
+
+def run_one(name, ctx, repeat, queue):
+    """! Run a benchmark in its own process so the peak memory belongs to it only"""
+    best = None
+    for i in range(repeat):
+        begin = time.perf_counter()
+        size, minutes = BENCHMARKS[name](ctx)
+        elapsed = time.perf_counter() - begin
+        best = elapsed if best is None else min(best, elapsed)
+    queue.put({"seconds": best, "mb_per_s": size / (1024 * 1024) / best if best > 0 else 0,
+               "minutes_per_s": minutes / best if best > 0 else 0, "peak_rss_mb": peak_rss_mb()})
+
+def run_benchmarks(names, minutes, channels, segsize, repeat=3, jobs=1):
+    """! Generate the synthetic data and run the benchmarks
+
+    @return dictionary of benchmark name to its result dictionary
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as work:
+        starttime = 1715188093
+        ctx = {"work": work, "minutes": minutes, "jobs": jobs, "stats": os.path.join(work, "stats")}
+        make_stats(ctx["stats"], minutes, channels, starttime)
+        ctx["recording"] = make_recording(work, minutes, channels, segsize, starttime)
+        window_len = max(1, (minutes * 60 // phrec.DATAFILE_DURATION) // 2) * phrec.DATAFILE_DURATION
+        ctx["window"] = (starttime + phrec.DATAFILE_DURATION, starttime + phrec.DATAFILE_DURATION + window_len)
+        for name in names:
+            queue = mp.Queue()
+            process = mp.Process(target=run_one, args=(name, ctx, repeat, queue))
+            process.start()
+            results[name] = queue.get()
+            process.join()
+    return results
+
+def compare(results, baseline, tolerance):
+    """! Compare results against a baseline
+
+    @return array of (benchmark name, baseline seconds, seconds) for the benchmarks slower than the baseline by more than tolerance
+    """
+    regressions = []
+    for name, result in results.items():
+        if name in baseline and result["seconds"] > baseline[name]["seconds"] * (1 + tolerance):
+            regressions.append((name, baseline[name]["seconds"], result["seconds"]))
+    return regressions
+
+if __name__ == "__main__":
+    parser = ap.ArgumentParser(description='Benchmark stats decoding, JSON export and recording shrink on synthetic data.')
+    parser.add_argument('-m', '--minutes', dest='minutes', type=int, default=1440,
+                        help='Duration of the synthetic recording in minutes, default 1440')
+    parser.add_argument('-c', '--channels', dest='channels', type=int, default=5,
+                        help='Number of channels, default 5')
+    parser.add_argument('--segsize', dest='segsize', type=int, default=1024 * 1024,
+                        help='Size of each synthetic data file in bytes, default 1MB')
+    parser.add_argument('-r', '--repeat', dest='repeat', type=int, default=3,
+                        help='Runs of each benchmark, the fastest counts, default 3')
+    parser.add_argument('-j', '--jobs', dest='jobs', type=int, default=1,
+                        help='Copy jobs for the shrink_recording benchmark, default 1')
+    parser.add_argument('-b', '--baseline', dest='baseline',
+                        help='Baseline JSON file to compare against')
+    parser.add_argument('-t', '--tolerance', dest='tolerance', type=float, default=0.2,
+                        help='Slowdown against the baseline reported as regression, default 0.2 (20%%)')
+    parser.add_argument('-s', '--save', dest='save',
+                        help='Save the results as JSON, to be used as a baseline later')
+    parser.add_argument('names', nargs='*',
+                        help='Benchmarks to run, all by default: ' + ", ".join(BENCHMARKS))
+    args = parser.parse_args()
+    for name in args.names:
+        if name not in BENCHMARKS:
+            parser.error(f"unknown benchmark {name}")
+
+    results = run_benchmarks(args.names or list(BENCHMARKS), args.minutes, args.channels, args.segsize, args.repeat, args.jobs)
+    print(f"{'benchmark':<24}{'seconds':>10}{'MB/s':>10}{'min/s':>14}{'peak RSS MB':>14}")
+    for name, result in results.items():
+        rss = f"{result['peak_rss_mb']:.1f}" if result["peak_rss_mb"] is not None else "-"
+        print(f"{name:<24}{result['seconds']:>10.4f}{result['mb_per_s']:>10.1f}{result['minutes_per_s']:>14.0f}{rss:>14}")
+    if args.save:
+        with open(args.save, "w") as file:
+            file.write(json.dumps(results, indent="\t"))
+    if args.baseline:
+        with open(args.baseline, "rb") as file:
+            regressions = compare(results, json.loads(file.read()), args.tolerance)
+        for name, before, after in regressions:
+            print(f"REGRESSION {name}: {before:.4f}s -> {after:.4f}s")
+        if len(regressions) > 0:
+            raise SystemExit(1)
@@ -9,10 +9,75 @@ JSON_NAME_RECSTATS = "rec_status"
 JSON_NAME_ACQ = "acqtime"
 JSON_NAME_START = "start"
 JSON_NAME_STOP = "stop"
+## Files other than data files that a shrinked recording keeps
+SHRINK_EXTRA_FILES = ["backend.log","executor.log","kern.pri","config.json","recmeta.json.bak"]
+## Duration of each data file in seconds
+DATAFILE_DURATION = 360
+## Offset of the recording ID(start time unix timestamp) in the time series data file header
+DATAFILE_RECID_OFFSET = 20
+## Offsets in the time series data file header, as read by the Phoenix readers(PhoenixGeoPy, mth5): header
+## length(uint16), sample rate base(uint16) and exponent(int8), rate = base * 10 ** exponent, bytes per sample(uint8)
+## and frame size(uint32)
+DATAFILE_HEADERLENGTH_OFFSET = 2
+DATAFILE_SAMPLERATE_OFFSET = 59
+DATAFILE_BYTESPERSAMPLE_OFFSET = 62
+DATAFILE_FRAMESIZE_OFFSET = 63
+## The frame size in bytes is in the low 3 bytes of the frame size word, its top byte holds the footer flags
+DATAFILE_FRAMESIZE_MASK = 0xFFFFFF
+## Size of the status footer closing each frame of the native(24 bit sample) data files
+DATAFILE_FRAME_FOOTER = 4
+## Extensions of the native data files, made of frames. The decimated continuous files(td_150, td_30) hold their samples
+## one after the other, without frames
+DATAFILE_NATIVE_EXTENSIONS = ["bin"]
+## Extensions of the decimated segmented data files, whose segments each start with their own sub-header
+DATAFILE_SEGMENTED_EXTENSIONS = ["td_24k", "td_2400"]
+## Ways to put an unchanged data file into a shrinked recording
+LINK_MODES = ("copy", "hard", "reflink")
+## Columns of a batch shrink manifest
+MANIFEST_COLUMNS = ["source", "dest", "start", "stop"]
+## Recording index sidecar file kept in the recording folder, its format version, and the environment variable naming a
+## folder to keep the indexes in instead, for read-only recordings
+RECINDEX_FILENAME = ".phxrecindex.json"
+RECINDEX_VERSION = 2
+RECINDEX_DIR_ENV = "PHXRECINDEX_DIR"
+## Integrity manifest written into a shrinked recording, its format version and default checksum algorithm. Any hashlib
+## algorithm can be used, and xxh3_64/xxh3_128/xxh64 when xxhash is installed
+CHECKSUM_MANIFEST_FILENAME = "manifest.json"
+CHECKSUM_MANIFEST_VERSION = 1
+CHECKSUM_ALGORITHM = "blake2b"
+## Folder levels below an archive root searched for recordings, and the recmeta.json fields kept by the archive index
+ARCHIVE_SEARCH_DEPTH = 3
+ARCHIVE_FIELDS = (JSON_NAME_START, JSON_NAME_STOP, JSON_NAME_ACQ, JSON_NAME_RECSTATS)
+## Journaled shrink: suffix of the staging folder made next to the new recording, the journal file kept in it and the
+## suffix of a file being written
+SHRINK_STAGE_SUFFIX = ".partial"
+SHRINK_JOURNAL_FILENAME = ".phxshrink.journal"
+SHRINK_PART_SUFFIX = ".part"
+## Default number of blocking file system calls an async function runs at the same time
+ASYNC_CONCURRENCY = 16
+## Linux ioctl request to clone a file's extents (reflink), from linux/fs.h
+FICLONE = 0x40049409
 
 # Lib Dependencies
-import json, struct, datetime, zoneinfo, os, math, fnmatch
-from pathlib import Path
+import struct, os, sys, math, bisect
+from phxstatsfile import phxstatsfile as stats
+## Modules only some of the functions use, imported on first use so getting a recording ID or start time stays quick
+json = stats.LazyModule("json")
+datetime = stats.LazyModule("datetime")
+zoneinfo = stats.LazyModule("zoneinfo")
+fnmatch = stats.LazyModule("fnmatch")
+shutil = stats.LazyModule("shutil")
+threading = stats.LazyModule("threading")
+csv = stats.LazyModule("csv")
+hashlib = stats.LazyModule("hashlib")
+pathlib = stats.LazyModule("pathlib")
+contextlib = stats.LazyModule("contextlib")
+asyncio = stats.LazyModule("asyncio")
+futures = stats.LazyModule("concurrent.futures")
+fractions = stats.LazyModule("fractions")
+## Optional modules, None when not available on this platform or not installed
+fcntl = stats.lazyimport("fcntl")
+xxhash = stats.lazyimport("xxhash")
 
 def getrecid(instid, starttime):
     """! Generate recording ID from instrument ID and start time
@@ -101,97 +166,477 @@ def recmetafile_changestartstop(rjfilepath, savepath, start=0, stop=0):
             print(e)
         return 0
     
-def datafile_modrecid(filepath, starttime):
+def archive_scan(rootpath, depth=ARCHIVE_SEARCH_DEPTH, jobs=16):
+    """! Find all the recordings under an archive folder and read their recmeta.json, with a pool of worker threads.
+    The folders of each level are listed at the same time, a folder holding a recmeta.json is a recording and is not
+    searched further, and hidden folders(such as the staging folders of journaled shrinks) are skipped.
+
+    @param rootpath The archive folder to search
+    @param depth How many folder levels below rootpath to search
+    @param jobs Number of folders listed or recmeta.json read at the same time
+    @return An array of recording dictionaries of the path, instrument ID and the ARCHIVE_FIELDS of recmeta.json, or the
+            error, sorted by path
+    """
+    def list_folder(folder):
+        try:
+            return list(os.scandir(folder))
+        except (IOError, OSError) as e:
+            if DEBUG:
+                print(e)
+            return []
+    def read_recmeta(recpath):
+        record = {"path": recpath, "instrument": os.path.basename(recpath).split("_")[0]}
+        try:
+            with open(os.path.join(recpath, "recmeta.json"), "rb") as file:
+                rj = json.loads(file.read())
+            record.update((name, rj.get(name)) for name in ARCHIVE_FIELDS)
+        except (IOError, OSError, ValueError) as e:
+            record["error"] = str(e)
+        return record
+
+    recpaths = []
+    folders = [rootpath]
+    with stats.span("archive.scan") as sp, futures.ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        for level in range(depth + 1):
+            subfolders = []
+            for folder, entries in zip(folders, executor.map(list_folder, folders)):
+                if any(entry.name == "recmeta.json" and entry.is_file() for entry in entries):
+                    recpaths.append(folder)
+                elif level < depth:
+                    subfolders.extend(entry.path for entry in entries if entry.is_dir() and not entry.name.startswith("."))
+            folders = subfolders
+        records = list(executor.map(read_recmeta, sorted(recpaths)))
+        sp.add(files=len(records))
+    return records
+
+class ArchiveIndex:
+    """! Interval index of the recordings of an archive, see archive_scan. The recordings of each instrument are kept
+    sorted by start time with the running maximum of their stop times, so the recordings overlapping a time range are
+    found with two binary searches per instrument. A recording without stop time is taken as still recording.
+    """
+
+    def __init__(self, records):
+        """! @param records An array of recording dictionaries from archive_scan, the ones with an error or no start time
+        are kept in records but not indexed
+        """
+        self.records = records
+        self._instruments = {}
+        for record in sorted(records, key=lambda record: (record.get(JSON_NAME_START) or 0)):
+            if "error" in record or not isinstance(record.get(JSON_NAME_START), int):
+                continue
+            starts, maxstops, indexed = self._instruments.setdefault(record["instrument"], ([], [], []))
+            stop = record.get(JSON_NAME_STOP) or math.inf
+            starts.append(record[JSON_NAME_START])
+            maxstops.append(max(stop, maxstops[-1]) if len(maxstops) > 0 else stop)
+            indexed.append(record)
+
+    @property
+    def instruments(self):
+        return sorted(self._instruments)
+
+    def covering(self, t0, t1, instruments=None):
+        """! Find the recordings with data in [t0, t1)
+
+        @param t0 Start of the time range, unix timestamp integer
+        @param t1 End of the time range(excluded), unix timestamp integer
+        @param instruments Only search the recordings of these instrument IDs, None searches all
+        @return An array of recording dictionaries, by instrument ID and start time
+        """
+        found = []
+        for instrument in sorted(self._instruments if instruments is None else set(map(str, instruments))):
+            if instrument not in self._instruments:
+                continue
+            starts, maxstops, indexed = self._instruments[instrument]
+            # Before first every stop is <= t0, from last every start is >= t1
+            first = bisect.bisect_right(maxstops, t0)
+            last = bisect.bisect_left(starts, t1)
+            found.extend(record for record in indexed[first:last] if (record.get(JSON_NAME_STOP) or math.inf) > t0)
+        return found
+
+    def save(self, indexpath):
+        """! Save the recordings to a JSON file, to be loaded again with ArchiveIndex.load"""
+        with open(indexpath, "w") as file:
+            return file.write(json.dumps(self.records, indent="\t"))
+
+    @classmethod
+    def load(cls, indexpath):
+        with open(indexpath, "rb") as file:
+            return cls(json.loads(file.read()))
+
+def archive_index(rootpath, indexpath=None, rebuild=False, depth=ARCHIVE_SEARCH_DEPTH, jobs=16):
+    """! Get the interval index of the recordings under an archive folder, from a saved index file when there is one.
+    Note: The saved index is not checked against the archive, rebuild it after recordings are added or changed.
+
+    @param rootpath The archive folder to search
+    @param indexpath A JSON file to load the index from, and save it to after scanning the archive, None always scans
+    @param rebuild Scan the archive even when the index file exists
+    @param depth How many folder levels below rootpath to search, see archive_scan
+    @param jobs Number of folders listed or recmeta.json read at the same time, see archive_scan
+    @return An ArchiveIndex
+    """
+    if indexpath is not None and not rebuild:
+        try:
+            return ArchiveIndex.load(indexpath)
+        except (IOError, OSError, ValueError):
+            pass
+    index = ArchiveIndex(archive_scan(rootpath, depth, jobs))
+    if indexpath is not None:
+        index.save(indexpath)
+    return index
+
+def datafile_modrecid(filepath, starttime, verify=False):
     """! Change recording ID(start time unix timestamp) in time series data file header
+    Only the 4 bytes of the recording ID are rewritten, the rest of the file is not touched.
 
     @param filepath The absolute path to the data file
     @param starttime The start time of the recording, unix timestamp integer
+    @param verify Read the recording ID back after writing and report an error if it does not match
     @return Error message or number of bytes written
     """
     try:
-        with open(filepath, "rb") as file:
-            data_file = file.read()
-        bin_arr = bytearray(data_file)
-        struct.pack_into('I', bin_arr, 20, starttime)
-        with open(filepath, 'wb') as file:
-            return file.write(bytes(bin_arr))
+        with open(filepath, "r+b") as file:
+            file.seek(DATAFILE_RECID_OFFSET)
+            written = file.write(struct.pack('I', starttime))
+            if verify:
+                file.flush()
+                file.seek(DATAFILE_RECID_OFFSET)
+                if struct.unpack('I', file.read(4))[0] != starttime:
+                    if DEBUG:
+                        print("Recording ID verification failed:", filepath)
+                    return "Error: recording ID verification failed: " + filepath
+            return written
     except (IOError, OSError) as e:
         if DEBUG:
             print(e)
         return e
 
-def shrink_sourcefilelist(recpath, start, stop):
+def recording_listchannels(recpath):
+    """! List all the channel folders of a recording and the files inside them
+
+    @param recpath The absolute path to the recording
+    @return A dictionary of channel folder name to the list of file names in that folder
+    """
+    return { f.name: os.listdir(f.path) for f in os.scandir(recpath) if f.is_dir() }
+
+def datafile_parsename(filename):
+    """! Split a time series data file name, such as 10399_6835442E_0_000000F1.td_24k, into its parts
+
+    @param filename The data file name
+    @return Dictionary of the instrument ID, recording start time(unix timestamp integer), channel, sequence number(first
+            file is 1) and extension, None if it is not a data file name
+    """
+    stem, dot, extension = filename.partition(".")
+    parts = stem.split("_")
+    if dot == "" or extension == "" or len(parts) != 4:
+        return None
+    try:
+        return {"instrument": parts[0], "start": int(parts[1], 16), "channel": parts[2], "seq": int(parts[3], 16),
+                "extension": extension}
+    except ValueError:
+        return None
+
+def channel_summary(localfilelist):
+    """! Summarize the data files of one channel folder
+
+    @param localfilelist The file names in the channel folder
+    @return Dictionary of the file base name(instrument, start time and channel part), the file extensions, the first
+            and last sequence number, the number of files and the data file names of each extension sorted by sequence
+    """
+    segments = {}
+    for file in localfilelist:
+        parts = datafile_parsename(file)
+        if parts is not None:
+            segments.setdefault(parts["extension"], []).append((parts["seq"], file))
+    seqs = [seq for files in segments.values() for seq, file in files]
+    return {
+        "basename": pathlib.Path(localfilelist[0]).stem[:17] if len(localfilelist) > 0 else "",
+        "extensions": sorted(set(file.split('.')[-1] for file in localfilelist)),
+        "firstseq": min(seqs, default=0),
+        "lastseq": max(seqs, default=0),
+        "count": len(localfilelist),
+        "segments": { extension: [file for seq, file in sorted(files)] for extension, files in sorted(segments.items()) },
+    }
+
+def recording_indexmtimes(recpath, channels):
+    """! Modification times the recording index depends on: the recording folder, its channel folders, recmeta.json and stats
+
+    @param recpath The absolute path to the recording
+    @param channels The channel folder names
+    @return Dictionary of name to modification time in ns, None for the ones that do not exist
+    """
+    mtimes = {}
+    for name in [".", "recmeta.json", "stats"] + list(channels):
+        try:
+            mtimes[name] = os.stat(os.path.join(recpath, name)).st_mtime_ns
+        except (IOError, OSError):
+            mtimes[name] = None
+    return mtimes
+
+def recording_indexpath(recpath, indexdir=None):
+    """! Path of the recording index file of a recording, see recording_index
+
+    @param recpath The absolute path to the recording
+    @param indexdir Folder to keep the index in, named after the recording and a hash of its path. None uses the folder
+                    named by the RECINDEX_DIR_ENV environment variable, or the sidecar in the recording folder when not set
+    @return The index file path
+    """
+    indexdir = indexdir or os.environ.get(RECINDEX_DIR_ENV)
+    if not indexdir:
+        return os.path.join(recpath, RECINDEX_FILENAME)
+    abspath = os.path.abspath(recpath)
+    return os.path.join(indexdir, os.path.basename(abspath) + "_" + hashlib.sha1(abspath.encode()).hexdigest()[:12] + ".json")
+
+def recording_buildindex(recpath, indexdir=None):
+    """! Scan a recording and save the recording index, see recording_index. When the index can not be saved(e.g. a
+    read-only recording without indexdir) it is still returned, the error is only reported on stderr in debug mode.
+
+    @param recpath The absolute path to the recording
+    @param indexdir Folder to keep the index in, see recording_indexpath
+    @return The recording index dictionary
+    """
+    indexpath = recording_indexpath(recpath, indexdir)
+    try:
+        if indexpath != os.path.join(recpath, RECINDEX_FILENAME):
+            os.makedirs(os.path.dirname(indexpath), exist_ok=True)
+        # Create the sidecar before taking the folder mtime, rewriting it later does not change the folder mtime
+        elif not os.path.exists(indexpath):
+            open(indexpath, "w").close()
+    except (IOError, OSError) as e:
+        if DEBUG:
+            print(e, file=sys.stderr)
+
+    with stats.span("recording.scan") as sp:
+        listing = recording_listchannels(recpath)
+        sp.add(files=sum(len(localfilelist) for localfilelist in listing.values()))
+    index = {"indexversion": RECINDEX_VERSION, "mtimes": recording_indexmtimes(recpath, listing)}
+    with open(os.path.join(recpath, "recmeta.json"), "rb") as file:
+        rj = json.loads(file.read())
+    for name in (JSON_NAME_START, JSON_NAME_STOP, JSON_NAME_ACQ, JSON_NAME_RECSTATS):
+        index[name] = rj.get(name)
+    index["channels"] = { folder: channel_summary(localfilelist) for folder, localfilelist in listing.items() }
+    statsinfo = stats.getstatsinfo(os.path.join(recpath, "stats"))
+    index["stats"] = None if stats.JSON_NAME_ERROR in statsinfo else statsinfo
+
+    try:
+        with open(indexpath, "w") as file:
+            file.write(json.dumps(index, indent="\t"))
+    except (IOError, OSError) as e:
+        if DEBUG:
+            print(e, file=sys.stderr)
+    return index
+
+def recording_index(recpath, rebuild=False, indexdir=None):
+    """! Get the recording index: channel folders with their data file base name, extensions and sequence range, the
+    start/stop/acqtime/rec_status from recmeta.json and the stats header information.
+    The index is cached in a sidecar file in the recording folder, or in indexdir, and rebuilt when the recording folder,
+    a channel folder, recmeta.json or stats has been modified since, so most calls cost a few stat calls instead of
+    directory listings.
+
+    @param recpath The absolute path to the recording
+    @param rebuild Ignore the cached index and scan the recording again
+    @param indexdir Folder to keep the index in instead of the recording folder, see recording_indexpath
+    @return The recording index dictionary
+    """
+    if not rebuild:
+        try:
+            with open(recording_indexpath(recpath, indexdir), "rb") as file:
+                index = json.loads(file.read())
+            if index.get("indexversion") == RECINDEX_VERSION and \
+                    index["mtimes"] == recording_indexmtimes(recpath, index["channels"]):
+                return index
+        except (IOError, OSError, ValueError, KeyError, AttributeError):
+            pass
+    return recording_buildindex(recpath, indexdir)
+
+class SegmentIndex:
+    """! Time index of the data files of a recording, built from the file names found on disk.
+    A data file covers [recording start + (sequence - 1) * duration, + duration), the files of each channel folder and
+    extension are kept sorted by start time so the files of a time range are found by binary search.
+    """
+
+    def __init__(self, channels, duration=DATAFILE_DURATION):
+        """! @param channels The "channels" of the recording index, see recording_index
+        @param duration Seconds covered by each data file, or a dictionary of extension to seconds for recordings whose
+                        extensions have different file lengths
+        """
+        self.duration = duration
+        ## (channel folder, extension) to (sorted start times, file names)
+        self.segments = {}
+        for folder, summary in channels.items():
+            for extension, files in summary.get("segments", {}).items():
+                length = self.segmentlength(extension)
+                starts = []
+                for file in files:
+                    parts = datafile_parsename(file)
+                    starts.append(parts["start"] + (parts["seq"] - 1) * length)
+                self.segments[(folder, extension)] = (starts, files)
+
+    def segmentlength(self, extension):
+        """! Seconds covered by each data file of an extension"""
+        if isinstance(self.duration, dict):
+            return self.duration.get(extension, DATAFILE_DURATION)
+        return self.duration
+
+    def covering(self, t0, t1):
+        """! Find the data files that have data in [t0, t1)
+
+        @param t0 Start of the time range, unix timestamp integer
+        @param t1 End of the time range(excluded), unix timestamp integer
+        @return An array of (channel folder, extension, file name, file start time), by channel folder, extension and time,
+                the channel folders in the order of the recording index
+        """
+        found = []
+        for (folder, extension), (starts, files) in self.segments.items():
+            length = self.segmentlength(extension)
+            first = bisect.bisect_right(starts, t0) - 1
+            if first < 0 or starts[first] + length <= t0:
+                first += 1
+            last = bisect.bisect_left(starts, t1)
+            found.extend((folder, extension, files[i], starts[i]) for i in range(first, last))
+        return found
+
+    def gaps(self, t0, t1):
+        """! Find the parts of [t0, t1) no data file covers, for each channel folder and extension
+
+        @return An array of (channel folder, extension, gap start, gap stop), the gap stop is excluded
+        """
+        missing = []
+        for (folder, extension), (starts, files) in self.segments.items():
+            length = self.segmentlength(extension)
+            cursor = t0
+            first = max(bisect.bisect_right(starts, t0) - 1, 0)
+            for segstart in starts[first:bisect.bisect_left(starts, t1)]:
+                if segstart > cursor:
+                    missing.append((folder, extension, cursor, segstart))
+                cursor = max(cursor, segstart + length)
+            if cursor < t1:
+                missing.append((folder, extension, cursor, t1))
+        return missing
+
+def recording_segmentindex(recpath, duration=DATAFILE_DURATION):
+    """! Get the time index of the data files of a recording, see SegmentIndex
+
+    @param recpath The absolute path to the recording
+    @param duration Seconds covered by each data file, or a dictionary of extension to seconds
+    @return A SegmentIndex
+    """
+    return SegmentIndex(recording_index(recpath)["channels"], duration)
+
+def shrink_datafilenames(channels, org_starttime, start, stop, duration=DATAFILE_DURATION):
+    """! Get the data file names a shrinked recording needs, together with their names in the shrinked recording.
+    Only the files found on disk are listed: the files with data in [start, stop), renumbered from the file holding start.
+
+    @param channels The "channels" of the recording index, see recording_index
+    @param org_starttime The start time of the source recording, unix timestamp integer
+    @param start The start time of the targeting recording, unix timestamp integer
+    @param stop The stop time of the targeting recording, unix timestamp integer
+    @param duration Seconds covered by each data file, or a dictionary of extension to seconds
+    @return An array of (channel folder, source file name, destination file name)
+    """
+    index = SegmentIndex(channels, duration)
+    folders = list(channels)
+    namelist = []
+    # Same order as the files are numbered: each channel folder, by time, then by extension
+    for folder, extension, srcfilename, segstart in sorted(index.covering(start, stop),
+                                                           key=lambda found: (folders.index(found[0]), found[3], found[1])):
+        parts = datafile_parsename(srcfilename)
+        length = index.segmentlength(extension)
+        seq = parts["seq"] - (start - org_starttime) // length
+        destfilename = f'{parts["instrument"]}_{start:X}_{parts["channel"]}_{seq:08X}.{extension}'
+        namelist.append((folder, srcfilename, destfilename))
+    return namelist
+
+def shrink_trimfilenames(recpath, channels, org_starttime, start, stop, duration=DATAFILE_DURATION):
+    """! Plan a shrinked recording whose start and stop are not on the data file boundaries of the source recording.
+    The new data files are laid out from start, each is made of the end of one source file and the beginning of the next,
+    and the last one ends at stop. Each source file is cut at the start of the frame holding the point in time, using the
+    layout read from its own header, see datafile_layout.
+
+    @param recpath The absolute path to the source recording
+    @param channels The "channels" of the recording index, see recording_index
+    @param org_starttime The start time of the source recording, unix timestamp integer
+    @param start The start time of the targeting recording, unix timestamp integer
+    @param stop The stop time of the targeting recording, unix timestamp integer
+    @param duration Seconds covered by each data file, or a dictionary of extension to seconds
+    @return An array of (channel folder, destination file name, array of (source file name, data offset, number of bytes)),
+            or the error of the first source file whose layout can not be read
+    """
+    index = SegmentIndex(channels, duration)
+    layouts = {}
+    plan = []
+    for folder in channels:
+        for (segfolder, extension), (starts, files) in index.segments.items():
+            if segfolder != folder or len(files) == 0:
+                continue
+            length = index.segmentlength(extension)
+            parts = datafile_parsename(files[0])
+            for seq in range(1, math.ceil((stop - start) / length) + 1):
+                t0 = start + (seq - 1) * length
+                t1 = min(t0 + length, stop)
+                pieces = []
+                for found in index.covering(t0, t1):
+                    if found[0] != folder or found[1] != extension:
+                        continue
+                    srcfilename, segstart = found[2], found[3]
+                    if srcfilename not in layouts:
+                        layouts[srcfilename] = datafile_layout(os.path.join(recpath, folder, srcfilename))
+                    layout = layouts[srcfilename]
+                    if "error" in layout:
+                        return layout
+                    # Start of the frame holding each point in time, so consecutive new files share no frame
+                    offset = math.floor(max(t0 - segstart, 0) * layout["framespersecond"]) * layout["framesize"]
+                    end = math.floor(min(t1 - segstart, length) * layout["framespersecond"]) * layout["framesize"]
+                    end = min(end, layout["datalength"])
+                    pieces.append((srcfilename, offset, max(end - offset, 0)))
+                if len(pieces) > 0:
+                    destfilename = f'{parts["instrument"]}_{start:X}_{parts["channel"]}_{seq:08X}.{extension}'
+                    plan.append((folder, destfilename, pieces))
+    return plan
+
+def shrink_sourcefilelist(recpath, start, stop, duration=DATAFILE_DURATION):
     """! Get a path list(relative path) of all the files required to copy for a shrinked recording
 
     @param recpath The absolute path to the source recording
     @param start The start time of the targeting recording, unix timestamp integer
     @param stop The stop time of the targeting recording, unix timestamp integer
+    @param duration Seconds covered by each data file, or a dictionary of extension to seconds
     @return An array of file paths relative to the source recording path(no slash at the begining)
     """
-    filelist = ["backend.log","executor.log","kern.pri","config.json","recmeta.json.bak"]
-    subfolders = [ f.path for f in os.scandir(recpath) if f.is_dir() ]
-
-    # Find all unique file extensions 
-    file_extensions = set()
-    for file in os.listdir(subfolders[0]):
-        file_extensions.add(file.split('.')[-1])
+    with stats.span("shrink.filelist") as sp:
+        filelist = list(SHRINK_EXTRA_FILES)
+        index = recording_index(recpath)
 
-    # Add the needed data files
-    org_starttime = recmetafile_getstarttimestamp(os.path.join(recpath, "recmeta.json"))
-    start_offset = start - org_starttime
-    start_seq = math.floor(start_offset / 360) # 6min of data each file
-    seq_len = math.floor((stop - start) / 360)
-    for folder in subfolders:
-        localfilelist = os.listdir(folder)
-        if len(localfilelist) > 0:
-            basename = Path(localfilelist[0]).stem[:17]
-            for i in range(seq_len):
-                for ext in file_extensions:
-                    filename = (basename + f'{format(start_seq+i+1,"x"):0>8}' + '.' ).upper()
-                    filename += ext
-                    filelist.append(os.path.join(folder[-1], filename))
+        # Add the needed data files
+        for folder, srcfilename, destfilename in shrink_datafilenames(index["channels"], index[JSON_NAME_START], start, stop,
+                                                                      duration):
+            filelist.append(os.path.join(folder, srcfilename))
+        sp.add(files=len(filelist))
     return filelist
 
-def shrink_destfilerename(recpath, destpath, start, stop):
+def shrink_destfilerename(recpath, destpath, start, stop, duration=DATAFILE_DURATION):
     """! Rename the copied files after shrink to match the naming rules of a Phoenix recording.
 
     @param recpath The absolute path to the source recording
     @param destpath The absolute path to the destination recording
     @param start The start time of the targeting recording, unix timestamp integer
     @param stop The stop time of the targeting recording, unix timestamp integer
+    @param duration Seconds covered by each data file, or a dictionary of extension to seconds
     @return Error message or finished message
     """
-    subfolders = [ f.path for f in os.scandir(recpath) if f.is_dir() ]
-
-    # Find all unique file extensions 
-    file_extensions = set()
-    for file in os.listdir(subfolders[0]):
-        file_extensions.add(file.split('.')[-1])
-
-    # Add the needed data files
-    org_starttime = recmetafile_getstarttimestamp(os.path.join(recpath, "recmeta.json"))
-    start_offset = start - org_starttime
-    start_seq = int(start_offset / 360) # 6min of data each file
-    seq_len = int((stop - start) / 360)
-    for folder in subfolders:
-        localfilelist = os.listdir(folder)
-        os.chdir(os.path.join(destpath, folder[-1]))
-        if len(localfilelist) > 0:
-            basename = Path(localfilelist[0]).stem[:17]
-            for i in range(seq_len):
-                for ext in file_extensions:
-                    srcfilename = (basename + f'{format(start_seq+i+1,"x"):0>8}' + '.').upper() 
-                    srcfilename += ext
-                    destfilename = (basename.replace(format(org_starttime, 'x').upper(), format(start, 'x')) + f'{format(i+1,"x"):0>8}' + '.').upper()
-                    destfilename += ext                    
-                    os.rename(srcfilename, destfilename)
+    with stats.span("shrink.rename") as sp:
+        index = recording_index(recpath)
+        for folder, srcfilename, destfilename in shrink_datafilenames(index["channels"], index[JSON_NAME_START], start, stop,
+                                                                      duration):
+            os.rename(os.path.join(destpath, folder, srcfilename), os.path.join(destpath, folder, destfilename))
+            sp.add(files=1)
     return "Rename finished."
 
-def shrink_moddatafilerecid(destpath, start):
+def shrink_moddatafilerecid(destpath, start, verify=False):
     """! Change all the necessary files' recording ID(start time unix timestamp) in time series data file header
 
     @param destpath The absolute path to the destination folder
     @param start The start time of the targeting recording, unix timestamp integer
+    @param verify Read every recording ID back after writing, see datafile_modrecid
     @return Number of files modified
     """
     subfolders = [ f.path for f in os.scandir(destpath) if f.is_dir() ]
@@ -206,7 +651,911 @@ def shrink_moddatafilerecid(destpath, start):
                     first_filepath = os.path.join(root, name)
                     break
         if found: 
-            datafile_modrecid(first_filepath, start)
-            file_count += 1
+            with stats.span("shrink.patch") as sp:
+                if isinstance(datafile_modrecid(first_filepath, start, verify), int):
+                    file_count += 1
+                    sp.add(bytes_written=4, files=1)
     print(file_count, "files modified.")
-    return 
\ No newline at end of file
+    return file_count
+
+def datafile_copy(srcpath, destpath, starttime=0, hasher=None):
+    """! Copy a time series data file, changing the recording ID(start time unix timestamp) in its header on the way
+
+    @param srcpath The absolute path to the source data file
+    @param destpath The absolute path to the destination data file
+    @param starttime The new recording start time, unix timestamp integer. 0 keeps the header unchanged
+    @param hasher A hashlib like object updated with the bytes written, see stats.copyrange
+    @return Number of bytes written
+    """
+    if starttime == 0 and hasher is None:
+        shutil.copyfile(srcpath, destpath)
+        return os.path.getsize(destpath)
+    with open(srcpath, "rb") as srcfile, open(destpath, "wb", buffering=0) as destfile:
+        header = bytearray()
+        if starttime != 0:
+            header = bytearray(srcfile.read(DATAFILE_RECID_OFFSET + 4))
+            struct.pack_into('I', header, DATAFILE_RECID_OFFSET, starttime)
+        written = destfile.write(header)
+        if hasher is not None:
+            hasher.update(header)
+        return written + stats.copyrange(srcfile, destfile, len(header), os.fstat(srcfile.fileno()).st_size - len(header), hasher)
+
+def datafile_layout(filepath):
+    """! Get the byte layout of a time series data file from its header, to find the bytes of a point in time.
+    A native data file frame holds the samples of a whole number of sample periods, followed by a DATAFILE_FRAME_FOOTER
+    bytes footer when the samples do not fill the frame exactly. Data can only be cut on frame boundaries. A decimated
+    continuous data file is taken as frames of one sample.
+
+    @param filepath The absolute path to the data file
+    @return Dictionary of the header length, frame size, data length and frames per second(a Fraction), or the error
+    """
+    try:
+        with open(filepath, "rb") as file:
+            header = file.read(DATAFILE_FRAMESIZE_OFFSET + 4)
+            size = os.fstat(file.fileno()).st_size
+    except (IOError, OSError) as e:
+        return {"error": e}
+    parts = datafile_parsename(os.path.basename(filepath))
+    if parts is not None and parts["extension"] in DATAFILE_SEGMENTED_EXTENSIONS:
+        return {"error": "Error: segmented data file " + filepath + " can not be cut by time"}
+    if len(header) < DATAFILE_FRAMESIZE_OFFSET + 4:
+        return {"error": "Error: data file " + filepath + " is too short"}
+    header_length = struct.unpack_from('<H', header, DATAFILE_HEADERLENGTH_OFFSET)[0]
+    rate_base, rate_exponent = struct.unpack_from('<Hb', header, DATAFILE_SAMPLERATE_OFFSET)
+    bytes_per_sample = header[DATAFILE_BYTESPERSAMPLE_OFFSET]
+    frame_size = struct.unpack_from('<I', header, DATAFILE_FRAMESIZE_OFFSET)[0] & DATAFILE_FRAMESIZE_MASK
+    if parts is not None and parts["extension"] not in DATAFILE_NATIVE_EXTENSIONS:
+        frame_size = bytes_per_sample
+    if header_length < DATAFILE_FRAMESIZE_OFFSET + 4 or header_length > size:
+        return {"error": "Error: data file " + filepath + " has an invalid header length " + str(header_length)}
+    if rate_base == 0 or bytes_per_sample == 0 or frame_size == 0:
+        return {"error": "Error: data file " + filepath + " has no sample rate, sample size or frame size"}
+    if frame_size % bytes_per_sample == 0:
+        samples_per_frame = frame_size // bytes_per_sample
+    elif frame_size > DATAFILE_FRAME_FOOTER and (frame_size - DATAFILE_FRAME_FOOTER) % bytes_per_sample == 0:
+        samples_per_frame = (frame_size - DATAFILE_FRAME_FOOTER) // bytes_per_sample
+    else:
+        return {"error": "Error: data file " + filepath + " frame size " + str(frame_size) +
+                         " does not hold whole samples of " + str(bytes_per_sample) + " bytes"}
+    return {"headerlength": header_length, "framesize": frame_size, "datalength": size - header_length,
+            "framespersecond": fractions.Fraction(rate_base) * fractions.Fraction(10) ** rate_exponent / samples_per_frame}
+
+def datafile_trimcopy(pieces, destpath, starttime=0, hasher=None):
+    """! Write a time series data file made of byte ranges of other data files, keeping the header of the first one.
+    Only the given ranges are read, through copyrange.
+
+    @param pieces An array of (source path, data offset, number of bytes), the offsets are after the header
+    @param destpath The absolute path to the destination data file
+    @param starttime The new recording start time written to the header, unix timestamp integer. 0 keeps it unchanged
+    @param hasher A hashlib like object updated with the bytes written, see stats.copyrange
+    @return Number of bytes written
+    """
+    with open(destpath, "wb", buffering=0) as destfile:
+        written = 0
+        for i, (srcpath, offset, count) in enumerate(pieces):
+            with open(srcpath, "rb") as srcfile:
+                header_length = struct.unpack_from('H', srcfile.read(DATAFILE_HEADERLENGTH_OFFSET + 2), DATAFILE_HEADERLENGTH_OFFSET)[0]
+                if i == 0:
+                    srcfile.seek(0)
+                    header = bytearray(srcfile.read(header_length))
+                    if starttime != 0:
+                        struct.pack_into('I', header, DATAFILE_RECID_OFFSET, starttime)
+                    written += destfile.write(header)
+                    if hasher is not None:
+                        hasher.update(header)
+                if count > 0:
+                    written += stats.copyrange(srcfile, destfile, header_length + offset, count, hasher)
+        return written
+
+def datafile_link(srcpath, destpath, link="hard"):
+    """! Put a data file into the destination without copying its data, as a hard link or a reflink(copy-on-write clone).
+    Note: a hard linked file shares its data with the source, so it must never be modified in place.
+
+    @param srcpath The absolute path to the source data file
+    @param destpath The absolute path to the destination data file
+    @param link "hard" or "reflink"
+    @return True if the link is made, False if the file system or platform does not support it
+    """
+    try:
+        if os.path.lexists(destpath):
+            os.remove(destpath)
+        if link == "hard":
+            os.link(srcpath, destpath)
+            return True
+        if link == "reflink" and fcntl is not None:
+            with open(srcpath, "rb") as srcfile, open(destpath, "wb") as destfile:
+                try:
+                    fcntl.ioctl(destfile.fileno(), FICLONE, srcfile.fileno())
+                    return True
+                except OSError:
+                    pass
+            os.remove(destpath)
+    except (IOError, OSError) as e:
+        if DEBUG:
+            print(e)
+    return False
+
+class ByteBudget:
+    """! Limit how many bytes the copy workers have in flight at the same time"""
+
+    def __init__(self, limit=0):
+        """! @param limit Maximum number of bytes in flight, 0 means no limit"""
+        self.limit = limit
+        self.inflight = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, size):
+        """! Wait until size bytes fit in the budget and reserve them. A file larger than the whole budget waits until
+        nothing else is in flight.
+
+        @return The number of bytes reserved, to be given back to release
+        """
+        if self.limit <= 0:
+            return 0
+        size = min(size, self.limit)
+        with self._condition:
+            self._condition.wait_for(lambda: self.inflight == 0 or self.inflight + size <= self.limit)
+            self.inflight += size
+        return size
+
+    def release(self, size):
+        if self.limit <= 0:
+            return
+        with self._condition:
+            self.inflight -= size
+            self._condition.notify_all()
+
+def checksum_new(algorithm=CHECKSUM_ALGORITHM):
+    """! Get a new hashlib like object of a checksum algorithm, see CHECKSUM_ALGORITHM"""
+    if algorithm.startswith("xxh"):
+        if xxhash is None:
+            raise ValueError("Checksum algorithm " + algorithm + " needs the xxhash package")
+        return getattr(xxhash, algorithm)()
+    return hashlib.new(algorithm)
+
+def checksum_file(filepath, algorithm=CHECKSUM_ALGORITHM):
+    """! Read a file once and get its checksum
+
+    @return (file size, checksum hex string)
+    """
+    hasher = checksum_new(algorithm)
+    size = 0
+    with open(filepath, "rb") as file:
+        while True:
+            chunk = file.read(stats.COPY_CHUNK_SIZE)
+            if not chunk:
+                break
+            hasher.update(chunk)
+            size += len(chunk)
+    return size, hasher.hexdigest()
+
+class ChecksumManifest:
+    """! Checksums of the files of a recording, added while the files are written and saved as CHECKSUM_MANIFEST_FILENAME"""
+
+    def __init__(self, recpath, algorithm=CHECKSUM_ALGORITHM):
+        """! @param recpath The absolute path to the recording the files are written to
+        @param algorithm The checksum algorithm, see CHECKSUM_ALGORITHM
+        """
+        checksum_new(algorithm)
+        self.recpath = recpath
+        self.algorithm = algorithm
+        self.files = {}
+        self._lock = threading.Lock()
+
+    def new(self):
+        """! Get a new hashlib like object to checksum a file with"""
+        return checksum_new(self.algorithm)
+
+    def add(self, filepath, size, checksum):
+        """! Add the size and checksum hex string of a file of the recording"""
+        name = os.path.relpath(filepath, self.recpath).replace(os.sep, "/")
+        with self._lock:
+            self.files[name] = {"size": size, "checksum": checksum}
+
+    def save(self):
+        """! Write the manifest into the recording folder
+
+        @return Number of bytes written
+        """
+        manifest = {"version": CHECKSUM_MANIFEST_VERSION, "algorithm": self.algorithm,
+                    "files": dict(sorted(self.files.items()))}
+        with open(os.path.join(self.recpath, CHECKSUM_MANIFEST_FILENAME), "w") as file:
+            return file.write(json.dumps(manifest, indent="\t"))
+
+def recording_verify(recpath, jobs=4):
+    """! Check the files of a recording against its checksum manifest, reading each file at most once with a pool of
+    worker threads. A file whose size does not match is reported without being read.
+
+    @param recpath The absolute path to the recording
+    @param jobs Number of files checked at the same time
+    @return Dictionary of the checksum algorithm, the number of files checked and the arrays of missing and mismatching
+            file names, or the error
+    """
+    try:
+        with open(os.path.join(recpath, CHECKSUM_MANIFEST_FILENAME), "rb") as file:
+            manifest = json.loads(file.read())
+        algorithm = manifest["algorithm"]
+        checksum_new(algorithm)
+    except (IOError, OSError, ValueError, KeyError) as e:
+        if DEBUG:
+            print(e)
+        return {"error": e}
+
+    def check_one(item):
+        name, expected = item
+        filepath = os.path.join(recpath, *name.split("/"))
+        try:
+            if os.path.getsize(filepath) != expected["size"]:
+                return name, "mismatch"
+            size, checksum = checksum_file(filepath, algorithm)
+        except (IOError, OSError):
+            return name, "missing"
+        return name, "ok" if (size, checksum) == (expected["size"], expected["checksum"]) else "mismatch"
+
+    result = {"algorithm": algorithm, "checked": 0, "missing": [], "mismatch": []}
+    with stats.span("verify") as sp, futures.ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        for name, status in executor.map(check_one, manifest["files"].items()):
+            result["checked"] += 1
+            if status != "ok":
+                result[status].append(name)
+        sp.add(bytes_read=sum(item["size"] for item in manifest["files"].values()), files=result["checked"])
+    return result
+
+def fsync_path(path):
+    """! Flush a file, or the entries of a folder, to the disk. Folders can not be flushed on Windows, they are skipped.
+    Files are opened read only, so read-only files can be flushed too, except on Windows where flushing needs write access
+
+    @param path The absolute path to the file or folder
+    """
+    folder = os.path.isdir(path)
+    try:
+        fd = os.open(path, os.O_RDWR if os.name == "nt" and not folder else os.O_RDONLY)
+    except (IOError, OSError):
+        if folder:
+            return
+        raise
+    try:
+        os.fsync(fd)
+    except (IOError, OSError):
+        if not folder:
+            raise
+    finally:
+        os.close(fd)
+
+class ShrinkJournal:
+    """! Journal of a shrink staged in a folder: the shrink parameters on the first line, then one JSON line per file
+    written completely into the staging folder. Opening the journal of an interrupted shrink with the same parameters
+    gives back its finished files, a journal of other parameters or with an unreadable first line is started over, and a
+    line torn by a crash is dropped. Every line is flushed to the disk before the journal is used again.
+    """
+
+    def __init__(self, stagepath, params):
+        """! @param stagepath The absolute path to the staging folder, the journal is kept in it
+        @param params Dictionary of the shrink parameters the staged files depend on
+        """
+        self.stagepath = stagepath
+        self.path = os.path.join(stagepath, SHRINK_JOURNAL_FILENAME)
+        self.entries = {}
+        self._lock = threading.Lock()
+        data = b""
+        try:
+            with open(self.path, "rb") as file:
+                data = file.read()
+        except (IOError, OSError):
+            pass
+        # Length of the journal up to the end of its last complete line, 0 when it has to be started over
+        valid = 0
+        for line in data.splitlines(keepends=True):
+            if not line.endswith(b"\n"):
+                break # The line being written when the shrink died
+            try:
+                entry = json.loads(line)
+                if valid == 0:
+                    if entry != params:
+                        break
+                else:
+                    self.entries[entry["file"]] = entry
+            except (ValueError, KeyError, TypeError):
+                break
+            valid += len(line)
+        if valid > 0:
+            os.truncate(self.path, valid)
+            self._file = open(self.path, "a")
+        else:
+            self._file = open(self.path, "w")
+            self._write(json.dumps(params))
+            fsync_path(stagepath)
+
+    def _write(self, line):
+        self._file.write(line + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def relpath(self, filepath):
+        return os.path.relpath(filepath, self.stagepath).replace(os.sep, "/")
+
+    def finished(self, filepath):
+        """! Get the journal entry of a staged file if it was finished and is still there with the same size
+
+        @return Dictionary of the file name, size and checksum, None if the file has to be written
+        """
+        entry = self.entries.get(self.relpath(filepath))
+        try:
+            if entry is not None and os.path.getsize(filepath) == entry["size"]:
+                return entry
+        except (IOError, OSError):
+            pass
+        return None
+
+    def record(self, filepath, checksum=None):
+        """! Record a staged file as finished, it must be complete under its final name and flushed to the disk"""
+        entry = {"file": self.relpath(filepath), "size": os.path.getsize(filepath), "checksum": checksum}
+        with self._lock:
+            self._write(json.dumps(entry))
+            self.entries[entry["file"]] = entry
+
+    def close(self, remove=False):
+        """! Close the journal, and delete it when the staged recording is complete"""
+        if not self._file.closed:
+            self._file.close()
+        if remove:
+            os.remove(self.path)
+
+def copy_file(task, link="copy", budget=None, manifest=None, journal=None):
+    """! Copy, link or trim one data file
+
+    @param task A (source path, destination path, start time) task, see copy_files
+    @param link One of LINK_MODES, see copy_files
+    @param budget A ByteBudget shared by the files copied at the same time, None means no limit
+    @param manifest A ChecksumManifest to add the checksum of the new file to, computed from the copied bytes. A linked
+                    file is read once to get its checksum
+    @param journal A ShrinkJournal. The file is then written under a temporary name, renamed when complete and recorded
+                   in the journal, and a file the journal has as finished is skipped
+    @return Number of bytes written
+    """
+    srcpath, destpath, starttime = task
+    if journal is not None:
+        entry = journal.finished(destpath)
+        if entry is not None:
+            if manifest is not None:
+                manifest.add(destpath, entry["size"], entry["checksum"])
+            return 0
+        finalpath, destpath = destpath, destpath + SHRINK_PART_SUFFIX
+    budget = budget or ByteBudget()
+    hasher = manifest.new() if manifest is not None else None
+    hardlinked = False
+    if isinstance(srcpath, list):
+        reserved = budget.acquire(sum(piece[2] for piece in srcpath)) if budget.limit > 0 else 0
+        try:
+            written = datafile_trimcopy(srcpath, destpath, starttime, hasher)
+        finally:
+            budget.release(reserved)
+        checksum = hasher.hexdigest() if hasher is not None else None
+    elif starttime == 0 and link != "copy" and datafile_link(srcpath, destpath, link):
+        written = 0
+        hardlinked = link == "hard"
+        checksum = checksum_file(destpath, manifest.algorithm)[1] if manifest is not None else None
+    else:
+        reserved = budget.acquire(os.path.getsize(srcpath)) if budget.limit > 0 else 0
+        try:
+            written = datafile_copy(srcpath, destpath, starttime, hasher)
+        finally:
+            budget.release(reserved)
+        checksum = hasher.hexdigest() if hasher is not None else None
+    if journal is not None:
+        # A hard link is the source file itself, already on the disk and often read-only, only its new name is flushed
+        # with the folder
+        if not hardlinked:
+            fsync_path(destpath)
+        os.replace(destpath, finalpath)
+        destpath = finalpath
+        journal.record(destpath, checksum)
+    if manifest is not None:
+        manifest.add(destpath, os.path.getsize(destpath), checksum)
+    return written
+
+def copy_files(tasks, jobs=1, maxinflight=0, link="copy", manifest=None, journal=None):
+    """! Copy data files with a pool of worker threads
+
+    @param tasks An array of (source path, destination path, start time) to be passed to datafile_copy. The source can
+                 also be an array of (source path, data offset, number of bytes) to be passed to datafile_trimcopy
+    @param jobs Number of files copied at the same time
+    @param maxinflight Maximum number of bytes being copied at the same time, 0 means no limit
+    @param link One of LINK_MODES. Files whose header is not changed are linked instead of copied when it is not "copy",
+                falling back to a copy when linking is not possible
+    @param manifest A ChecksumManifest to add the checksums of the new files to, see copy_file
+    @param journal A ShrinkJournal to record the finished files in and skip the ones already finished, see copy_file
+    @return Total number of bytes written
+    """
+    budget = ByteBudget(maxinflight)
+    def copy_one(task):
+        return copy_file(task, link, budget, manifest, journal)
+
+    if jobs <= 1:
+        return sum(copy_one(task) for task in tasks)
+    with futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        return sum(executor.map(copy_one, tasks))
+
+def recording_checkdest(destpath, sources):
+    """! Check a new recording can be created at a path without writing over an existing recording, such as its own
+    source when the destination folder is the folder of the source and the start time is kept
+
+    @param destpath The absolute path to the new recording
+    @param sources The absolute paths to the recordings the new recording is made from
+    @return Error message, None if the new recording can be created
+    """
+    for source in sources:
+        if os.path.normcase(os.path.abspath(destpath)) == os.path.normcase(os.path.abspath(source)) or \
+           (os.path.exists(destpath) and os.path.samefile(destpath, source)):
+            return "Error: " + destpath + " is the source recording " + source + ", choose another destination folder"
+    if os.path.exists(destpath):
+        return "Error: " + destpath + " already exists"
+    return None
+
+def shrink_tasks(recpath, destpath, channels, org_starttime, start, stop, trim=False, duration=DATAFILE_DURATION):
+    """! List the files to copy into a shrinked recording, see copy_files
+
+    @param recpath The absolute path to the source recording
+    @param destpath The absolute path to the new recording
+    @param channels The "channels" of the recording index, see recording_index
+    @param org_starttime The start time of the source recording, unix timestamp integer
+    @param start The start time of the targeting recording, unix timestamp integer
+    @param stop The stop time of the targeting recording, unix timestamp integer
+    @param trim Allow start and stop inside a data file, see shrink_trimfilenames
+    @param duration Seconds covered by each data file, or a dictionary of extension to seconds
+    @return An array of (source path, destination path, start time) tasks for copy_files, or the error of the trim plan
+    """
+    index = SegmentIndex(channels, duration)
+    # Each extension is checked against its own file length
+    aligned = all((start - org_starttime) % length == 0 and (stop - start) % length == 0
+                  for length in set(index.segmentlength(extension) for folder, extension in index.segments))
+    if trim and not aligned:
+        plan = shrink_trimfilenames(recpath, channels, org_starttime, start, stop, duration)
+        if isinstance(plan, dict):
+            return plan
+        namelist = []
+        for folder, destfilename, pieces in plan:
+            namelist.append((folder, [(os.path.join(recpath, folder, name), offset, count) for name, offset, count in pieces],
+                             destfilename))
+    else:
+        namelist = shrink_datafilenames(channels, org_starttime, start, stop, duration)
+
+    tasks = []
+    for name in SHRINK_EXTRA_FILES:
+        if os.path.isfile(os.path.join(recpath, name)):
+            tasks.append((os.path.join(recpath, name), os.path.join(destpath, name), 0))
+    for folder, srcfilename, destfilename in namelist:
+        # Only the first file of each channel carries the recording ID
+        recid_start = start if pathlib.Path(destfilename).stem.endswith("_00000001") else 0
+        srcpath = srcfilename if isinstance(srcfilename, list) else os.path.join(recpath, folder, srcfilename)
+        tasks.append((srcpath, os.path.join(destpath, folder, destfilename), recid_start))
+    return tasks
+
+def shrink_recording(recpath, destparent, start, stop, jobs=1, maxinflight=0, link="copy", trim=False, checksum=None,
+                     journal=False, duration=DATAFILE_DURATION):
+    """! Make a shrinked copy of a recording with new start and stop time, in a single process.
+    The recmeta.json is read once, each channel folder is listed once, and the data files are copied straight to their
+    new names with the recording ID of the first files patched during the copy.
+    With trim, start and stop do not need to be on the data file boundaries of the source recording: the new data files
+    are cut from the needed byte ranges of the source files, see shrink_trimfilenames.
+    With journal, the new recording is staged in a hidden folder next to it, every finished data file is recorded in a
+    ShrinkJournal, and the staging folder is renamed to the new recording once complete. Running the same shrink again
+    after it was interrupted only writes the data files that were not finished.
+
+    @param recpath The absolute path to the source recording
+    @param destparent The absolute path to the folder the new recording will be created in
+    @param start The start time of the targeting recording, unix timestamp integer
+    @param stop The stop time of the targeting recording, unix timestamp integer
+    @param jobs Number of files copied at the same time
+    @param maxinflight Maximum number of bytes being copied at the same time, 0 means no limit
+    @param link One of LINK_MODES, how the data files not needing a header change are put into the new recording
+    @param trim Allow start and stop inside a data file, see shrink_trimfilenames
+    @param checksum Checksum algorithm(see CHECKSUM_ALGORITHM) of the integrity manifest computed from the bytes being
+                    copied and written into the new recording, None writes no manifest. See recording_verify
+    @param journal Stage the new recording and journal the finished files so an interrupted shrink can be resumed
+    @param duration Seconds covered by each data file of the source recording, or a dictionary of extension to seconds
+    @return Dictionary of the new recording path, number of files written(and resumed with journal) and seconds spent in
+            each phase, or the error
+    """
+    timing = {}
+    recpath = os.path.normpath(recpath)
+    shrink_journal = None
+    try:
+        # 1. New recording folder and recmeta.json
+        with stats.span("shrink.recmeta") as sp:
+            with open(os.path.join(recpath, "recmeta.json"), "rb") as file:
+                rj_bin = file.read()
+            rj = json.loads(rj_bin)
+            org_starttime = rj[JSON_NAME_START]
+            rec_id = getrecid(os.path.basename(recpath).split("_")[0], start)
+            if rec_id.startswith("Error"):
+                return {"error": rec_id}
+            destpath = os.path.join(destparent, rec_id)
+            error = recording_checkdest(destpath, [recpath])
+            if error is not None:
+                return {"error": error}
+            workpath = destpath
+            if journal:
+                workpath = os.path.join(destparent, "." + rec_id + SHRINK_STAGE_SUFFIX)
+                os.makedirs(workpath, exist_ok=True)
+                shrink_journal = ShrinkJournal(workpath, {"source": recpath, "start": start, "stop": stop, "trim": trim,
+                                                          "checksum": checksum, "duration": duration})
+            os.makedirs(workpath, exist_ok=True)
+            manifest = ChecksumManifest(workpath, checksum) if checksum else None
+            # recmeta.json and stats are small, they are always written again when a shrink is resumed
+            with open(os.path.join(workpath, "recmeta.json"), "w") as file:
+                written = file.write(json.dumps(recmeta_changestartstop(rj, start, stop), indent="\t"))
+            if manifest is not None:
+                # Read back as written, the text mode may have changed the line endings
+                manifest.add(os.path.join(workpath, "recmeta.json"), *checksum_file(os.path.join(workpath, "recmeta.json"), checksum))
+            sp.add(bytes_read=len(rj_bin), bytes_written=written, files=1)
+        timing["recmeta"] = sp.seconds
+
+        # 2. New stats
+        with stats.span("shrink.stats") as sp:
+            statspath = os.path.join(recpath, "stats")
+            if os.path.isfile(statspath):
+                hasher = manifest.new() if manifest is not None else None
+                written = stats.shrinkcopyto(statspath, os.path.join(workpath, "stats"),
+                                             (start - org_starttime) // 60, (stop - org_starttime) // 60, hasher)
+                if isinstance(written, int):
+                    sp.add(bytes_read=written, bytes_written=written, files=1)
+                    if manifest is not None:
+                        manifest.add(os.path.join(workpath, "stats"), written, hasher.hexdigest())
+        timing["stats"] = sp.seconds
+
+        # 3. Channel folders and data file names
+        with stats.span("shrink.listing") as sp:
+            channels = recording_index(recpath)["channels"]
+            tasks = shrink_tasks(recpath, workpath, channels, org_starttime, start, stop, trim, duration)
+            if isinstance(tasks, dict):
+                return tasks
+            for folder in channels:
+                os.makedirs(os.path.join(workpath, folder), exist_ok=True)
+            sp.add(files=len(tasks))
+        timing["listing"] = sp.seconds
+
+        # 4. Copy files
+        with stats.span("shrink.copy") as sp:
+            resumed = sum(1 for task in tasks if shrink_journal.finished(task[1]) is not None) if journal else 0
+            written = copy_files(tasks, jobs, maxinflight, link, manifest, shrink_journal)
+            file_count = len(tasks)
+            # Copied files are read whole, linked files are neither read nor written
+            sp.add(bytes_read=written, bytes_written=written, files=file_count,
+                   patched=sum(1 for task in tasks if task[2] != 0))
+        timing["copy"] = sp.seconds
+
+        # 5. Integrity manifest
+        if manifest is not None:
+            with stats.span("shrink.manifest") as sp:
+                sp.add(bytes_written=manifest.save(), files=1)
+            timing["manifest"] = sp.seconds
+
+        # 6. Move the staged recording into place
+        if journal:
+            with stats.span("shrink.commit") as sp:
+                # The data files were flushed before being journaled, flush the rest and the folder entries
+                for name in ("recmeta.json", "stats", CHECKSUM_MANIFEST_FILENAME):
+                    if os.path.isfile(os.path.join(workpath, name)):
+                        fsync_path(os.path.join(workpath, name))
+                for folder in channels:
+                    fsync_path(os.path.join(workpath, folder))
+                shrink_journal.close(remove=True)
+                fsync_path(workpath)
+                os.rename(workpath, destpath)
+                fsync_path(destparent)
+                sp.add(files=1)
+            timing["commit"] = sp.seconds
+            return {"destpath": destpath, "files": file_count, "resumed": resumed, "timing": timing}
+    except (IOError, OSError, KeyError, ValueError) as e:
+        if DEBUG:
+            print(e)
+        return {"error": e}
+    finally:
+        if shrink_journal is not None:
+            shrink_journal.close()
+
+    return {"destpath": destpath, "files": file_count, "timing": timing}
+
+def merge_tasks(recordings, destpath, starttime, duration=DATAFILE_DURATION):
+    """! List the data files of consecutive recordings renamed into one recording, see copy_files. Each file keeps its
+    place in time: its sequence number is moved by the number of files between the merged recording start and the start
+    of its own recording.
+
+    @param recordings An array of (recording path, start time, channels), channels as in the recording index
+    @param destpath The absolute path to the merged recording
+    @param starttime The start time of the merged recording, unix timestamp integer
+    @param duration Seconds covered by each data file, or a dictionary of extension to seconds
+    @return An array of (source path, destination path, start time) tasks for copy_files, or the error message when a
+            recording does not start on the data file boundaries of the merged recording
+    """
+    tasks = []
+    for recpath, recstart, channels in recordings:
+        index = SegmentIndex(channels, duration)
+        for (folder, extension), (starts, files) in index.segments.items():
+            length = index.segmentlength(extension)
+            if (recstart - starttime) % length != 0:
+                return "Error: " + recpath + " does not start on a " + str(length) + "s data file boundary of " + str(starttime)
+            for srcfilename in files:
+                parts = datafile_parsename(srcfilename)
+                seq = parts["seq"] + (recstart - starttime) // length
+                destfilename = f'{parts["instrument"]}_{starttime:X}_{parts["channel"]}_{seq:08X}.{extension}'
+                # Only the first file of each channel carries the recording ID, and the first files come from the
+                # earliest recording, which already has the merged start as its ID, so no header is changed
+                tasks.append((os.path.join(recpath, folder, srcfilename), os.path.join(destpath, folder, destfilename), 0))
+    return tasks
+
+def merge_recordings(recpaths, destparent, jobs=1, link="copy", checksum=None, duration=DATAFILE_DURATION):
+    """! Join consecutive recordings of one instrument, such as the recordings split by an instrument restart, into one
+    recording starting at the earliest one. The recmeta.json of the earliest recording is kept with the start and stop
+    of the joined span, the stats files are merged with the missing minutes filled by gap blocks(see stats.mergeto),
+    and the data files are renamed into the new recording, see merge_tasks. The data files of the time between two
+    recordings are missing, see SegmentIndex.gaps.
+
+    @param recpaths The absolute paths to the recordings, in any order, they are sorted by start time
+    @param destparent The absolute path to the folder the new recording will be created in
+    @param jobs Number of files copied at the same time
+    @param link One of LINK_MODES, how the data files not needing a header change are put into the new recording
+    @param checksum Checksum algorithm of the integrity manifest, see shrink_recording
+    @param duration Seconds covered by each data file, or a dictionary of extension to seconds
+    @return Dictionary of the new recording path, number of files written and seconds spent in each phase, or the error
+    """
+    timing = {}
+    try:
+        # 1. Recordings in time order and the files of the new recording, checked before anything is written
+        with stats.span("merge.listing") as sp:
+            recordings = []
+            for recpath in recpaths:
+                recpath = os.path.normpath(recpath)
+                with open(os.path.join(recpath, "recmeta.json"), "rb") as file:
+                    rj_bin = file.read()
+                recordings.append((json.loads(rj_bin), recpath))
+                sp.add(bytes_read=len(rj_bin))
+            if len(recordings) == 0:
+                return {"error": "Error: no recording to merge"}
+            recordings.sort(key=lambda recording: recording[0][JSON_NAME_START])
+            instrument = os.path.basename(recordings[0][1]).split("_")[0]
+            for (rj, recpath), (nextrj, nextpath) in zip(recordings, recordings[1:]):
+                if os.path.basename(nextpath).split("_")[0] != instrument:
+                    return {"error": "Error: " + nextpath + " is not a recording of instrument " + instrument}
+                if rj[JSON_NAME_STOP] > nextrj[JSON_NAME_START]:
+                    return {"error": "Error: " + recpath + " overlaps " + nextpath}
+            start = recordings[0][0][JSON_NAME_START]
+            stop = recordings[-1][0][JSON_NAME_STOP]
+            rec_id = getrecid(instrument, start)
+            if rec_id.startswith("Error"):
+                return {"error": rec_id}
+            destpath = os.path.join(destparent, rec_id)
+            error = recording_checkdest(destpath, [recpath for rj, recpath in recordings])
+            if error is not None:
+                return {"error": error}
+            indexed = [(recpath, rj[JSON_NAME_START], recording_index(recpath)["channels"]) for rj, recpath in recordings]
+            tasks = merge_tasks(indexed, destpath, start, duration)
+            if isinstance(tasks, str):
+                return {"error": tasks}
+            firstpath = recordings[0][1]
+            tasks = [(os.path.join(firstpath, name), os.path.join(destpath, name), 0) for name in SHRINK_EXTRA_FILES
+                     if os.path.isfile(os.path.join(firstpath, name))] + tasks
+            sp.add(files=len(tasks))
+        timing["listing"] = sp.seconds
+
+        # 2. New recording folder and recmeta.json
+        with stats.span("merge.recmeta") as sp:
+            for folder in [""] + sorted(set(folder for recpath, recstart, channels in indexed for folder in channels)):
+                os.makedirs(os.path.join(destpath, folder), exist_ok=True)
+            manifest = ChecksumManifest(destpath, checksum) if checksum else None
+            with open(os.path.join(destpath, "recmeta.json"), "w") as file:
+                written = file.write(json.dumps(recmeta_changestartstop(recordings[0][0], start, stop), indent="\t"))
+            if manifest is not None:
+                manifest.add(os.path.join(destpath, "recmeta.json"), *checksum_file(os.path.join(destpath, "recmeta.json"), checksum))
+            sp.add(bytes_written=written, files=1)
+        timing["recmeta"] = sp.seconds
+
+        # 3. Merged stats
+        with stats.span("merge.stats") as sp:
+            statspaths = [os.path.join(recpath, "stats") for rj, recpath in recordings if os.path.isfile(os.path.join(recpath, "stats"))]
+            if len(statspaths) > 0:
+                hasher = manifest.new() if manifest is not None else None
+                written = stats.mergeto(statspaths, os.path.join(destpath, "stats"), hasher)
+                if not isinstance(written, int):
+                    return {"error": written[stats.JSON_NAME_ERROR]}
+                sp.add(bytes_written=written, files=1)
+                if manifest is not None:
+                    manifest.add(os.path.join(destpath, "stats"), written, hasher.hexdigest())
+        timing["stats"] = sp.seconds
+
+        # 4. Copy files
+        with stats.span("merge.copy") as sp:
+            written = copy_files(tasks, jobs, 0, link, manifest)
+            sp.add(bytes_read=written, bytes_written=written, files=len(tasks),
+                   patched=sum(1 for task in tasks if task[2] != 0))
+        timing["copy"] = sp.seconds
+
+        # 5. Integrity manifest
+        if manifest is not None:
+            with stats.span("merge.manifest") as sp:
+                sp.add(bytes_written=manifest.save(), files=1)
+            timing["manifest"] = sp.seconds
+    except (IOError, OSError, KeyError, ValueError) as e:
+        if DEBUG:
+            print(e)
+        return {"error": e}
+
+    return {"destpath": destpath, "files": len(tasks), "timing": timing}
+
+async def run_blocking(limit, function, *args):
+    """! Run a blocking function in a worker thread once the semaphore limit lets it"""
+    async with limit:
+        return await asyncio.to_thread(function, *args)
+
+async def recording_index_async(recpath, rebuild=False, indexdir=None):
+    """! Same as recording_index, run in a worker thread so the event loop is not blocked by a slow(network) file system"""
+    return await asyncio.to_thread(recording_index, recpath, rebuild, indexdir)
+
+async def shrink_recording_async(recpath, destparent, start, stop, concurrency=ASYNC_CONCURRENCY, link="copy", trim=False,
+                                 checksum=None, duration=DATAFILE_DURATION):
+    """! Same as shrink_recording, for an event loop. The blocking calls run in worker threads, at most concurrency at a
+    time: recmeta.json and the recording index are read together, then the new recmeta.json, the new stats and every
+    data file are written together, which hides most of the latency of a network file system.
+
+    @param recpath The absolute path to the source recording
+    @param destparent The absolute path to the folder the new recording will be created in
+    @param start The start time of the targeting recording, unix timestamp integer
+    @param stop The stop time of the targeting recording, unix timestamp integer
+    @param concurrency Maximum number of blocking file system calls running at the same time
+    @param link One of LINK_MODES, see shrink_recording
+    @param trim Allow start and stop inside a data file, see shrink_recording
+    @param checksum Checksum algorithm of the integrity manifest, see shrink_recording
+    @param duration Seconds covered by each data file, see shrink_recording
+    @return Dictionary of the new recording path, number of files written and seconds spent in each phase, or the error
+    """
+    limit = asyncio.Semaphore(concurrency)
+    timing = {}
+    recpath = os.path.normpath(recpath)
+    def read_recmeta():
+        with open(os.path.join(recpath, "recmeta.json"), "rb") as file:
+            return json.loads(file.read())
+    def write_recmeta(rj, destpath, manifest):
+        with open(os.path.join(destpath, "recmeta.json"), "w") as file:
+            written = file.write(json.dumps(recmeta_changestartstop(rj, start, stop), indent="\t"))
+        if manifest is not None:
+            manifest.add(os.path.join(destpath, "recmeta.json"), *checksum_file(os.path.join(destpath, "recmeta.json"), checksum))
+        return written
+    def write_stats(destpath, org_starttime, manifest):
+        statspath = os.path.join(recpath, "stats")
+        if not os.path.isfile(statspath):
+            return 0
+        hasher = manifest.new() if manifest is not None else None
+        written = stats.shrinkcopyto(statspath, os.path.join(destpath, "stats"),
+                                     (start - org_starttime) // 60, (stop - org_starttime) // 60, hasher)
+        if not isinstance(written, int):
+            raise OSError(written)
+        if manifest is not None:
+            manifest.add(os.path.join(destpath, "stats"), written, hasher.hexdigest())
+        return written
+    def make_folders(destpath, channels):
+        for folder in [""] + list(channels):
+            os.makedirs(os.path.join(destpath, folder), exist_ok=True)
+
+    try:
+        # 1. recmeta.json and the recording index, then the files to copy
+        with stats.span("shrink.listing") as sp:
+            rec_id = getrecid(os.path.basename(recpath).split("_")[0], start)
+            if rec_id.startswith("Error"):
+                return {"error": rec_id}
+            destpath = os.path.join(destparent, rec_id)
+            error = recording_checkdest(destpath, [recpath])
+            if error is not None:
+                return {"error": error}
+            manifest = ChecksumManifest(destpath, checksum) if checksum else None
+            rj, index = await asyncio.gather(run_blocking(limit, read_recmeta),
+                                             run_blocking(limit, recording_index, recpath))
+            org_starttime = rj[JSON_NAME_START]
+            channels = index["channels"]
+            tasks, _ = await asyncio.gather(
+                run_blocking(limit, shrink_tasks, recpath, destpath, channels, org_starttime, start, stop, trim,
+                             duration),
+                run_blocking(limit, make_folders, destpath, channels))
+            if isinstance(tasks, dict):
+                return tasks
+            sp.add(files=len(tasks))
+        timing["listing"] = sp.seconds
+
+        # 2. recmeta.json, stats and data files
+        with stats.span("shrink.copy") as sp:
+            written = await asyncio.gather(run_blocking(limit, write_recmeta, rj, destpath, manifest),
+                                           run_blocking(limit, write_stats, destpath, org_starttime, manifest),
+                                           *[run_blocking(limit, copy_file, task, link, None, manifest) for task in tasks])
+            sp.add(bytes_read=sum(written[1:]), bytes_written=sum(written), files=len(tasks) + 2,
+                   patched=sum(1 for task in tasks if task[2] != 0))
+        timing["copy"] = sp.seconds
+
+        # 3. Integrity manifest
+        if manifest is not None:
+            with stats.span("shrink.manifest") as sp:
+                sp.add(bytes_written=await run_blocking(limit, manifest.save), files=1)
+            timing["manifest"] = sp.seconds
+    except (IOError, OSError, KeyError, ValueError) as e:
+        if DEBUG:
+            print(e)
+        return {"error": e}
+
+    return {"destpath": destpath, "files": len(tasks), "timing": timing}
+
+def shrink_readmanifest(manifestpath):
+    """! Read a batch shrink manifest. A .json manifest is an array of objects (or arrays) of source, dest, start, stop.
+    Any other file is read as CSV with the same columns, with or without a header line.
+
+    @param manifestpath The path to the manifest file
+    @return An array of job dictionaries with the keys of MANIFEST_COLUMNS
+    """
+    with open(manifestpath, "r", newline="") as file:
+        if manifestpath.lower().endswith(".json"):
+            rows = json.loads(file.read())
+        else:
+            rows = [row for row in csv.reader(file) if len(row) > 0 and not row[0].startswith("#")]
+            if len(rows) > 0 and rows[0][0].strip().lower() == MANIFEST_COLUMNS[0]:
+                rows = [dict(zip([name.strip().lower() for name in rows[0]], row)) for row in rows[1:]]
+    jobs = []
+    for row in rows:
+        if not isinstance(row, dict):
+            row = dict(zip(MANIFEST_COLUMNS, row))
+        jobs.append({"source": str(row["source"]).strip(), "dest": str(row["dest"]).strip(),
+                     "start": int(row["start"]), "stop": int(row["stop"])})
+    return jobs
+
+def shrink_batchjob(job, jobs=1, maxinflight=0, link="copy", profile=False, trim=False, checksum=None, journal=False,
+                    duration=DATAFILE_DURATION):
+    """! Run one job of a batch shrink, never raising so a failed job does not stop the batch
+
+    @param job A job dictionary from shrink_readmanifest
+    @param profile Collect the instrumentation spans of the job and return them under "spans"
+    @return The job dictionary updated with the shrink_recording result, any error given as a message
+    """
+    with stats.Profile() if profile else contextlib.nullcontext() as collector:
+        try:
+            result = shrink_recording(job["source"], job["dest"], job["start"], job["stop"], jobs, maxinflight, link, trim,
+                                      checksum, journal, duration)
+        except Exception as e:
+            result = {"error": e}
+    if "error" in result:
+        result["error"] = str(result["error"])
+    if profile:
+        result["spans"] = collector.records
+    return dict(job, **result)
+
+def shrink_batch(jobs, processes=None, filejobs=1, maxinflight=0, link="copy", progress=None, trim=False, checksum=None,
+                 journal=False, duration=DATAFILE_DURATION):
+    """! Shrink many recordings with a pool of worker processes, each job works like shrink_recording
+
+    @param jobs An array of job dictionaries, see shrink_readmanifest
+    @param processes Number of worker processes, None means the number of CPUs
+    @param filejobs Number of files each job copies at the same time
+    @param maxinflight Maximum number of bytes each job copies at the same time, 0 means no limit
+    @param link One of LINK_MODES, see shrink_recording
+    @param progress Function called with (number of finished jobs, number of jobs, job result) after each job
+    @param trim Allow start and stop inside a data file, see shrink_recording
+    @param checksum Checksum algorithm of the integrity manifest of each new recording, see shrink_recording
+    @param journal Stage and journal each new recording so the batch can be run again after a crash, see shrink_recording
+    @param duration Seconds covered by each data file of the source recordings, see shrink_recording
+    @return An array of job results in the order of the jobs
+    Note: The hooks registered with stats.addhook are not seen by the worker processes, so when any is registered the
+          workers collect their spans and the hooks are called with them here, as each job finishes.
+    """
+    profile = len(stats.PROFILE_HOOKS) > 0
+    results = [None] * len(jobs)
+    with futures.ProcessPoolExecutor(max_workers=processes) as executor:
+        submitted = { executor.submit(shrink_batchjob, job, filejobs, maxinflight, link, profile, trim, checksum, journal,
+                                      duration): i for i, job in enumerate(jobs) }
+        for finished, future in enumerate(futures.as_completed(submitted), 1):
+            i = submitted[future]
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                results[i] = dict(jobs[i], error=str(e))
+            for record in results[i].pop("spans", []):
+                for hook in list(stats.PROFILE_HOOKS):
+                    hook(record)
+            if progress is not None:
+                progress(finished, len(jobs), results[i])
+    return results
@@ -17,45 +17,10 @@ IF "%4" == "" GOTO usage
 SET NEW_STOP=%4
 IF not "%5" == "" GOTO usage
 
-@REM 1. Make the new folder with new recording ID
+@REM Everything (recording ID, recmeta.json, stats, data files) is done by one Python process, journaled so running
+@REM the same command again after a crash only copies the files that were not finished
 SET PHXRECORDING_FOLDER_PATH=%~dp0
-CD %PHXRECORDING_FOLDER_PATH%
-SET SOURCE_REC_ID=%SOURCE_PATH:~-23%
-SET INSTRUMENT_ID=%SOURCE_REC_ID:~0,5%
-SET REC_FOLDER_NAME=
-FOR /f %%a IN ('python %PHXRECORDING_FOLDER_PATH%\phxrecid.py -i %INSTRUMENT_ID% -s %NEW_START%') DO @SET REC_FOLDER_NAME=%%a
-ECHO New recording name: %REC_FOLDER_NAME%
-SET DEST_PATH=%DEST_FOLDER%%REC_FOLDER_NAME%\
-MKDIR %DEST_PATH%
-
-@REM 2. Modify and copy new recmeta.json
-ECHO Copying recmeta...
-python %PHXRECORDING_FOLDER_PATH%phxrecmetamodstartstop.py -i %SOURCE_PATH%\recmeta.json -o %DEST_PATH%recmeta.json -s %NEW_START% -e %NEW_STOP%
-ECHO Done.
-
-@REM 3. Modify and copy new stats binary file
-ECHO Making new stats...
-FOR /f %%b IN ('python %PHXRECORDING_FOLDER_PATH%\phxrecstart.py -i %SOURCE_PATH%') DO @SET ORG_START=%%b
-SET /a "START_MIN=(%NEW_START%-%ORG_START%)/60"
-SET /a "STOP_MIN=(%NEW_STOP%-%ORG_START%)/60"
-python %PHXRECORDING_FOLDER_PATH%phxstatsfile\phxstatsshrink.py -i %SOURCE_PATH%\stats -o %DEST_PATH%\stats -s %START_MIN% -e %STOP_MIN%
-ECHO Done.
-
-@REM 4. Copy other needed files
-ECHO Copying data files....
-@REM 4.1 Create needed folders
-CD %SOURCE_PATH%
-DEL tmp.txt
-DIR *. /b /d > tmp.txt
-FOR /F "tokens=*" %%c IN (tmp.txt) DO MKDIR %DEST_PATH%\%%c
-@REM 4.2 Copy files
-CD %PHXRECORDING_FOLDER_PATH%
-DEL tmp.txt
-python %PHXRECORDING_FOLDER_PATH%phxrecshrinkfilelist.py -i %SOURCE_PATH% -s %NEW_START% -e %NEW_STOP% >> tmp.txt
-FOR /F "tokens=*" %%d IN (tmp.txt) DO COPY %SOURCE_PATH%\%%d %DEST_PATH%\%%d
-python %PHXRECORDING_FOLDER_PATH%phxrecshrinkfinish.py -i %SOURCE_PATH% -o %DEST_PATH% -s %NEW_START% -e %NEW_STOP%
-ECHO Done.
-ECHO New recording created at %DEST_PATH%
+python %PHXRECORDING_FOLDER_PATH%phxrecshrinkrun.py -i %SOURCE_PATH% -o %DEST_FOLDER% -s %NEW_START% -e %NEW_STOP% --journal
 ECHO off
 GOTO :eof
 
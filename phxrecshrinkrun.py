@@ -0,0 +1,9 @@
+# Author: Phoenix Geohysics Ltd.
+# Creation: 2026-10-18
+
+# Same as "phx.py shrink", kept for the command lines and scripts already calling it
+import phx
+import sys
+
+if __name__ == "__main__":
+    sys.exit(phx.run(["shrink"] + sys.argv[1:]))
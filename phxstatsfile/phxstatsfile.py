@@ -8,6 +8,13 @@ DEBUG = 0
 MHEADER_SIZE = 16
 HEADER_SIZE = 32
 PAYLOAD_SIZE = 17
+## recmeta.json field and value telling a recording is finished
+RECMETA_NAME_STATUS = "rec_status"
+RECMETA_STATUS_COMPLETED = "completed"
+## Chunk size used when the byte range copy can not be done by the kernel
+COPY_CHUNK_SIZE = 1024 * 1024
+## Number of minutes decoded at a time when streaming
+STREAM_CHUNK_MIN = 1024
 ## JSON field names
 JSON_NAME_VERSION = "version"
 JSON_NAME_NUMCHAN = "numchannels"
@@ -24,8 +31,158 @@ JSON_NAME_SAT_COUNT = "saturationcount"
 JSON_NAME_MISF_COUNT = "missingframecount"
 JSON_NAME_CHAN_STATS = "channelstats"
 JSON_NAME_PER_MIN_STATS = "perminstats"
+## Anomaly scan rules: (field, operator, threshold), a minute is bad on a channel when the rule is true
+SCAN_OPERATORS = {">": "gt", ">=": "ge", "<": "lt", "<=": "le", "==": "eq", "!=": "ne"}
+DEFAULT_SCAN_RULES = [(JSON_NAME_SAT_COUNT, ">", 0), (JSON_NAME_MISF_COUNT, ">", 0)]
+## Name of the stats file in a recording folder, and how deep the survey aggregator looks for recording folders
+STATS_FILENAME = "stats"
+SURVEY_SEARCH_DEPTH = 2
+## Column file names
+COLUMN_NAME_MINUTE = "minute"
+COLUMN_NAME_CHANNEL_IDS = "channelids"
+COLUMN_METADATA_KEY = "phxstats"
+## Rollup resolutions(name: minutes per bin), sidecar file suffix, and the environment variable naming a folder to keep
+## the rollups in instead, for read-only stats folders
+ROLLUP_RESOLUTIONS = {"10min": 10, "hour": 60, "day": 1440}
+ROLLUP_SUFFIX = ".rollup.npz"
+ROLLUP_DIR_ENV = "PHXROLLUP_DIR"
+ROLLUP_NAME_TIME = "time"
+ROLLUP_NAME_MINUTES = "minutes"
+## missingframecount of the blocks written for the minutes with no data when merging stats files
+MISSING_FRAME_MARK = 0xFFFF
+## Binary layouts of the per minute data
+MIN_FORMAT = "<BH" # tempreture and battery, at HEADER_SIZE - 4 of a block
+CHAN_FORMAT = "<BfffHH" # one channel payload
 
-import json, struct, datetime
+import struct, os, sys, time, importlib, importlib.machinery
+
+class LazyModule:
+    """! Stand-in for a module that is only imported when one of its attributes is first used, so the scripts that do not
+    need NumPy, pyarrow or asyncio do not pay for importing them"""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+def lazyimport(name):
+    """! Get a LazyModule of a module, None if the module(or its top level package) is not installed. Only the sys.path
+    finder is asked, importlib.util alone would double the import time of this module"""
+    top = name.split(".")[0]
+    if top in sys.modules or top in sys.builtin_module_names or importlib.machinery.PathFinder.find_spec(top) is not None:
+        return LazyModule(name)
+    return None
+
+## Standard library modules only some of the functions use, imported on first use
+json = LazyModule("json")
+datetime = LazyModule("datetime")
+mmap = LazyModule("mmap")
+operator = LazyModule("operator")
+threading = LazyModule("threading")
+asyncio = LazyModule("asyncio")
+futures = LazyModule("concurrent.futures")
+hashlib = LazyModule("hashlib")
+## Optional dependencies, None when not installed
+np = lazyimport("numpy")
+pa = lazyimport("pyarrow")
+pq = lazyimport("pyarrow.parquet")
+
+# Instrumentation
+## Functions called with the record of every finished span, empty means instrumentation is off
+PROFILE_HOOKS = []
+## Counters every span record carries
+SPAN_COUNTERS = ("bytes_read", "bytes_written", "files")
+
+def addhook(hook):
+    """! Start calling hook(record) for every finished span. A record is a dictionary of the span name, the seconds it
+    took, the SPAN_COUNTERS and any extra counter the span added. Hooks may be called from worker threads."""
+    PROFILE_HOOKS.append(hook)
+
+def removehook(hook):
+    """! Stop calling a hook given to addhook"""
+    if hook in PROFILE_HOOKS:
+        PROFILE_HOOKS.remove(hook)
+
+class span:
+    """! Context manager measuring the wall time and I/O of one phase of work
+
+    with stats.span("shrink.copy") as sp:
+        sp.add(bytes_written=written, files=1)
+
+    The wall time is always measured and available as sp.seconds after the block. The record is only built and given to
+    the hooks when at least one hook is registered, so an instrumented function costs nothing extra by default.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.seconds = 0.0
+        self.counters = dict.fromkeys(SPAN_COUNTERS, 0)
+
+    def add(self, **counters):
+        """! Add to the counters of the span, unknown counter names are added as new counters"""
+        for key, value in counters.items():
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self._start
+        if len(PROFILE_HOOKS) > 0:
+            record = {"name": self.name, "seconds": self.seconds}
+            record.update(self.counters)
+            for hook in list(PROFILE_HOOKS):
+                hook(record)
+        return False
+
+class Profile:
+    """! Hook collecting span records while it is active, to be summarized or saved as JSON
+
+    with stats.Profile() as profile:
+        stats.shrinkcopyto(infilepath, outfilepath, 10, 20)
+    profile.tojsonfile("profile.json")
+    """
+
+    def __init__(self):
+        self.records = []
+        self._lock = threading.Lock()
+
+    def __call__(self, record):
+        with self._lock:
+            self.records.append(record)
+
+    def __enter__(self):
+        addhook(self)
+        return self
+
+    def __exit__(self, *exc):
+        removehook(self)
+        return False
+
+    def summary(self):
+        """! Sum the records of each span name
+
+        @return Dictionary of span name to its number of calls, seconds and counters
+        """
+        phases = {}
+        with self._lock:
+            for record in self.records:
+                phase = phases.setdefault(record["name"], {"calls": 0})
+                phase["calls"] += 1
+                for key, value in record.items():
+                    if key != "name":
+                        phase[key] = phase.get(key, 0) + value
+        return phases
+
+    def tojsonfile(self, outfilepath):
+        """! Write the summary and the records to a JSON file"""
+        with open(outfilepath, "w") as file:
+            file.write(json.dumps({"summary": self.summary(), "records": self.records}, indent="\t"))
 
 # Util function
 def extractinfo(stat_bin):
@@ -50,99 +207,275 @@ def extractinfo(stat_bin):
     data_dict[JSON_NAME_DURATION_MIN] = int(num_stat_units)
     return data_dict
 
+# Header check function
+def checkheader(stat_bin, filepath):
+    """! Check the master header of a stats file binary is a supported phoenix stats file
+
+    @param stat_bin bytearray of the stat file, at least the master header
+    @param filepath the path to the stats binary file, only used in the error message
+    @return None if the file is supported, otherwise a dictionary with the error message
+    """
+    if len(stat_bin) < MHEADER_SIZE or stat_bin[0]!=0x16:
+        if DEBUG:
+            print("File " + filepath + " is not a phoenix stats file!")
+        return {JSON_NAME_ERROR:"File " + filepath + " is not a phoenix stats file!"}
+
+    if stat_bin[1]!=0x01:
+        if DEBUG:
+            print("File " + filepath + " version " + str(stat_bin[1]) + " is not supported!")
+        return {JSON_NAME_ERROR:"File " + filepath + " version " + str(stat_bin[1]) + " is not supported!"}
+    return None
+
 # Header info function
 def getstatsinfo(filepath):
     """! Read binary stats file from a local path and return a dictionary of header data
-    Note: This function will return the total duration of the stat file.
+    Note: This function will return the total duration of the stat file. Only the master header is read.
 
     @param filepath the path to the stats binary file
     """
     try:
-        with open(filepath, "rb") as file:
-            stat_bin = bytearray(file.read())
+        with span("stats.info") as sp, StatsFile(filepath) as stats_file:
+            sp.add(bytes_read=MHEADER_SIZE, files=1)
+            return dict(stats_file.info)
     except (IOError, OSError) as e:
         return {JSON_NAME_ERROR:e}
-    
-    if stat_bin[0]!=0x16:
-        if DEBUG:
-            print("File " + filepath + " is not a phoenix stats file!")
-        return {JSON_NAME_ERROR:"File " + filepath + " is not a phoenix stats file!"}
-    
-    if stat_bin[1]!=0x01:
-        if DEBUG:
-            print("File " + filepath + " version " + stat_bin[1] + " is not supported!")
-        return {JSON_NAME_ERROR:"File " + filepath + " version " + stat_bin[1] + " is not supported!"}
-    
-    data_dict = extractinfo(stat_bin)
+    except ValueError as e:
+        return {JSON_NAME_ERROR:str(e)}
+
+# NumPy layout of the stats blocks
+def blockdtype(num_channels):
+    """! Build the NumPy structured dtype of one minute stats block (header + payload of every channel)
+
+    @param num_channels number of channels in the stats file
+    @return numpy.dtype with the fields tempreture, battery, and the per channel fields under "channels"
+    """
+    channel_dtype = np.dtype([(JSON_NAME_ID, "u1"), (JSON_NAME_MINVAL, "<f4"), (JSON_NAME_MAXVAL, "<f4"),
+                              (JSON_NAME_AVGVAL, "<f4"), (JSON_NAME_SAT_COUNT, "<u2"), (JSON_NAME_MISF_COUNT, "<u2")])
+    return np.dtype([("reserved", "V" + str(HEADER_SIZE - 4)), (JSON_NAME_TEMPRETURE, "u1"), (JSON_NAME_BATTERY_MV, "<u2"),
+                     ("padding", "V1"), (JSON_NAME_CHAN_STATS, channel_dtype, (num_channels,))])
+
+def decodeblocks(stat_bin, num_channels, start=0, stop=0):
+    """! Decode the minute blocks [start, stop) of a stats file binary into per field arrays in one go
+
+    @param stat_bin bytes like object of the stat file, including the master header
+    @param num_channels number of channels in the stats file
+    @param start the first minute to decode
+    @param stop the minute to stop decoding at (excluded), 0 means till the end of the binary
+    @return dictionary of numpy arrays, tempreture and battery(mV) shaped (minutes,), channel fields shaped (minutes, channels)
+    """
+    dtype = blockdtype(num_channels)
+    if stop == 0:
+        stop = (len(stat_bin) - MHEADER_SIZE) // dtype.itemsize
+    blocks = np.frombuffer(stat_bin, dtype=dtype, count=stop - start, offset=MHEADER_SIZE + dtype.itemsize * start)
+    data_dict = {JSON_NAME_TEMPRETURE: blocks[JSON_NAME_TEMPRETURE].copy(),
+                 JSON_NAME_BATTERY_MV: blocks[JSON_NAME_BATTERY_MV].copy()}
+    channels = blocks[JSON_NAME_CHAN_STATS]
+    for name in (JSON_NAME_ID, JSON_NAME_MINVAL, JSON_NAME_MAXVAL, JSON_NAME_AVGVAL, JSON_NAME_SAT_COUNT, JSON_NAME_MISF_COUNT):
+        data_dict[name] = channels[name].copy()
     return data_dict
 
-# Major data extraction function
-def getstatsdata(filepath, start=0, stop=0):
-    """! Read binary stats file from a local path and return a dictionary of desired data
-    Note: This function renturns the duration that the resulting file contains, in case of specified start and stop, this
-          duration will be different with the original stat file.
+# Vectorized data extraction function
+def getstatsarrays(filepath, start=0, stop=0):
+    """! Read binary stats file from a local path and return the header data plus the desired data as NumPy arrays
+    Note: Same header data and start/stop rules as getstatsdata, the per minute data is returned in form of arrays
+          (see decodeblocks) instead of a list of dictionaries.
 
     @param filepath the path to the stats binary file
     @param start the start minute from the begining to begin reading the stat data
     @param stop the end minute from the begining to end the reading, resulting data will include the stop minute.
     """
+    try:
+        stats_file = StatsFile(filepath) if stop >= start else None
+    except ValueError as e:
+        return {JSON_NAME_ERROR:str(e)}
+
+    data_dict, stop = statswindow(stats_file, start, stop)
+    if stats_file is None:
+        return data_dict
+    with span("stats.decode") as sp, stats_file:
+        if JSON_NAME_ERROR not in data_dict:
+            data_dict.update(stats_file.arrays(start, stop))
+            sp.add(bytes_read=MHEADER_SIZE + (stop - start) * stats_file.blocksize, files=1)
+    return data_dict
+
+def statswindow(stats_file, start=0, stop=0):
+    """! Apply the start and stop rules of getstatsdata to an opened stats file
+
+    @param stats_file the opened StatsFile, None if it was not opened
+    @param start the start minute from the begining to begin reading the stat data
+    @param stop the end minute from the begining to end the reading, resulting data will include the stop minute.
+    @return (header dictionary or error dictionary, the minute to stop decoding at)
+    """
     if stop < start:
         if DEBUG:
             print("Invalid start and stop time: " + str(start) + " " + str(stop))
-        return {JSON_NAME_ERROR:"Invalid start and stop time: " + str(start) + " " + str(stop)}
+        return {JSON_NAME_ERROR:"Invalid start and stop time: " + str(start) + " " + str(stop)}, stop
 
-    with open(filepath, "rb") as file:
-        stat_bin = bytearray(file.read())
-    if stat_bin[0]!=0x16:
-        if DEBUG:
-            print("File " + filepath + " is not a phoenix stats file!")
-        return {JSON_NAME_ERROR:"File " + filepath + " is not a phoenix stats file!"}
-    
-    if stat_bin[1]!=0x01:
-        if DEBUG:
-            print("File " + filepath + " version " + stat_bin[1] + " is not supported!")
-        return {JSON_NAME_ERROR:"File " + filepath + " version " + stat_bin[1] + " is not supported!"}
-    
-    data_dict = extractinfo(stat_bin)
+    data_dict = dict(stats_file.info)
     if stop > data_dict[JSON_NAME_DURATION_MIN]:
         if DEBUG:
             print("Invalid stop time: " + str(stop))
-        return {JSON_NAME_ERROR:"Invalid stop time: " + str(stop)}
+        return {JSON_NAME_ERROR:"Invalid stop time: " + str(stop)}, stop
 
-    stats_block_size = HEADER_SIZE + PAYLOAD_SIZE * data_dict[JSON_NAME_NUMCHAN]
-    data_array = []
     if stop == 0:
         stop = data_dict[JSON_NAME_DURATION_MIN]
     else:
         data_dict[JSON_NAME_DURATION_MIN] = stop - start
-    for i in range(start, stop):
-        data_position = MHEADER_SIZE + stats_block_size * i + (HEADER_SIZE - 4)
-        per_min_dict = {}
-        per_min_dict[JSON_NAME_TEMPRETURE] = stat_bin[data_position]
-        battery_bin = bytes(stat_bin[data_position + 1 : data_position + 3])
-        per_min_dict[JSON_NAME_BATTERY_MV] = struct.unpack('H', battery_bin)[0]
-        channel_array = []
-        for j in range(data_dict[JSON_NAME_NUMCHAN]):
-            data_position_j = MHEADER_SIZE + stats_block_size * i + HEADER_SIZE + PAYLOAD_SIZE * j
-            id=stat_bin[data_position_j]
-            channel_dict = {JSON_NAME_ID:id}
-            minv_bin = bytes(stat_bin[data_position_j + 1 : data_position_j + 5])
-            channel_dict[JSON_NAME_MINVAL] = struct.unpack('f', minv_bin)[0]
-            maxv_bin = bytes(stat_bin[data_position_j + 5 : data_position_j + 9])
-            channel_dict[JSON_NAME_MAXVAL] = struct.unpack('f', maxv_bin)[0]
-            avgv_bin = bytes(stat_bin[data_position_j + 9 : data_position_j + 13])
-            channel_dict[JSON_NAME_AVGVAL] = struct.unpack('f', avgv_bin)[0]
-            sat_bin = bytes(stat_bin[data_position_j + 13 : data_position_j + 15])
-            channel_dict[JSON_NAME_SAT_COUNT] = struct.unpack('H', sat_bin)[0]
-            mf_bin = bytes(stat_bin[data_position_j + 15 : data_position_j + 17])
-            channel_dict[JSON_NAME_MISF_COUNT] = struct.unpack('H', mf_bin)[0]
-            channel_array.append(channel_dict)
-            #print("j "+str(j)+" "+str(id)+"  "+str(333))
-        per_min_dict[JSON_NAME_CHAN_STATS] = channel_array
-        data_array.append(per_min_dict)
-    data_dict[JSON_NAME_PER_MIN_STATS] = data_array
+    return data_dict, stop
+
+def arraystolist(arrays):
+    """! Convert the per field arrays from decodeblocks into the per minute list of dictionaries used by getstatsdata
+
+    @param arrays dictionary of numpy arrays as returned by decodeblocks
+    @return list of per minute dictionaries
+    """
+    temperatures = arrays[JSON_NAME_TEMPRETURE].tolist()
+    batteries = arrays[JSON_NAME_BATTERY_MV].tolist()
+    channel_fields = (JSON_NAME_ID, JSON_NAME_MINVAL, JSON_NAME_MAXVAL, JSON_NAME_AVGVAL, JSON_NAME_SAT_COUNT, JSON_NAME_MISF_COUNT)
+    channel_values = [arrays[name].tolist() for name in channel_fields]
+    data_array = []
+    for i in range(len(temperatures)):
+        channel_array = [dict(zip(channel_fields, values)) for values in zip(*[field[i] for field in channel_values])]
+        data_array.append({JSON_NAME_TEMPRETURE: temperatures[i], JSON_NAME_BATTERY_MV: batteries[i],
+                           JSON_NAME_CHAN_STATS: channel_array})
+    return data_array
+
+def decodeminute(stat_bin, num_channels, index, offset=MHEADER_SIZE):
+    """! Decode one minute block into the per minute dictionary used by getstatsdata
+
+    @param stat_bin bytes like object holding the minute blocks
+    @param num_channels number of channels in the stats file
+    @param index minute to decode, counted from the first block in stat_bin
+    @param offset position of the first block in stat_bin, the master header size by default
+    """
+    position = offset + (HEADER_SIZE + PAYLOAD_SIZE * num_channels) * index
+    tempreture, battery = struct.unpack_from(MIN_FORMAT, stat_bin, position + HEADER_SIZE - 4)
+    channel_array = []
+    for j in range(num_channels):
+        values = struct.unpack_from(CHAN_FORMAT, stat_bin, position + HEADER_SIZE + PAYLOAD_SIZE * j)
+        channel_array.append(dict(zip((JSON_NAME_ID, JSON_NAME_MINVAL, JSON_NAME_MAXVAL, JSON_NAME_AVGVAL,
+                                       JSON_NAME_SAT_COUNT, JSON_NAME_MISF_COUNT), values)))
+    return {JSON_NAME_TEMPRETURE: tempreture, JSON_NAME_BATTERY_MV: battery, JSON_NAME_CHAN_STATS: channel_array}
+
+# Random access reader
+class StatsFile:
+    """! Memory-mapped stats file. The master header is parsed once on opening and any minute block can be accessed
+    by index (stats_file[i]) or slice (stats_file[a:b]) without reading the rest of the file.
+    """
+
+    def __init__(self, filepath):
+        """! Open and map the stats file
+
+        @param filepath the path to the stats binary file
+        """
+        self.filepath = filepath
+        self._file = open(filepath, "rb")
+        try:
+            size = os.fstat(self._file.fileno()).st_size
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size > 0 else b""
+            error = checkheader(self._map, filepath)
+            if error:
+                raise ValueError(error[JSON_NAME_ERROR])
+        except BaseException:
+            self.close()
+            raise
+        self.info = extractinfo(self._map)
+        self.starttime = struct.unpack_from('I', self._map, 10)[0]
+        self.numchannels = self.info[JSON_NAME_NUMCHAN]
+        self.blocksize = HEADER_SIZE + PAYLOAD_SIZE * self.numchannels
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """! Unmap and close the file"""
+        if isinstance(getattr(self, "_map", None), mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+    def __len__(self):
+        return self.info[JSON_NAME_DURATION_MIN]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.minute(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("minute " + str(index) + " out of range")
+        return self.minute(index)
+
+    def block(self, index):
+        """! Raw bytes of one minute block
+
+        @param index minute from the begining of the recording
+        """
+        position = MHEADER_SIZE + self.blocksize * index
+        return self._map[position:position + self.blocksize]
+
+    def minute(self, index):
+        """! Decode one minute block into the per minute dictionary used by getstatsdata
+
+        @param index minute from the begining of the recording
+        """
+        return decodeminute(self._map, self.numchannels, index)
+
+    def arrays(self, start=0, stop=0):
+        """! Decode the minutes [start, stop) into per field NumPy arrays, see decodeblocks
+
+        @param start the first minute to decode
+        @param stop the minute to stop decoding at (excluded), 0 means till the end of the file
+        """
+        return decodeblocks(self._map, self.numchannels, start, stop or len(self))
+
+# Major data extraction function
+def getstatsdata(filepath, start=0, stop=0):
+    """! Read binary stats file from a local path and return a dictionary of desired data
+    Note: This function renturns the duration that the resulting file contains, in case of specified start and stop, this
+          duration will be different with the original stat file.
+          When NumPy is installed the data is decoded by getstatsarrays and only converted to dictionaries here, otherwise
+          each minute is decoded by StatsFile.
+
+    @param filepath the path to the stats binary file
+    @param start the start minute from the begining to begin reading the stat data
+    @param stop the end minute from the begining to end the reading, resulting data will include the stop minute.
+    """
+    if np is not None:
+        data_dict = getstatsarrays(filepath, start, stop)
+        if JSON_NAME_ERROR in data_dict:
+            return data_dict
+        arrays = {}
+        for name in (JSON_NAME_TEMPRETURE, JSON_NAME_BATTERY_MV, JSON_NAME_ID, JSON_NAME_MINVAL, JSON_NAME_MAXVAL,
+                     JSON_NAME_AVGVAL, JSON_NAME_SAT_COUNT, JSON_NAME_MISF_COUNT):
+            arrays[name] = data_dict.pop(name)
+        data_dict[JSON_NAME_PER_MIN_STATS] = arraystolist(arrays)
+        return data_dict
+
+    try:
+        stats_file = StatsFile(filepath) if stop >= start else None
+    except ValueError as e:
+        return {JSON_NAME_ERROR:str(e)}
+
+    data_dict, stop = statswindow(stats_file, start, stop)
+    if stats_file is None:
+        return data_dict
+    with stats_file:
+        if JSON_NAME_ERROR not in data_dict:
+            data_dict[JSON_NAME_PER_MIN_STATS] = stats_file[start:stop]
     return data_dict
 
+# Async wrappers
+async def getstatsinfo_async(filepath):
+    """! Same as getstatsinfo, run in a worker thread so the event loop is not blocked by a slow(network) file system"""
+    return await asyncio.to_thread(getstatsinfo, filepath)
+
+async def getstatsdata_async(filepath, start=0, stop=0):
+    """! Same as getstatsdata, run in a worker thread so the event loop is not blocked by a slow(network) file system"""
+    return await asyncio.to_thread(getstatsdata, filepath, start, stop)
+
 # JSON output Wrapper
 def tojson(filepath, start=0, stop=0):
     """! Read binary stats file and then return json with needed information.
@@ -155,26 +488,586 @@ def tojson(filepath, start=0, stop=0):
     data = getstatsdata(filepath, start, stop)    
     return json.dumps(data)
 
+# Streaming data extraction
+def iterstatsdata(filepath, start=0, stop=0):
+    """! Read binary stats file the same way as getstatsdata, but one chunk of minutes at a time.
+    The first item generated is the header dictionary (or the error dictionary, and nothing else is generated), followed by
+    one per minute dictionary for each minute.
+
+    @param filepath the path to the stats binary file
+    @param start the start minute from the begining to begin reading the stat data
+    @param stop the end minute from the begining to end the reading, resulting data will include the stop minute.
+    """
+    try:
+        stats_file = StatsFile(filepath) if stop >= start else None
+    except ValueError as e:
+        yield {JSON_NAME_ERROR:str(e)}
+        return
+
+    data_dict, stop = statswindow(stats_file, start, stop)
+    yield data_dict
+    if stats_file is None:
+        return
+    with stats_file:
+        if JSON_NAME_ERROR in data_dict:
+            return
+        for chunk_start in range(start, stop, STREAM_CHUNK_MIN):
+            chunk_stop = min(chunk_start + STREAM_CHUNK_MIN, stop)
+            if np is not None:
+                yield from arraystolist(stats_file.arrays(chunk_start, chunk_stop))
+            else:
+                yield from stats_file[chunk_start:chunk_stop]
+
+# Incremental reader for live recordings
+def readnewminutes(filepath, start=0, count=0):
+    """! Read the completed minute blocks of a stats file that may still be written, from minute start to its current end.
+    Only the master header and the new blocks are read, a partial block at the end of the file is left for the next call.
+
+    @param filepath the path to the stats binary file
+    @param start the first minute to read
+    @param count maximum number of minutes to read, 0 means no limit
+    @return (header dictionary, or error dictionary, or None if the master header is not written yet,
+             list of per minute dictionaries, the minute to start the next call from)
+    """
+    with open(filepath, "rb") as file:
+        header = file.read(MHEADER_SIZE)
+        if len(header) < MHEADER_SIZE:
+            return None, [], start
+        error = checkheader(header, filepath)
+        if error:
+            return error, [], start
+        data_dict = extractinfo(header)
+        block_size = HEADER_SIZE + PAYLOAD_SIZE * data_dict[JSON_NAME_NUMCHAN]
+        available = (os.fstat(file.fileno()).st_size - MHEADER_SIZE) // block_size
+        data_dict[JSON_NAME_DURATION_MIN] = available
+        new_count = available - start if count <= 0 else min(available - start, count)
+        if new_count <= 0:
+            return data_dict, [], start
+        file.seek(MHEADER_SIZE + block_size * start)
+        chunk = file.read(block_size * new_count)
+    new_count = len(chunk) // block_size
+    if np is not None:
+        minutes = arraystolist(decodeblocks(header + chunk, data_dict[JSON_NAME_NUMCHAN], 0, new_count))
+    else:
+        minutes = [decodeminute(chunk, data_dict[JSON_NAME_NUMCHAN], i, 0) for i in range(new_count)]
+    return data_dict, minutes, start + new_count
+
+def followstats(filepath, start=0, interval=5.0, timeout=0, recmetapath=None):
+    """! Follow a stats file of a recording in progress, like "tail -f". The first item generated is the header dictionary
+    (or the error dictionary, and nothing else is generated, also when the recording is completed without a stats file
+    header to read), followed by the per minute dictionary of every completed
+    minute from minute start, as they get written. Each poll only reads the new blocks.
+    Following ends when the recording is completed (rec_status in recmeta.json) and all its minutes are generated, or
+    when no new minute shows up for timeout seconds.
+
+    @param filepath the path to the stats binary file
+    @param start the first minute to generate
+    @param interval seconds to wait between polls of the stats file
+    @param timeout seconds without new minutes after which following stops, 0 means no timeout
+    @param recmetapath the path to recmeta.json, by default the one next to the stats file
+    """
+    if recmetapath is None:
+        recmetapath = os.path.join(os.path.dirname(filepath), "recmeta.json")
+    header = None
+    idle_since = time.monotonic()
+    while True:
+        # Check the status before reading, so the minutes written before completion are never missed
+        try:
+            with open(recmetapath, "rb") as file:
+                completed = json.loads(file.read()).get(RECMETA_NAME_STATUS) == RECMETA_STATUS_COMPLETED
+        except (IOError, OSError, ValueError, AttributeError):
+            completed = False
+        try:
+            data_dict, minutes, start = readnewminutes(filepath, start, STREAM_CHUNK_MIN)
+        except (IOError, OSError) as e:
+            data_dict, minutes = ({JSON_NAME_ERROR:e} if completed else None), []
+        if header is None and data_dict is None and completed:
+            # Completed before the master header was written, the same error as getstatsdata
+            data_dict = checkheader(b"", filepath)
+        if header is None and data_dict is not None:
+            header = data_dict
+            yield header
+            if JSON_NAME_ERROR in header:
+                return
+        yield from minutes
+
+        if len(minutes) > 0:
+            idle_since = time.monotonic()
+        if len(minutes) == STREAM_CHUNK_MIN:
+            continue
+        if len(minutes) == 0 and (completed or (timeout > 0 and time.monotonic() - idle_since >= timeout)):
+            return
+        time.sleep(interval)
+
 # JSON file writer
-def tojsonfile(infilepath, outfilepath, start=0, stop=0):
+def tojsonfile(infilepath, outfilepath, start=0, stop=0, ndjson=False):
     """! Read binary stats file and then output json file with needed information.
+    The file is written one chunk of minutes at a time, so memory use does not depend on the recording length.
 
     @param infilepath the path to the stats binary file
     @param outfilepath the path to the output JSON file
     @param start the start minute from the begining to begin reading the stat data
     @param stop the end minute from the begining to end the reading, resulting data will include the stop minute.
+    @param ndjson write newline delimited JSON instead: the header on the first line, then one line per minute
 
     """
     # get data
-    data = tojson(infilepath, start, stop)
+    records = iterstatsdata(infilepath, start, stop)
+    header = next(records)
 
     # put to json file
     try:
-        with open(outfilepath, 'w') as file:
-            return file.write(data)
+        with span("stats.tojson") as sp, open(outfilepath, 'w') as file:
+            if ndjson:
+                written = file.write(json.dumps(header) + "\n")
+                for record in records:
+                    written += file.write(json.dumps(record) + "\n")
+            elif JSON_NAME_ERROR in header:
+                written = file.write(json.dumps(header))
+            else:
+                # Same text as json.dumps of the getstatsdata dictionary
+                written = file.write(json.dumps(header)[:-1] + ", " + json.dumps(JSON_NAME_PER_MIN_STATS) + ": [")
+                separator = ""
+                for record in records:
+                    written += file.write(separator + json.dumps(record))
+                    separator = ", "
+                written += file.write("]}")
+            sp.add(bytes_read=MHEADER_SIZE + header.get(JSON_NAME_DURATION_MIN, 0) * (HEADER_SIZE + PAYLOAD_SIZE * header.get(JSON_NAME_NUMCHAN, 0)),
+                   bytes_written=written, files=1)
+            return written
+    except (IOError, OSError) as e:
+        return {JSON_NAME_ERROR:e}
+
+# Columnar file writer
+def tocolumnfile(infilepath, outfilepath, start=0, stop=0):
+    """! Read binary stats file and then output a columnar file, one column per field. The format is picked from the
+    output file extension: ".parquet" needs pyarrow, anything else is written as NumPy ".npz".
+    Columns are minute (minute from the recording start), tempreture and battery(mV) of shape (minutes,), and the channel
+    fields of shape (minutes, channels), stored as fixed size list columns in Parquet. The header information from
+    extractinfo plus the channel IDs are stored as JSON metadata.
+
+    @param infilepath the path to the stats binary file
+    @param outfilepath the path to the output .parquet or .npz file
+    @param start the start minute from the begining to begin reading the stat data
+    @param stop the end minute from the begining to end the reading, resulting data will include the stop minute.
+
+    @return number of bytes written or error message
+    """
+    parquet = outfilepath.lower().endswith(".parquet")
+    if np is None or (parquet and pq is None):
+        return {JSON_NAME_ERROR:("pyarrow" if np is not None else "numpy") + " is required to write " + outfilepath}
+
+    data = getstatsarrays(infilepath, start, stop)
+    if JSON_NAME_ERROR in data:
+        return data
+
+    columns = {}
+    for name in (JSON_NAME_TEMPRETURE, JSON_NAME_BATTERY_MV, JSON_NAME_ID, JSON_NAME_MINVAL, JSON_NAME_MAXVAL,
+                 JSON_NAME_AVGVAL, JSON_NAME_SAT_COUNT, JSON_NAME_MISF_COUNT):
+        columns[name] = data.pop(name)
+    num_minutes = len(columns[JSON_NAME_TEMPRETURE])
+    columns = dict({COLUMN_NAME_MINUTE: np.arange(start, start + num_minutes, dtype=np.uint32)}, **columns)
+    data[COLUMN_NAME_CHANNEL_IDS] = columns[JSON_NAME_ID][0].tolist() if num_minutes > 0 else []
+    metadata = json.dumps(data)
+
+    try:
+        if parquet:
+            arrays = {}
+            for name, column in columns.items():
+                if column.ndim == 2:
+                    column = pa.FixedSizeListArray.from_arrays(pa.array(column.reshape(-1)), column.shape[1])
+                arrays[name] = column
+            pq.write_table(pa.table(arrays, metadata={COLUMN_METADATA_KEY: metadata}), outfilepath)
+        else:
+            with open(outfilepath, "wb") as file:
+                np.savez(file, **{COLUMN_METADATA_KEY: np.array(metadata)}, **columns)
+        return os.path.getsize(outfilepath)
     except (IOError, OSError) as e:
         return {JSON_NAME_ERROR:e}
 
+# Columnar file reader
+def readcolumnfile(filepath):
+    """! Read a file written by tocolumnfile back
+
+    @param filepath the path to the .parquet or .npz file
+    @return dictionary like the one returned by getstatsarrays, plus the minute and channelids entries, or error message
+    """
+    parquet = filepath.lower().endswith(".parquet")
+    if np is None or (parquet and pq is None):
+        return {JSON_NAME_ERROR:("pyarrow" if np is not None else "numpy") + " is required to read " + filepath}
+    if parquet:
+        table = pq.read_table(filepath)
+        data = json.loads(table.schema.metadata[COLUMN_METADATA_KEY.encode()])
+        for name in table.column_names:
+            column = table.column(name).combine_chunks()
+            if pa.types.is_fixed_size_list(column.type):
+                data[name] = column.flatten().to_numpy().reshape(-1, column.type.list_size)
+            else:
+                data[name] = column.to_numpy()
+        return data
+    with np.load(filepath) as npz:
+        data = json.loads(str(npz[COLUMN_METADATA_KEY]))
+        for name in npz.files:
+            if name != COLUMN_METADATA_KEY:
+                data[name] = npz[name]
+    return data
+
+# Rollup builder
+def rollup(arrays, start_time, minutes_per_bin):
+    """! Summarize per minute arrays into bins aligned to UTC (e.g. whole hours)
+
+    @param arrays dictionary of numpy arrays as returned by decodeblocks, for consecutive minutes
+    @param start_time unix timestamp of the first minute in arrays
+    @param minutes_per_bin the bin size in minutes
+    @return dictionary of time(bin start unix timestamp), minutes(number of minutes in the bin), mean tempreture and
+            battery(mV), and per channel min of minvalue, max of maxvalue, mean of avgvalue, sum of saturationcount and
+            missingframecount
+    """
+    bins = (start_time // 60 + np.arange(len(arrays[JSON_NAME_TEMPRETURE]))) // minutes_per_bin
+    firsts = np.concatenate(([0], np.flatnonzero(np.diff(bins)) + 1))
+    counts = np.diff(np.concatenate((firsts, [len(bins)])))
+    return {
+        ROLLUP_NAME_TIME: bins[firsts] * minutes_per_bin * 60,
+        ROLLUP_NAME_MINUTES: counts,
+        JSON_NAME_TEMPRETURE: np.add.reduceat(arrays[JSON_NAME_TEMPRETURE], firsts, dtype=np.float64) / counts,
+        JSON_NAME_BATTERY_MV: np.add.reduceat(arrays[JSON_NAME_BATTERY_MV], firsts, dtype=np.float64) / counts,
+        JSON_NAME_MINVAL: np.minimum.reduceat(arrays[JSON_NAME_MINVAL], firsts, axis=0),
+        JSON_NAME_MAXVAL: np.maximum.reduceat(arrays[JSON_NAME_MAXVAL], firsts, axis=0),
+        JSON_NAME_AVGVAL: np.add.reduceat(arrays[JSON_NAME_AVGVAL], firsts, axis=0, dtype=np.float64) / counts[:, None],
+        JSON_NAME_SAT_COUNT: np.add.reduceat(arrays[JSON_NAME_SAT_COUNT], firsts, axis=0, dtype=np.uint64),
+        JSON_NAME_MISF_COUNT: np.add.reduceat(arrays[JSON_NAME_MISF_COUNT], firsts, axis=0, dtype=np.uint64),
+    }
+
+def rolluppath(filepath, rollupdir=None):
+    """! Get the path of the rollup sidecar of a stats file
+
+    @param filepath the path to the stats binary file
+    @param rollupdir folder to keep the rollup in, named after the stats file and a hash of its path. None uses the folder
+                     named by the ROLLUP_DIR_ENV environment variable, or filepath + ROLLUP_SUFFIX when not set
+    @return the rollup file path
+    """
+    rollupdir = rollupdir or os.environ.get(ROLLUP_DIR_ENV)
+    if not rollupdir:
+        return filepath + ROLLUP_SUFFIX
+    abspath = os.path.abspath(filepath)
+    return os.path.join(rollupdir, os.path.basename(abspath) + "_" + hashlib.sha1(abspath.encode()).hexdigest()[:12] +
+                        ROLLUP_SUFFIX)
+
+def makerollup(filepath):
+    """! Build the rollups of a stats file at every resolution of ROLLUP_RESOLUTIONS in memory
+
+    @param filepath the path to the stats binary file
+    @return dictionary of the arrays named resolution/array and the stats header information(with the size and mtime of
+            the stats file) under COLUMN_METADATA_KEY, as saved in the rollup sidecar, or error message
+    """
+    if np is None:
+        return {JSON_NAME_ERROR:"numpy is required to build rollups"}
+    try:
+        source = os.stat(filepath)
+        with StatsFile(filepath) as stats_file:
+            arrays = stats_file.arrays(0, len(stats_file)) if len(stats_file) > 0 else None
+            info = dict(stats_file.info, starttime=stats_file.starttime)
+    except ValueError as e:
+        return {JSON_NAME_ERROR:str(e)}
+    except (IOError, OSError) as e:
+        return {JSON_NAME_ERROR:e}
+
+    info["sourcesize"], info["sourcemtime"] = source.st_size, source.st_mtime_ns
+    content = {COLUMN_METADATA_KEY: np.array(json.dumps(info))}
+    for resolution, minutes_per_bin in ROLLUP_RESOLUTIONS.items():
+        if arrays is None:
+            continue
+        for name, values in rollup(arrays, info["starttime"], minutes_per_bin).items():
+            content[resolution + "/" + name] = values
+    return content
+
+def buildrollup(filepath, rollupdir=None, content=None):
+    """! Build the rollups of a stats file at every resolution of ROLLUP_RESOLUTIONS and save them next to the stats
+    file (filepath + ROLLUP_SUFFIX), or in rollupdir
+
+    @param filepath the path to the stats binary file
+    @param rollupdir folder to keep the rollup in, see rolluppath
+    @param content the rollups already built by makerollup, None builds them
+    @return number of bytes written or error message
+    """
+    if content is None:
+        content = makerollup(filepath)
+        if JSON_NAME_ERROR in content:
+            return content
+    outpath = rolluppath(filepath, rollupdir)
+    try:
+        if outpath != filepath + ROLLUP_SUFFIX:
+            os.makedirs(os.path.dirname(outpath), exist_ok=True)
+        with open(outpath, "wb") as file:
+            np.savez(file, **content)
+        return os.path.getsize(outpath)
+    except (IOError, OSError) as e:
+        return {JSON_NAME_ERROR:e}
+
+# Rollup query
+def getstatsrollup(filepath, resolution="hour", start=0, stop=0, rollupdir=None):
+    """! Get the rollup of a stats file at a resolution without decoding the minutes. The rollup sidecar is built, or
+    rebuilt when the stats file changed, on demand. When it can not be saved(e.g. a read-only stats folder without
+    rollupdir) the rollup built in memory is returned, and built again on the next call.
+
+    @param filepath the path to the stats binary file
+    @param resolution one of ROLLUP_RESOLUTIONS
+    @param start the start minute from the begining, bins ending before it are left out
+    @param stop the end minute from the begining, bins starting after it are left out. 0 means till the end
+    @param rollupdir folder to keep the rollup in, see rolluppath
+    @return dictionary of the stats header information, resolution, and the arrays described in rollup
+    """
+    if np is None:
+        return {JSON_NAME_ERROR:"numpy is required to read rollups"}
+    if resolution not in ROLLUP_RESOLUTIONS:
+        return {JSON_NAME_ERROR:"Unknown resolution " + str(resolution) + ", use one of " + ", ".join(ROLLUP_RESOLUTIONS)}
+    try:
+        source = os.stat(filepath)
+    except (IOError, OSError) as e:
+        return {JSON_NAME_ERROR:e}
+
+    def select(content):
+        data = json.loads(str(content[COLUMN_METADATA_KEY]))
+        if data.pop("sourcesize") != source.st_size or data.pop("sourcemtime") != source.st_mtime_ns:
+            return None
+        prefix = resolution + "/"
+        for name in content:
+            if name.startswith(prefix):
+                data[name[len(prefix):]] = content[name]
+        return data
+
+    data = None
+    for attempt in range(2):
+        try:
+            with np.load(rolluppath(filepath, rollupdir)) as npz:
+                data = select(npz)
+            if data is not None:
+                break
+        except (IOError, OSError, ValueError, KeyError):
+            pass
+        if attempt == 0:
+            content = makerollup(filepath)
+            if JSON_NAME_ERROR in content:
+                return content
+            if isinstance(buildrollup(filepath, rollupdir, content), dict):
+                data = select(content)
+                break
+    if data is None:
+        return {JSON_NAME_ERROR:"Could not build the rollup of " + filepath}
+
+    data["resolution"] = resolution
+    if ROLLUP_NAME_TIME in data and (start > 0 or stop > 0):
+        recording_start = data["starttime"]
+        bin_seconds = ROLLUP_RESOLUTIONS[resolution] * 60
+        keep = data[ROLLUP_NAME_TIME] + bin_seconds > recording_start + 60 * start
+        if stop > 0:
+            keep &= data[ROLLUP_NAME_TIME] <= recording_start + 60 * stop
+        for name in (ROLLUP_NAME_TIME, ROLLUP_NAME_MINUTES, JSON_NAME_TEMPRETURE, JSON_NAME_BATTERY_MV, JSON_NAME_MINVAL,
+                     JSON_NAME_MAXVAL, JSON_NAME_AVGVAL, JSON_NAME_SAT_COUNT, JSON_NAME_MISF_COUNT):
+            data[name] = data[name][keep]
+    return data
+
+# Anomaly scanner
+def scanstats(filepath, rules=None, start=0, stop=0, first=False, output="intervals"):
+    """! Find the minutes breaking threshold rules, evaluated on the decoded blocks in vectorized form one chunk at a time.
+    Rules on tempreture or battery(mV) mark all channels of the minute.
+
+    @param filepath the path to the stats binary file
+    @param rules array of (field, operator, threshold), operator one of SCAN_OPERATORS. DEFAULT_SCAN_RULES by default
+    @param start the first minute to scan
+    @param stop the minute to stop scanning at (excluded), 0 means till the end of the file
+    @param first stop at the first bad minute
+    @param output "intervals" for a list of [first, last + 1) bad minute ranges per channel, "bitmap" for a packed bitmap
+                  per channel (numpy.packbits, bit i of a row is minute start + i)
+    @return dictionary of the header information, channelids, number of bad minute/channel pairs (hits), the first bad
+            (minute, channel index) or None, and intervals or bitmap indexed by channel index
+    """
+    if np is None:
+        return {JSON_NAME_ERROR:"numpy is required to scan stats"}
+    if rules is None:
+        rules = DEFAULT_SCAN_RULES
+    for field, op, threshold in rules:
+        if op not in SCAN_OPERATORS or field not in (JSON_NAME_TEMPRETURE, JSON_NAME_BATTERY_MV, JSON_NAME_MINVAL,
+                JSON_NAME_MAXVAL, JSON_NAME_AVGVAL, JSON_NAME_SAT_COUNT, JSON_NAME_MISF_COUNT):
+            return {JSON_NAME_ERROR:"Invalid rule: " + str((field, op, threshold))}
+    try:
+        stats_file = StatsFile(filepath)
+    except ValueError as e:
+        return {JSON_NAME_ERROR:str(e)}
+    except (IOError, OSError) as e:
+        return {JSON_NAME_ERROR:e}
+
+    with stats_file:
+        data_dict = dict(stats_file.info)
+        if stop == 0 or stop > len(stats_file):
+            stop = len(stats_file)
+        num_channels = stats_file.numchannels
+        masks = []
+        data_dict[COLUMN_NAME_CHANNEL_IDS] = []
+        data_dict["firstbad"] = None
+        for chunk_start in range(start, stop, STREAM_CHUNK_MIN):
+            arrays = stats_file.arrays(chunk_start, min(chunk_start + STREAM_CHUNK_MIN, stop))
+            if len(data_dict[COLUMN_NAME_CHANNEL_IDS]) == 0:
+                data_dict[COLUMN_NAME_CHANNEL_IDS] = arrays[JSON_NAME_ID][0].tolist()
+            mask = np.zeros(arrays[JSON_NAME_ID].shape, dtype=bool)
+            for field, op, threshold in rules:
+                bad = getattr(operator, SCAN_OPERATORS[op])(arrays[field], threshold)
+                mask |= bad[:, None] if bad.ndim == 1 else bad
+            masks.append(mask)
+            if first and mask.any():
+                minute, channel = np.argwhere(mask)[0].tolist()
+                data_dict["firstbad"] = (chunk_start + minute, channel)
+                break
+    mask = np.concatenate(masks) if len(masks) > 0 else np.zeros((0, num_channels), dtype=bool)
+    if first:
+        mask = mask[:data_dict["firstbad"][0] - start + 1] if data_dict["firstbad"] else mask
+    elif mask.any():
+        minute, channel = np.argwhere(mask)[0].tolist()
+        data_dict["firstbad"] = (start + minute, channel)
+    data_dict["hits"] = int(mask.sum())
+
+    if output == "bitmap":
+        data_dict["bitmap"] = np.packbits(mask.T, axis=1)
+    else:
+        padded = np.zeros((mask.shape[0] + 2, num_channels), dtype=np.int8)
+        padded[1:-1] = mask
+        edges = np.diff(padded, axis=0)
+        data_dict["intervals"] = []
+        for j in range(num_channels):
+            firsts, lasts = np.flatnonzero(edges[:, j] == 1), np.flatnonzero(edges[:, j] == -1)
+            data_dict["intervals"].append([[int(a) + start, int(b) + start] for a, b in zip(firsts, lasts)])
+    return data_dict
+
+# Survey aggregation
+def findstatsfiles(rootpath, depth=SURVEY_SEARCH_DEPTH):
+    """! Find the stats files of all the recordings under a folder. Folders holding a stats file are recordings and are
+    not searched further, so channel folders with their many data files are never listed.
+
+    @param rootpath the folder to search
+    @param depth how many folder levels below rootpath to search
+    @return sorted array of stats file paths
+    """
+    found = []
+    folders = [(rootpath, 0)]
+    while len(folders) > 0:
+        folder, level = folders.pop()
+        try:
+            entries = list(os.scandir(folder))
+        except (IOError, OSError) as e:
+            if DEBUG:
+                print(e)
+            continue
+        if any(entry.name == STATS_FILENAME and entry.is_file() for entry in entries):
+            found.append(os.path.join(folder, STATS_FILENAME))
+        elif level < depth:
+            folders.extend((entry.path, level + 1) for entry in entries if entry.is_dir())
+    return sorted(found)
+
+def decodestatsfile(filepath):
+    """! Decode a whole stats file for aggregation, in a worker process
+
+    @param filepath the path to the stats binary file
+    @return dictionary of the header information, starttime and the arrays of decodeblocks, or the error dictionary
+    """
+    try:
+        with StatsFile(filepath) as stats_file:
+            data_dict = dict(stats_file.info, starttime=stats_file.starttime)
+            data_dict.update(stats_file.arrays(0, len(stats_file)) if len(stats_file) > 0 else {})
+            return data_dict
+    except (IOError, OSError, ValueError) as e:
+        return {JSON_NAME_ERROR:str(e)}
+
+def aggregatestats(rootpath, processes=None, fields=None, depth=SURVEY_SEARCH_DEPTH):
+    """! Decode the stats files of every recording under a survey folder in parallel and line the minutes up on UTC time.
+    Recordings of the same instrument are merged into one station.
+
+    @param rootpath the survey folder holding the recording folders
+    @param processes number of worker processes, None means the number of CPUs
+    @param fields the fields to aggregate, all of tempreture, battery(mV), minvalue, maxvalue, avgvalue, saturationcount
+                  and missingframecount by default
+    @param depth how many folder levels below rootpath to search for recordings
+    @return dictionary of stations(instrument IDs), time(unix timestamp of each minute), channels(the channel IDs found,
+            sorted, one column each), files,
+            errors(file path to error message) and one float32 array per field shaped (stations, minutes, channels), or
+            (stations, minutes) for tempreture and battery(mV). Minutes without data are NaN.
+    """
+    if np is None:
+        return {JSON_NAME_ERROR:"numpy is required to aggregate stats"}
+    if fields is None:
+        fields = [JSON_NAME_TEMPRETURE, JSON_NAME_BATTERY_MV, JSON_NAME_MINVAL, JSON_NAME_MAXVAL, JSON_NAME_AVGVAL,
+                  JSON_NAME_SAT_COUNT, JSON_NAME_MISF_COUNT]
+    filepaths = findstatsfiles(rootpath, depth)
+    with span("stats.survey") as sp:
+        sp.add(files=len(filepaths))
+        if processes == 1 or len(filepaths) <= 1:
+            decoded = list(map(decodestatsfile, filepaths))
+        else:
+            with futures.ProcessPoolExecutor(max_workers=processes) as executor:
+                decoded = list(executor.map(decodestatsfile, filepaths))
+
+    result = {"files": [], "errors": {}}
+    recordings = []
+    for filepath, data in zip(filepaths, decoded):
+        if JSON_NAME_ERROR in data:
+            result["errors"][filepath] = data[JSON_NAME_ERROR]
+        elif data[JSON_NAME_DURATION_MIN] > 0:
+            result["files"].append(filepath)
+            recordings.append(data)
+
+    stations = sorted(set(data[JSON_NAME_RECID].split("_")[0] for data in recordings))
+    first_minute = min((data["starttime"] // 60 for data in recordings), default=0)
+    last_minute = max((data["starttime"] // 60 + data[JSON_NAME_DURATION_MIN] for data in recordings), default=0)
+    channel_ids = np.unique(np.concatenate([data[JSON_NAME_ID].ravel() for data in recordings] or [[]])).astype(np.int64)
+    num_channels = len(channel_ids)
+    result["stations"] = stations
+    result["time"] = np.arange(first_minute, last_minute, dtype=np.int64) * 60
+    result["channels"] = channel_ids.tolist()
+    for field in fields:
+        shape = (len(stations), last_minute - first_minute)
+        if field not in (JSON_NAME_TEMPRETURE, JSON_NAME_BATTERY_MV):
+            shape += (num_channels,)
+        result[field] = np.full(shape, np.nan, dtype=np.float32)
+
+    for data in recordings:
+        station = stations.index(data[JSON_NAME_RECID].split("_")[0])
+        minutes = np.arange(data[JSON_NAME_DURATION_MIN]) + data["starttime"] // 60 - first_minute
+        for field in fields:
+            if field in (JSON_NAME_TEMPRETURE, JSON_NAME_BATTERY_MV):
+                result[field][station, minutes] = data[field]
+            else:
+                # Place each value in the column of its channel ID
+                result[field][station, minutes[:, None], np.searchsorted(channel_ids, data[JSON_NAME_ID])] = data[field]
+    return result
+
+# Shrink range calculation
+def shrinkrange(data_info, start=0, stop=0):
+    """! Calculate which blocks a shrink with the given start and stop minutes picks. The duration in data_info is
+    updated to the duration of the shrinked file.
+
+    @param data_info dictionary returned by extractinfo for the source stats file
+    @param start the start minute from the begining to begin reading the new stat file
+    @param stop the end minute from the begining to end the reading, resulting data will include the stop minute.
+
+    @return (start_offset, stop_offset, data_block_size), offsets of the first and last block after the master header
+    """
+    if not start==0:
+        if stop == 0:
+            data_info[JSON_NAME_DURATION_MIN] -= start
+        else:
+            data_info[JSON_NAME_DURATION_MIN] = stop - start + 1
+    elif not stop == 0:
+        data_info[JSON_NAME_DURATION_MIN] -= data_info[JSON_NAME_DURATION_MIN] - stop - 1
+
+    start_offset = 0
+    data_block_size = HEADER_SIZE + data_info[JSON_NAME_NUMCHAN] * PAYLOAD_SIZE
+    if start > 0:
+        start_offset = data_block_size * (start - 1)
+
+    stop_offset = data_block_size * (data_info[JSON_NAME_DURATION_MIN] - 1)
+    if stop > 0:
+        stop_offset = data_block_size * (stop - 1)
+    return start_offset, stop_offset, data_block_size
+
 # File shrinker
 def shrinkto(infilepath, outfilepath, start=0, stop=0):
     """! Read binary stats file and then output shrinked binary file with new start and stop. If start time changed, new 
@@ -216,14 +1109,7 @@ def shrinkto(infilepath, outfilepath, start=0, stop=0):
 
     # Read data info
     data_info = extractinfo(bytearray(stat_bin))
-    if not start==0:
-        if stop == 0:
-            data_info[JSON_NAME_DURATION_MIN] -= start
-        else:
-            data_info[JSON_NAME_DURATION_MIN] = stop - start + 1
-    elif not stop == 0:
-        data_info[JSON_NAME_DURATION_MIN] -= data_info[JSON_NAME_DURATION_MIN] - stop - 1
-    
+    start_offset, stop_offset, data_block_size = shrinkrange(data_info, start, stop)
     if data_info[JSON_NAME_DURATION_MIN] == 0:
         if DEBUG:
             print("Unexpected 0 length duration")
@@ -243,15 +1129,6 @@ def shrinkto(infilepath, outfilepath, start=0, stop=0):
             print("New start time written:", struct.unpack('I', bytes(result_array[10:14]))[0])
 
     # Pick the data needed
-    start_offset = 0
-    data_block_size = HEADER_SIZE + data_info[JSON_NAME_NUMCHAN] * PAYLOAD_SIZE
-    if start > 0:
-        start_offset = data_block_size * (start - 1)
-
-    stop_offset = data_block_size * (data_info[JSON_NAME_DURATION_MIN] - 1)
-    if stop > 0:
-        stop_offset = data_block_size * (stop - 1)
-    
     current_offset = start_offset
     while current_offset <= stop_offset:
         result_array.extend(stat_bin_arr[(current_offset+MHEADER_SIZE):(current_offset+MHEADER_SIZE+data_block_size)])
@@ -260,9 +1137,201 @@ def shrinkto(infilepath, outfilepath, start=0, stop=0):
         print("Extracted", (len(result_array)-MHEADER_SIZE)/data_block_size, "min of data")
 
     try:
-        with open(outfilepath, 'wb') as file:
-            return file.write(bytes(result_array))
+        with span("stats.shrink") as sp, open(outfilepath, 'wb') as file:
+            written = file.write(bytes(result_array))
+            sp.add(bytes_read=len(stat_bin), bytes_written=written, files=1)
+            return written
     except (IOError, OSError) as e:
         if DEBUG:
             print("error: " + e)
-        return e
\ No newline at end of file
+        return e
+
+# Byte range copy
+def copyrange(infile, outfile, offset, count, hasher=None):
+    """! Copy count bytes from offset of infile to the current position of outfile. The kernel does the copy with
+    os.copy_file_range or os.sendfile when they are available, otherwise the data is copied in chunks. A kernel copy
+    that stops making progress(some file systems copy nothing) hands the rest over to the next way.
+
+    @param infile the source file object, opened in binary mode
+    @param outfile the destination file object, opened in binary mode without buffering
+    @param hasher a hashlib like object updated with the copied bytes, the data is then always copied in chunks so it is
+                  read only once
+    @return number of bytes copied
+    """
+    in_fd, out_fd = infile.fileno(), outfile.fileno()
+    copied = 0
+    kernel_copies = (getattr(os, "copy_file_range", None), getattr(os, "sendfile", None)) if hasher is None else ()
+    for kernel_copy in kernel_copies:
+        if kernel_copy is None:
+            continue
+        try:
+            while copied < count:
+                if kernel_copy is os.sendfile:
+                    sent = os.sendfile(out_fd, in_fd, offset + copied, count - copied)
+                else:
+                    sent = os.copy_file_range(in_fd, out_fd, count - copied, offset + copied)
+                if sent == 0:
+                    break
+                copied += sent
+        except OSError:
+            if copied > 0:
+                raise
+        if copied >= count:
+            return copied
+    infile.seek(offset + copied)
+    while copied < count:
+        chunk = infile.read(min(COPY_CHUNK_SIZE, count - copied))
+        if not chunk:
+            break
+        outfile.write(chunk)
+        if hasher is not None:
+            hasher.update(chunk)
+        copied += len(chunk)
+    return copied
+
+# Streaming file shrinker
+def shrinkcopyto(infilepath, outfilepath, start=0, stop=0, hasher=None):
+    """! Same as shrinkto, but the picked minutes are copied as one byte range from the source file to the output file
+    instead of being collected in memory, so memory use stays constant whatever the stats file size.
+
+    @param infilepath the path to the stats binary file
+    @param outfilepath the path to the output binary file
+    @param start the start minute from the begining to begin reading the new stat file
+    @param stop the end minute from the begining to end the reading, resulting data will include the stop minute.
+    @param hasher a hashlib like object updated with the bytes written, see copyrange
+
+    @return number of bytes wrote or error message
+    """
+    # Check input
+    if stop != 0 and stop < start:
+        if DEBUG:
+            print("Invalid start and stop time: " + str(start) + " " + str(stop))
+        return 0
+    try:
+        with open(infilepath, "rb") as infile:
+            file_size = os.fstat(infile.fileno()).st_size
+            header = bytearray(infile.read(MHEADER_SIZE))
+            if start == stop == 0:
+                if DEBUG:
+                    print("start and stop time both 0, copy file without changing")
+                with open(outfilepath, "wb", buffering=0) as outfile:
+                    return copyrange(infile, outfile, 0, file_size, hasher)
+
+            data_info = extractinfo(header)
+            data_info[JSON_NAME_DURATION_MIN] = int((file_size - MHEADER_SIZE) / (HEADER_SIZE + PAYLOAD_SIZE * data_info[JSON_NAME_NUMCHAN]))
+            start_offset, stop_offset, data_block_size = shrinkrange(data_info, start, stop)
+            if data_info[JSON_NAME_DURATION_MIN] == 0:
+                if DEBUG:
+                    print("Unexpected 0 length duration")
+                return 0
+
+            # Need to write new start time if changed
+            if start > 0:
+                start_time_unix = struct.unpack_from('I', header, 10)[0]
+                struct.pack_into('I', header, 10, start_time_unix + 60 * start)
+
+            range_start = MHEADER_SIZE + start_offset
+            range_stop = min(MHEADER_SIZE + stop_offset + data_block_size, file_size)
+            with span("stats.shrinkcopy") as sp, open(outfilepath, "wb", buffering=0) as outfile:
+                written = outfile.write(header)
+                if hasher is not None:
+                    hasher.update(header)
+                if range_stop > range_start:
+                    written += copyrange(infile, outfile, range_start, range_stop - range_start, hasher)
+                sp.add(bytes_read=MHEADER_SIZE + max(range_stop - range_start, 0), bytes_written=written, files=1)
+                return written
+    except (IOError, OSError) as e:
+        if DEBUG:
+            print("error: " + str(e))
+        return e
+
+# Gap block builder
+def gapblock(channel_ids):
+    """! Build the minute block written for a minute with no data: tempreture and battery 0, and for each channel NaN
+    min/max/avg values, no saturation and MISSING_FRAME_MARK missing frames, so scanstats reports it as bad.
+
+    @param channel_ids the channel ID of each channel payload
+    @return bytes of one minute block
+    """
+    block = bytearray(HEADER_SIZE)
+    for channel_id in channel_ids:
+        block += struct.pack(CHAN_FORMAT, channel_id, float("nan"), float("nan"), float("nan"), 0, MISSING_FRAME_MARK)
+    return bytes(block)
+
+# Streaming file merger
+def mergeto(infilepaths, outfilepath, hasher=None):
+    """! Join consecutive stats files of one instrument, such as the recordings of an instrument that restarted, into one
+    stats file starting at the earliest one. The minutes between two files are filled with gap blocks(see gapblock), and
+    the minutes of a file already covered by an earlier one are skipped. The minutes are copied as byte ranges, see
+    copyrange, so memory use does not depend on the file sizes.
+
+    @param infilepaths the paths to the stats binary files, in any order, they are sorted by start time
+    @param outfilepath the path to the output binary file
+    @param hasher a hashlib like object updated with the bytes written, see copyrange
+
+    @return number of bytes wrote or error message
+    """
+    sources = []
+    try:
+        with span("stats.merge") as sp:
+            for infilepath in infilepaths:
+                infile = open(infilepath, "rb")
+                sources.append(infile)
+                header = infile.read(MHEADER_SIZE)
+                error = checkheader(header, infilepath)
+                if error:
+                    return error
+                info = extractinfo(header)
+                blocksize = HEADER_SIZE + PAYLOAD_SIZE * info[JSON_NAME_NUMCHAN]
+                info[JSON_NAME_DURATION_MIN] = (os.fstat(infile.fileno()).st_size - MHEADER_SIZE) // blocksize
+                # The channel IDs of the first minute, to check the files hold the same channels
+                first = infile.read(blocksize)
+                channel_ids = sorted(first[HEADER_SIZE + PAYLOAD_SIZE * j] for j in range(info[JSON_NAME_NUMCHAN])) if len(first) == blocksize else None
+                sources[-1] = (struct.unpack_from('I', header, 10)[0], infilepath, infile, header, info, channel_ids)
+            sources.sort(key=lambda source: source[0])
+            if len(sources) == 0:
+                return {JSON_NAME_ERROR:"No stats file to merge"}
+
+            starttime, firstpath, _, firstheader, firstinfo, channel_ids = sources[0]
+            for _, infilepath, _, _, info, ids in sources[1:]:
+                for name in (JSON_NAME_VERSION, JSON_NAME_NUMCHAN):
+                    if info[name] != firstinfo[name]:
+                        return {JSON_NAME_ERROR:"File " + infilepath + " " + name + " " + str(info[name]) + " does not match " + str(firstinfo[name]) + " of " + firstpath}
+                if info[JSON_NAME_RECID].split("_")[0] != firstinfo[JSON_NAME_RECID].split("_")[0]:
+                    return {JSON_NAME_ERROR:"File " + infilepath + " is not from the instrument of " + firstpath}
+                if ids is not None and channel_ids is not None and ids != channel_ids:
+                    return {JSON_NAME_ERROR:"File " + infilepath + " channel IDs " + str(ids) + " do not match " + str(channel_ids) + " of " + firstpath}
+                channel_ids = channel_ids or ids
+
+            blocksize = HEADER_SIZE + PAYLOAD_SIZE * firstinfo[JSON_NAME_NUMCHAN]
+            gap = gapblock(channel_ids or [0] * firstinfo[JSON_NAME_NUMCHAN])
+            with open(outfilepath, "wb", buffering=0) as outfile:
+                written = outfile.write(firstheader)
+                if hasher is not None:
+                    hasher.update(firstheader)
+                minutes = 0
+                bytes_read = 0
+                for filestart, _, infile, _, info, _ in sources:
+                    offset = (filestart - starttime) // 60
+                    # Fill the minutes with no file a chunk at a time
+                    while minutes < offset:
+                        chunk = gap * min(offset - minutes, max(COPY_CHUNK_SIZE // blocksize, 1))
+                        written += outfile.write(chunk)
+                        if hasher is not None:
+                            hasher.update(chunk)
+                        minutes += len(chunk) // blocksize
+                    skip = minutes - offset
+                    if skip < info[JSON_NAME_DURATION_MIN]:
+                        copied = copyrange(infile, outfile, MHEADER_SIZE + skip * blocksize, (info[JSON_NAME_DURATION_MIN] - skip) * blocksize, hasher)
+                        written += copied
+                        bytes_read += copied
+                        minutes = offset + info[JSON_NAME_DURATION_MIN]
+            sp.add(bytes_read=MHEADER_SIZE * len(sources) + bytes_read, bytes_written=written, files=len(sources))
+            return written
+    except (IOError, OSError) as e:
+        if DEBUG:
+            print("error: " + str(e))
+        return {JSON_NAME_ERROR:e}
+    finally:
+        for source in sources:
+            (source[2] if isinstance(source, tuple) else source).close()
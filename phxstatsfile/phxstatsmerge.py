@@ -0,0 +1,50 @@
+# Author: Phoenix Geohysics Ltd.
+# Creation: 2026-10-18
+
+try:
+    from phxstatsfile import phxstatsfile as stats
+except ImportError:
+    import phxstatsfile as stats
+import argparse as ap
+import os, sys
+
+def file_path(path):
+    if os.path.isfile(path):
+        return path
+    else:
+        raise ap.ArgumentTypeError(f"readable_dir:{path} is not a valid path")
+    
+def out_path(path):
+    if os.path.isdir(os.path.dirname(path) or "."):
+        return path
+    else:
+        raise ap.ArgumentTypeError(f"readable_dir:{path} is not a valid path")
+
+def main(argv=None, prog=None):
+    """! Run the merger, also run by phx.py statsmerge
+
+    @param argv The command line arguments without the program name, default sys.argv[1:]
+    @param prog The program name shown in the help, default the script name
+    @return The exit status
+    """
+    parser = ap.ArgumentParser(prog=prog, description='A merger that joins consecutive Phoenix stats binaries into one, filling the minutes between them with missing-frame blocks.')
+    parser.add_argument('-i', '--infile', dest='inpaths', type=file_path, nargs='+', required=True,
+                        help='Specify the stats file paths, required')
+    parser.add_argument('-o', '--outfile', dest='outpath', type=out_path, required=True,
+                        help='Specify output stats file path, required')
+    parser.add_argument('--profile', dest='profile',
+                        help='Write the time, bytes and file counts of each phase to this JSON file')
+    args = parser.parse_args(argv)
+    profile = stats.Profile()
+    if args.profile:
+        stats.addhook(profile)
+
+    written = stats.mergeto(args.inpaths, args.outpath)
+    print(written)
+    if args.profile:
+        stats.removehook(profile)
+        profile.tojsonfile(args.profile)
+    return 0 if isinstance(written, int) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,12 @@
 # Author: Phoenix Geohysics Ltd.
 # Creation: 2024-08-14
 
-import phxstatsfile as stats
+try:
+    from phxstatsfile import phxstatsfile as stats
+except ImportError:
+    import phxstatsfile as stats
 import argparse as ap
-import os
+import os, sys
 
 def file_path(path):
     if os.path.isfile(path):
@@ -12,26 +15,40 @@ def file_path(path):
         raise ap.ArgumentTypeError(f"readable_dir:{path} is not a valid path")
     
 def out_path(path):
-    if os.path.isdir(os.path.dirname(path)):
+    if os.path.isdir(os.path.dirname(path) or "."):
         return path
     else:
         raise ap.ArgumentTypeError(f"readable_dir:{path} is not a valid path")
 
-if __name__ == "__main__":
-    parser = ap.ArgumentParser(description='A shrinker that could pick a subset of minutes from Phoenix stats binary and spawn a new binary.')
-    parser.add_argument('-i, --infile', dest='inpath', type=file_path,
+def main(argv=None, prog=None):
+    """! Run the shrinker, also run by phx.py statsshrink
+
+    @param argv The command line arguments without the program name, default sys.argv[1:]
+    @param prog The program name shown in the help, default the script name
+    @return The exit status
+    """
+    parser = ap.ArgumentParser(prog=prog, description='A shrinker that could pick a subset of minutes from Phoenix stats binary and spawn a new binary.')
+    parser.add_argument('-i', '--infile', dest='inpath', type=file_path, required=True,
                         help='Specify stats file path, required')
-    parser.add_argument('-o, --outfile', dest='outpath', type=out_path,
+    parser.add_argument('-o', '--outfile', dest='outpath', type=out_path, required=True,
                         help='Specify output json file path, required')
-    parser.add_argument('-s, --startmin', dest='start', type=int, default=0,
+    parser.add_argument('-s', '--startmin', dest='start', type=int, default=0,
                         help='Starting point of the output data, how many minutes from the recording start')
-    parser.add_argument('-e, --stopmin', dest='stop', type=int, default=0,
+    parser.add_argument('-e', '--stopmin', dest='stop', type=int, default=0,
                         help='Stop point of the output data, how many minutes from the recording start')
-    args = parser.parse_args()
+    parser.add_argument('--profile', dest='profile',
+                        help='Write the time, bytes and file counts of each phase to this JSON file')
+    args = parser.parse_args(argv)
+    profile = stats.Profile()
+    if args.profile:
+        stats.addhook(profile)
 
-    if not args.inpath:
-        print("You have to specify input stats file path!")
-    elif not args.outpath:
-        print("You have to specify output stats file path!")
-    else:
-        print(stats.shrinkto(args.inpath, args.outpath, args.start, args.stop))
\ No newline at end of file
+    written = stats.shrinkcopyto(args.inpath, args.outpath, args.start, args.stop)
+    print(written)
+    if args.profile:
+        stats.removehook(profile)
+        profile.tojsonfile(args.profile)
+    return 0 if isinstance(written, int) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
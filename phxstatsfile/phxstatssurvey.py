@@ -0,0 +1,60 @@
+# Author: Phoenix Geohysics Ltd.
+# Creation: 2026-10-18
+
+try:
+    from phxstatsfile import phxstatsfile as stats
+except ImportError:
+    import phxstatsfile as stats
+import argparse as ap
+import os, sys, json
+
+def dir_path(path):
+    if os.path.isdir(path):
+        return path
+    else:
+        raise ap.ArgumentTypeError(f"readable_dir:{path} is not a valid path")
+
+def out_path(path):
+    if os.path.isdir(os.path.dirname(path) or "."):
+        return path
+    else:
+        raise ap.ArgumentTypeError(f"readable_dir:{path} is not a valid path")
+
+def main(argv=None, prog=None):
+    """! Run the survey aggregator, also run by phx.py survey
+
+    @param argv The command line arguments without the program name, default sys.argv[1:]
+    @param prog The program name shown in the help, default the script name
+    @return The exit status
+    """
+    parser = ap.ArgumentParser(prog=prog, description='Combine the stats files of all recordings in a survey folder into one station x minute x channel table.')
+    parser.add_argument('-i', '--infolder', dest='inpath', type=dir_path, required=True,
+                        help='Specify the survey folder holding the recordings, required')
+    parser.add_argument('-o', '--outfile', dest='outpath', type=out_path, required=True,
+                        help='Specify output .npz file path, required')
+    parser.add_argument('-p', '--processes', dest='processes', type=int, default=None,
+                        help='Number of stats files decoded at the same time, default the number of CPUs')
+    parser.add_argument('--profile', dest='profile',
+                        help='Write the time, bytes and file counts of each phase to this JSON file')
+    args = parser.parse_args(argv)
+    profile = stats.Profile()
+    if args.profile:
+        stats.addhook(profile)
+
+    result = stats.aggregatestats(args.inpath, args.processes)
+    if stats.JSON_NAME_ERROR in result:
+        print(result[stats.JSON_NAME_ERROR])
+    else:
+        for filepath, error in result.pop("errors").items():
+            print("Skipped", filepath + ":", error)
+        metadata = {name: result.pop(name) for name in ("stations", "channels", "files")}
+        with open(args.outpath, "wb") as file:
+            stats.np.savez(file, **{stats.COLUMN_METADATA_KEY: stats.np.array(json.dumps(metadata))}, **result)
+        print(len(metadata["stations"]), "stations,", len(result["time"]), "minutes written to", args.outpath)
+    if args.profile:
+        stats.removehook(profile)
+        profile.tojsonfile(args.profile)
+    return 1 if stats.JSON_NAME_ERROR in result else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
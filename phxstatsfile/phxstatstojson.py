@@ -1,9 +1,12 @@
 # Author: Phoenix Geohysics Ltd.
 # Creation: 2024-08-06
 
-import phxstatsfile as stats
+try:
+    from phxstatsfile import phxstatsfile as stats
+except ImportError:
+    import phxstatsfile as stats
 import argparse as ap
-import os
+import os, sys, json
 
 def file_path(path):
     if os.path.isfile(path):
@@ -12,26 +15,58 @@ def file_path(path):
         raise ap.ArgumentTypeError(f"readable_dir:{path} is not a valid path")
     
 def out_path(path):
-    if os.path.isdir(os.path.dirname(path)):
+    if os.path.isdir(os.path.dirname(path) or "."):
         return path
     else:
         raise ap.ArgumentTypeError(f"readable_dir:{path} is not a valid path")
 
-if __name__ == "__main__":
-    parser = ap.ArgumentParser(description='A converter that converts Phoenix stats binary to json')
-    parser.add_argument('-i, --infile', dest='inpath', type=file_path,
+def main(argv=None, prog=None):
+    """! Run the converter, also run by phx.py tojson
+
+    @param argv The command line arguments without the program name, default sys.argv[1:]
+    @param prog The program name shown in the help, default the script name
+    @return The exit status
+    """
+    parser = ap.ArgumentParser(prog=prog, description='A converter that converts Phoenix stats binary to json')
+    parser.add_argument('-i', '--infile', dest='inpath', type=file_path, required=True,
                         help='Specify stats file path')
-    parser.add_argument('-o, --outfile', dest='outpath', type=out_path,
+    parser.add_argument('-o', '--outfile', dest='outpath', type=out_path,
                         help='Specify output json file path, if not specified, will use the same path as the source file')
-    parser.add_argument('-s, --startmin', dest='start', type=int, default=0,
+    parser.add_argument('-s', '--startmin', dest='start', type=int, default=0,
                         help='Starting point of the output data, how many minutes from the recording start')
-    parser.add_argument('-e, --stopmin', dest='stop', type=int, default=0,
+    parser.add_argument('-e', '--stopmin', dest='stop', type=int, default=0,
                         help='Stop point of the output data, how many minutes from the recording start')
-    args = parser.parse_args()
+    parser.add_argument('-n', '--ndjson', dest='ndjson', action='store_true',
+                        help='Write newline delimited JSON: the header on the first line, then one line per minute')
+    parser.add_argument('-f', '--follow', dest='follow', action='store_true',
+                        help='Keep following a stats file of a recording in progress and append each new minute as a NDJSON line, '
+                             'until the recording is completed')
+    parser.add_argument('--interval', dest='interval', type=float, default=5.0,
+                        help='Seconds between polls of the stats file in follow mode, default 5')
+    parser.add_argument('--profile', dest='profile',
+                        help='Write the time, bytes and file counts of each phase to this JSON file')
+    args = parser.parse_args(argv)
+    profile = stats.Profile()
+    if args.profile:
+        stats.addhook(profile)
 
-    if not args.inpath:
-        print("You have to specify input stats file path!")
+    if args.follow:
+        if not args.outpath:
+            args.outpath = args.inpath + ".ndjson"
+        written = 0
+        with open(args.outpath, "w") as file:
+            for record in stats.followstats(args.inpath, args.start, args.interval):
+                written += file.write(json.dumps(record) + "\n")
+                file.flush()
     else:
         if not args.outpath:
-            args.outpath = args.inpath + ".json"
-        print(stats.tojsonfile(args.inpath, args.outpath, args.start, args.stop))
\ No newline at end of file
+            args.outpath = args.inpath + (".ndjson" if args.ndjson else ".json")
+        written = stats.tojsonfile(args.inpath, args.outpath, args.start, args.stop, args.ndjson)
+    print(written)
+    if args.profile:
+        stats.removehook(profile)
+        profile.tojsonfile(args.profile)
+    return 0 if isinstance(written, int) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
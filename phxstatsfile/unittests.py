@@ -2,7 +2,7 @@
 # Creation: 2024-07-26
 
 import phxstatsfile as stats
-import os, json, difflib
+import os, json, struct, difflib, tempfile
 
 # header reading test
 def test1():
@@ -30,6 +30,322 @@ def test2():
         print(d.find_longest_match(), "total a: ", len(a), "total b: ", len(b))
         return "fail"
 
+# Vectorized decoder test, must match the plain struct decoding
+def test3():
+    dir = os.path.dirname(__file__)
+    if stats.np is None:
+        return "skip (numpy not installed)"
+    path = os.path.join(dir, "stats_example")
+    results = [stats.getstatsdata(path), stats.getstatsdata(path, 3, 40)]
+    np, stats.np = stats.np, None
+    try:
+        standards = [stats.getstatsdata(path), stats.getstatsdata(path, 3, 40)]
+    finally:
+        stats.np = np
+    if json.dumps(results) == json.dumps(standards):
+        return "pass"
+    else:
+        return "fail"
+
+# Random access reader test
+def test4():
+    dir = os.path.dirname(__file__)
+    path = os.path.join(dir, "stats_example")
+    data = stats.getstatsdata(path)
+    with stats.StatsFile(path) as stats_file:
+        if len(stats_file) == 327 and stats_file[0] == data["perminstats"][0] and stats_file[-1] == data["perminstats"][-1] \
+                and stats_file[3:40] == data["perminstats"][3:40]:
+            return "pass"
+    return "fail"
+
+# Streaming shrink test, output must be byte-identical to shrinkto
+def test5():
+    dir = os.path.dirname(__file__)
+    path = os.path.join(dir, "stats_example")
+    with tempfile.TemporaryDirectory() as tmp:
+        for start, stop in ((0, 0), (3, 15), (5, 0), (0, 326)):
+            a, b = os.path.join(tmp, "a"), os.path.join(tmp, "b")
+            if stats.shrinkto(path, a, start, stop) != stats.shrinkcopyto(path, b, start, stop):
+                return "fail"
+            with open(a, "rb") as file_a, open(b, "rb") as file_b:
+                if file_a.read() != file_b.read():
+                    return "fail"
+    return "pass"
+
+# Streaming JSON writer test, must write the same text as tojson
+def test6():
+    dir = os.path.dirname(__file__)
+    path = os.path.join(dir, "stats_example")
+    with tempfile.TemporaryDirectory() as tmp:
+        out = os.path.join(tmp, "out.json")
+        for start, stop in ((0, 0), (1, 2), (5, 3)):
+            stats.tojsonfile(path, out, start, stop)
+            with open(out, "r") as file:
+                if file.read() != stats.tojson(path, start, stop):
+                    return "fail"
+        stats.tojsonfile(path, out, 3, 6, ndjson=True)
+        with open(out, "r") as file:
+            lines = [json.loads(line) for line in file]
+        if len(lines) != 4 or lines[1:] != stats.getstatsdata(path, 3, 6)["perminstats"]:
+            return "fail"
+    return "pass"
+
+# Columnar export test, NumPy .npz always and Parquet when pyarrow is installed
+def test7():
+    dir = os.path.dirname(__file__)
+    path = os.path.join(dir, "stats_example")
+    if stats.np is None:
+        return "skip (numpy not installed)"
+    standard = stats.getstatsarrays(path, 3, 40)
+    with tempfile.TemporaryDirectory() as tmp:
+        for ext in (".npz", ".parquet") if stats.pq is not None else (".npz",):
+            out = os.path.join(tmp, "out" + ext)
+            stats.tocolumnfile(path, out, 3, 40)
+            result = stats.readcolumnfile(out)
+            if result["recordingid"] != standard["recordingid"] or result["channelids"] != standard["id"][0].tolist():
+                return "fail"
+            for name in ("tempreture", "battery(mV)", "minvalue", "maxvalue", "avgvalue", "saturationcount", "missingframecount"):
+                if not stats.np.array_equal(result[name], standard[name]):
+                    return "fail"
+        # Without pyarrow a Parquet file gives the error, like tocolumnfile
+        pq, stats.pq = stats.pq, None
+        try:
+            missing = stats.readcolumnfile(os.path.join(tmp, "out.parquet"))
+        finally:
+            stats.pq = pq
+        if stats.JSON_NAME_ERROR not in missing:
+            return "fail"
+    return "pass"
+
+# Rollup test, hourly bins must match the minutes they summarize
+def test8():
+    dir = os.path.dirname(__file__)
+    if stats.np is None:
+        return "skip (numpy not installed)"
+    np = stats.np
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "stats")
+        with open(os.path.join(dir, "stats_example"), "rb") as src, open(path, "wb") as dest:
+            dest.write(src.read())
+        data = stats.getstatsarrays(path)
+        result = stats.getstatsrollup(path, "hour")
+        if result["minutes"].sum() != data["duration(min)"] or not os.path.isfile(path + stats.ROLLUP_SUFFIX):
+            return "fail"
+        first = result["minutes"][0]
+        if not np.array_equal(result["minvalue"][0], data["minvalue"][:first].min(axis=0)) \
+                or not np.array_equal(result["saturationcount"][0], data["saturationcount"][:first].sum(axis=0)) \
+                or not np.allclose(result["avgvalue"][0], data["avgvalue"][:first].mean(axis=0)):
+            return "fail"
+        # A sidecar that can not be written(a folder in its place stands for a read-only stats folder) still gives the
+        # rollup, built in memory, and rollupdir keeps it elsewhere
+        os.makedirs(os.path.join(tmp, "readonly"))
+        readonly = os.path.join(tmp, "readonly", "stats")
+        with open(path, "rb") as src, open(readonly, "wb") as dest:
+            dest.write(src.read())
+        os.makedirs(readonly + stats.ROLLUP_SUFFIX)
+        inmemory = stats.getstatsrollup(readonly, "hour")
+        if stats.JSON_NAME_ERROR in inmemory or not np.array_equal(inmemory["minvalue"], result["minvalue"]):
+            return "fail"
+        elsewhere = stats.getstatsrollup(readonly, "hour", rollupdir=os.path.join(tmp, "rollups"))
+        if stats.JSON_NAME_ERROR in elsewhere or not np.array_equal(elsewhere["minvalue"], result["minvalue"]) \
+                or len(os.listdir(os.path.join(tmp, "rollups"))) != 1:
+            return "fail"
+        np, stats.np = stats.np, None
+        try:
+            missing = stats.getstatsrollup(path, "hour")
+        finally:
+            stats.np = np
+        if stats.JSON_NAME_ERROR not in missing:
+            return "fail"
+    return "pass"
+
+# Incremental reader test, a partial block at the end must be left for the next read
+def test9():
+    dir = os.path.dirname(__file__)
+    with open(os.path.join(dir, "stats_example"), "rb") as file:
+        stat_bin = file.read()
+    standard = stats.getstatsdata(os.path.join(dir, "stats_example"))["perminstats"]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "stats")
+        with open(path, "wb") as file:
+            file.write(stat_bin[:stats.MHEADER_SIZE + 117 * 10 + 50])
+        info, first, next_start = stats.readnewminutes(path)
+        with open(path, "ab") as file:
+            file.write(stat_bin[stats.MHEADER_SIZE + 117 * 10 + 50:])
+        info, second, next_start = stats.readnewminutes(path, next_start)
+        with open(os.path.join(tmp, "recmeta.json"), "w") as file:
+            file.write(json.dumps({"rec_status": "completed"}))
+        followed = list(stats.followstats(path, 320, interval=0))
+        # A recording completed with no stats file, or only part of its header, gives the error and nothing else
+        missing = list(stats.followstats(os.path.join(tmp, "missing"), interval=0, timeout=1))
+        with open(os.path.join(tmp, "short"), "wb") as file:
+            file.write(stat_bin[:10])
+        short = list(stats.followstats(os.path.join(tmp, "short"), interval=0, timeout=1,
+                                       recmetapath=os.path.join(tmp, "recmeta.json")))
+    if len(missing) != 1 or stats.JSON_NAME_ERROR not in missing[0] or len(short) != 1 or stats.JSON_NAME_ERROR not in short[0]:
+        return "fail"
+    if first == standard[:10] and second == standard[10:] and next_start == 327 and followed[1:] == standard[320:]:
+        return "pass"
+    return "fail"
+
+# Anomaly scanner test, must flag the same minutes as checking the decoded data
+def test10():
+    dir = os.path.dirname(__file__)
+    path = os.path.join(dir, "stats_example")
+    if stats.np is None:
+        return "skip (numpy not installed)"
+    rules = [("battery(mV)", "<", 12870), ("maxvalue", ">", 0.5)]
+    data = stats.getstatsdata(path)["perminstats"]
+    standard = [[i for i, minute in enumerate(data)
+                 if minute["battery(mV)"] < 12870 or minute["channelstats"][j]["maxvalue"] > 0.5] for j in range(5)]
+    result = stats.scanstats(path, rules)
+    bitmap = stats.np.unpackbits(stats.scanstats(path, rules, output="bitmap")["bitmap"], axis=1)
+    for j in range(5):
+        minutes = [i for first, last in result["intervals"][j] for i in range(first, last)]
+        if minutes != standard[j] or bitmap[j].nonzero()[0].tolist() != standard[j]:
+            return "fail"
+    first_minute = min(min(minutes) for minutes in standard if len(minutes) > 0)
+    if stats.scanstats(path, rules, first=True)["firstbad"][0] != first_minute:
+        return "fail"
+    return "pass"
+
+# Survey aggregation test, minutes must land on their UTC time and channel ID
+def test11():
+    dir = os.path.dirname(__file__)
+    if stats.np is None:
+        return "skip (numpy not installed)"
+    np = stats.np
+    with open(os.path.join(dir, "stats_example"), "rb") as file:
+        stat_bin = file.read()
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, minutes in (("a", 0), ("b", 30)):
+            os.makedirs(os.path.join(tmp, name))
+            with open(os.path.join(tmp, name, "stats"), "wb") as file:
+                file.write(stat_bin[:stats.MHEADER_SIZE] + stat_bin[stats.MHEADER_SIZE + 117 * minutes:])
+        result = stats.aggregatestats(tmp, processes=1)
+        # Channel IDs 0-3 and 9 give 5 columns, not 10
+        sparse = bytearray(stat_bin)
+        for block in range(stats.MHEADER_SIZE + stats.HEADER_SIZE, len(sparse), 117):
+            for payload in range(block, block + stats.PAYLOAD_SIZE * 5, stats.PAYLOAD_SIZE):
+                if sparse[payload] == 4:
+                    sparse[payload] = 9
+        os.makedirs(os.path.join(tmp, "sparse", "c"))
+        with open(os.path.join(tmp, "sparse", "c", "stats"), "wb") as file:
+            file.write(sparse)
+        sparse_result = stats.aggregatestats(os.path.join(tmp, "sparse"), processes=1)
+    data = stats.getstatsarrays(os.path.join(dir, "stats_example"))
+    standard = np.full((297, 5), np.nan, dtype=np.float32)
+    for i in range(297):
+        standard[i, data["id"][30 + i]] = data["maxvalue"][30 + i]
+    if result["stations"] != ["10766"] or len(result["time"]) != 327 or len(result["files"]) != 2:
+        return "fail"
+    if result["channels"] != [0, 1, 2, 3, 4] or sparse_result["channels"] != [0, 1, 2, 3, 9]:
+        return "fail"
+    if not np.array_equal(sparse_result["maxvalue"][0], data["maxvalue"][np.arange(327)[:, None], np.argsort(data["id"])]):
+        return "fail"
+    if not np.array_equal(result["maxvalue"][0, :297], standard, equal_nan=True):
+        return "fail"
+    return "pass"
+
+# instrumentation test
+def test12():
+    dir = os.path.dirname(__file__)
+    records = []
+    with tempfile.TemporaryDirectory() as tmp:
+        # No hook, no record
+        stats.shrinkcopyto(os.path.join(dir, "stats_example"), os.path.join(tmp, "stats"), 10, 19)
+        stats.addhook(records.append)
+        try:
+            written = stats.shrinkcopyto(os.path.join(dir, "stats_example"), os.path.join(tmp, "stats"), 10, 19)
+        finally:
+            stats.removehook(records.append)
+        with stats.Profile() as profile:
+            stats.getstatsinfo(os.path.join(dir, "stats_example"))
+            stats.getstatsinfo(os.path.join(dir, "stats_example"))
+    if len(records) != 1 or records[0]["name"] != "stats.shrinkcopy" or records[0]["bytes_written"] != written:
+        return "fail"
+    if records[0]["files"] != 1 or records[0]["seconds"] < 0 or len(stats.PROFILE_HOOKS) != 0:
+        return "fail"
+    summary = profile.summary()
+    if list(summary) != ["stats.info"] or summary["stats.info"]["calls"] != 2:
+        return "fail"
+    if stats.np is not None:
+        with stats.Profile() as profile:
+            stats.getstatsarrays(os.path.join(dir, "stats_example"), 3, 40)
+        if profile.summary()["stats.decode"]["bytes_read"] != stats.MHEADER_SIZE + 37 * 117:
+            return "fail"
+    return "pass"
+
+# merge test
+def test13():
+    dir = os.path.dirname(__file__)
+    with open(os.path.join(dir, "stats_example"), "rb") as file:
+        stat_bin = file.read()
+    blocksize = stats.HEADER_SIZE + stats.PAYLOAD_SIZE * stat_bin[14]
+    starttime = struct.unpack_from('I', stat_bin, 10)[0]
+    with tempfile.TemporaryDirectory() as tmp:
+        # Minutes 0-99, 120-199 and 190-326(10 minutes already covered), given out of order
+        for name, first, last in (("c", 190, 327), ("a", 0, 100), ("b", 120, 200)):
+            header = bytearray(stat_bin[:stats.MHEADER_SIZE])
+            struct.pack_into('I', header, 10, starttime + 60 * first)
+            with open(os.path.join(tmp, name), "wb") as file:
+                file.write(header + stat_bin[stats.MHEADER_SIZE + blocksize * first:stats.MHEADER_SIZE + blocksize * last])
+        written = stats.mergeto([os.path.join(tmp, name) for name in "cab"], os.path.join(tmp, "stats"))
+        with open(os.path.join(tmp, "stats"), "rb") as file:
+            merged = file.read()
+        other = bytearray(stat_bin[:16])
+        other[14] = 4
+        with open(os.path.join(tmp, "d"), "wb") as file:
+            file.write(other)
+        mismatch = stats.mergeto([os.path.join(tmp, "a"), os.path.join(tmp, "d")], os.path.join(tmp, "stats"))
+    gap_start = stats.MHEADER_SIZE + blocksize * 100
+    gap_stop = stats.MHEADER_SIZE + blocksize * 120
+    if written != len(stat_bin) or merged[:gap_start] != stat_bin[:gap_start] or merged[gap_stop:] != stat_bin[gap_stop:]:
+        return "fail"
+    minute = stats.decodeminute(merged, stat_bin[14], 110)
+    channel = minute[stats.JSON_NAME_CHAN_STATS][2]
+    if channel[stats.JSON_NAME_ID] != 2:
+        return "fail"
+    if channel[stats.JSON_NAME_MISF_COUNT] != stats.MISSING_FRAME_MARK or channel[stats.JSON_NAME_AVGVAL] == channel[stats.JSON_NAME_AVGVAL]:
+        return "fail"
+    if stats.JSON_NAME_ERROR not in mismatch:
+        return "fail"
+    return "pass"
+
+# Range copy test: a kernel copy that copies nothing falls back to the chunked copy instead of stopping
+def test14():
+    dir = os.path.dirname(__file__)
+    with open(os.path.join(dir, "stats_example"), "rb") as file:
+        stat_bin = file.read()
+    saved = {name: getattr(os, name) for name in ("copy_file_range", "sendfile") if hasattr(os, name)}
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            for name in saved:
+                setattr(os, name, lambda *args: 0)
+            with open(os.path.join(dir, "stats_example"), "rb") as infile, \
+                    open(os.path.join(tmp, "copy"), "wb", buffering=0) as outfile:
+                outfile.write(b"head")
+                copied = stats.copyrange(infile, outfile, 100, 1000)
+        finally:
+            for name, function in saved.items():
+                setattr(os, name, function)
+        with open(os.path.join(tmp, "copy"), "rb") as file:
+            data = file.read()
+    if copied != 1000 or data != b"head" + stat_bin[100:1100]:
+        return "fail"
+    return "pass"
+
 def run_tests():
     print("Test 1: " + test1())
-    print("Test 2: " + test2())
\ No newline at end of file
+    print("Test 2: " + test2())
+    print("Test 3: " + test3())
+    print("Test 4: " + test4())
+    print("Test 5: " + test5())
+    print("Test 6: " + test6())
+    print("Test 7: " + test7())
+    print("Test 8: " + test8())
+    print("Test 9: " + test9())
+    print("Test 10: " + test10())
+    print("Test 11: " + test11())
+    print("Test 12: " + test12())
+    print("Test 13: " + test13())
\ No newline at end of file
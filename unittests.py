@@ -0,0 +1,568 @@
+# Author: Phoenix Geohysics Ltd.
+# Creation: 2026-10-18
+
+import phxrecording as phrec
+import phx
+import os, sys, io, json, struct, datetime, zoneinfo, tempfile, contextlib, subprocess, asyncio, hashlib, random
+
+## Synthetic data files: 20 samples of 3 bytes and a 4 bytes footer per frame at 20Hz, so one frame per second
+TEST_START = 1715188080
+TEST_HEADER_LENGTH = 128
+TEST_FRAME_SIZE = 64
+
+def make_datafile(filepath, recid, firstframe, frames, framesize=TEST_FRAME_SIZE):
+    """! Write a data file whose frames start with their frame number counted from the recording start"""
+    header = bytearray(TEST_HEADER_LENGTH)
+    struct.pack_into('<H', header, phrec.DATAFILE_HEADERLENGTH_OFFSET, TEST_HEADER_LENGTH)
+    struct.pack_into('<I', header, phrec.DATAFILE_RECID_OFFSET, recid)
+    struct.pack_into('<HbB', header, phrec.DATAFILE_SAMPLERATE_OFFSET, 20, 0, 3)
+    struct.pack_into('<I', header, phrec.DATAFILE_FRAMESIZE_OFFSET, framesize)
+    with open(filepath, "wb") as file:
+        file.write(header)
+        for frame in range(firstframe, firstframe + frames):
+            file.write(struct.pack('<I', frame) + bytes(TEST_FRAME_SIZE - 4))
+
+def make_recording(parent, starttime=TEST_START, files=4, channels=2, extensions=("td_24k",), instid=10766,
+                   duration=phrec.DATAFILE_DURATION):
+    """! Write a recording of files data files of duration seconds per channel and extension, with recmeta.json,
+    config.json and a stats file cut from stats_example
+
+    @return the recording path
+    """
+    start_str = datetime.datetime.fromtimestamp(starttime, zoneinfo.ZoneInfo("UTC")).strftime("%Y-%m-%d-%H%M%S")
+    recpath = os.path.join(parent, str(instid) + "_" + start_str)
+    os.makedirs(recpath)
+    stop = starttime + files * duration
+    with open(os.path.join(recpath, "recmeta.json"), "w") as file:
+        file.write(json.dumps({"rec_status": "completed", "start": starttime, "stop": stop, "acqtime": stop - starttime}))
+    with open(os.path.join(recpath, "config.json"), "w") as file:
+        file.write("{}")
+    with open(os.path.join(os.path.dirname(__file__), "phxstatsfile", "stats_example"), "rb") as file:
+        stat_bin = bytearray(file.read())
+    struct.pack_into('I', stat_bin, 10, starttime)
+    blocksize = phrec.stats.HEADER_SIZE + phrec.stats.PAYLOAD_SIZE * stat_bin[14]
+    with open(os.path.join(recpath, "stats"), "wb") as file:
+        file.write(stat_bin[:phrec.stats.MHEADER_SIZE + blocksize * (stop - starttime) // 60])
+    for channel in range(channels):
+        os.makedirs(os.path.join(recpath, str(channel)))
+        for seq in range(1, files + 1):
+            for extension in extensions:
+                make_datafile(os.path.join(recpath, str(channel), f"{instid}_{starttime:X}_{channel}_{seq:08X}.{extension}"),
+                              starttime, (seq - 1) * duration, duration)
+    return recpath
+
+def read_frames(filepath):
+    """! Frame numbers of a data file written by make_datafile"""
+    with open(filepath, "rb") as file:
+        data = file.read()
+    return [struct.unpack_from('<I', data, offset)[0] for offset in range(TEST_HEADER_LENGTH, len(data), TEST_FRAME_SIZE)]
+
+# Trim test: the new data files are cut on the frames of the new start and stop
+def test1():
+    with tempfile.TemporaryDirectory() as tmp:
+        recpath = make_recording(tmp, channels=1, extensions=("bin",))
+        os.makedirs(os.path.join(tmp, "out"))
+        result = phrec.shrink_recording(recpath, os.path.join(tmp, "out"), TEST_START + 100, TEST_START + 500, trim=True)
+        if "error" in result:
+            return "fail"
+        folder = os.path.join(result["destpath"], "0")
+        names = sorted(os.listdir(folder))
+        frames = [read_frames(os.path.join(folder, name)) for name in names]
+        with open(os.path.join(folder, names[0]), "rb") as file:
+            recid = struct.unpack_from('<I', file.read(TEST_HEADER_LENGTH), phrec.DATAFILE_RECID_OFFSET)[0]
+
+        # A header that does not describe whole frames is an error, not a cut on any byte
+        make_datafile(os.path.join(recpath, "0", f"10766_{TEST_START:X}_0_00000001.bin"), TEST_START, 0, 360, 0)
+        os.makedirs(os.path.join(tmp, "bad"))
+        bad = phrec.shrink_recording(recpath, os.path.join(tmp, "bad"), TEST_START + 100, TEST_START + 500, trim=True)
+    if names != [f"10766_{TEST_START + 100:X}_0_00000001.bin", f"10766_{TEST_START + 100:X}_0_00000002.bin"]:
+        return "fail"
+    if frames != [list(range(100, 460)), list(range(460, 500))] or recid != TEST_START + 100:
+        return "fail"
+    if "error" not in bad:
+        return "fail"
+    return "pass"
+
+# Recording index test: kept in another folder for read-only recordings, nothing printed on stdout when it can not be saved
+def test2():
+    with tempfile.TemporaryDirectory() as tmp:
+        recpath = make_recording(tmp)
+        index = phrec.recording_index(recpath, indexdir=os.path.join(tmp, "indexes"))
+        saved = os.listdir(os.path.join(tmp, "indexes"))
+        sidecar = os.path.exists(os.path.join(recpath, phrec.RECINDEX_FILENAME))
+        with phrec.stats.Profile() as profile:
+            cached = phrec.recording_index(recpath, indexdir=os.path.join(tmp, "indexes")) == index
+        cached = cached and "recording.scan" not in profile.summary()
+
+        # A directory in place of the sidecar makes saving it fail, like a read-only recording
+        os.makedirs(os.path.join(recpath, phrec.RECINDEX_FILENAME))
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            filelist = phrec.shrink_sourcefilelist(recpath, TEST_START + 360, TEST_START + 720)
+    if len(saved) != 1 or not saved[0].startswith(os.path.basename(recpath)) or sidecar or not cached:
+        return "fail"
+    if index["channels"]["0"]["count"] != 4 or index["start"] != TEST_START:
+        return "fail"
+    if stdout.getvalue() != "" or sorted(filelist[-2:]) != [os.path.join("0", f"10766_{TEST_START:X}_0_00000002.td_24k"),
+                                                            os.path.join("1", f"10766_{TEST_START:X}_1_00000002.td_24k")]:
+        return "fail"
+    return "pass"
+
+def listfiles(recpath):
+    """! Relative path and content of every file of a recording"""
+    files = {}
+    for root, dirs, names in os.walk(recpath):
+        for name in names:
+            with open(os.path.join(root, name), "rb") as file:
+                files[os.path.relpath(os.path.join(root, name), recpath)] = file.read()
+    return files
+
+# Journaled shrink test: resumed after a failure, and after a torn or unreadable journal
+def test3():
+    with tempfile.TemporaryDirectory() as tmp:
+        recpath = make_recording(tmp)
+        for name in ("plain", "journal", "corrupt"):
+            os.makedirs(os.path.join(tmp, name))
+        window = (TEST_START + 360, TEST_START + 1080)
+        plain = phrec.shrink_recording(recpath, os.path.join(tmp, "plain"), *window)
+
+        # Fail the fifth file copy
+        copies = []
+        datafile_copy = phrec.datafile_copy
+        def failing_copy(*args):
+            copies.append(args)
+            if len(copies) == 5:
+                raise OSError("injected failure")
+            return datafile_copy(*args)
+        phrec.datafile_copy = failing_copy
+        try:
+            failed = phrec.shrink_recording(recpath, os.path.join(tmp, "journal"), *window, journal=True)
+        finally:
+            phrec.datafile_copy = datafile_copy
+        staged = os.listdir(os.path.join(tmp, "journal"))
+        # A line torn by the crash is dropped
+        journalpath = os.path.join(tmp, "journal", staged[0], phrec.SHRINK_JOURNAL_FILENAME)
+        with open(journalpath, "a") as file:
+            file.write('{"file": "0/torn')
+        resumed = phrec.shrink_recording(recpath, os.path.join(tmp, "journal"), *window, journal=True)
+
+        # An unreadable first line starts the journal over
+        stagepath = os.path.join(tmp, "corrupt", "." + os.path.basename(plain["destpath"]) + phrec.SHRINK_STAGE_SUFFIX)
+        os.makedirs(stagepath)
+        with open(os.path.join(stagepath, phrec.SHRINK_JOURNAL_FILENAME), "w") as file:
+            file.write('{"source": ')
+        restarted = phrec.shrink_recording(recpath, os.path.join(tmp, "corrupt"), *window, journal=True)
+
+        expected = listfiles(plain["destpath"])
+        if "error" not in failed or len(staged) != 1 or not staged[0].endswith(phrec.SHRINK_STAGE_SUFFIX):
+            return "fail"
+        if "error" in resumed or resumed["resumed"] != 4 or listfiles(resumed["destpath"]) != expected:
+            return "fail"
+        if "error" in restarted or restarted["resumed"] != 0 or listfiles(restarted["destpath"]) != expected:
+            return "fail"
+        if os.listdir(os.path.join(tmp, "journal")) != [os.path.basename(plain["destpath"])]:
+            return "fail"
+    return "pass"
+
+# phx dispatcher test: same output as the library, bad command lines give status 2, stats commands run the stats scripts,
+# and importing phxrecording leaves the modules only some commands need unloaded
+def test4():
+    with tempfile.TemporaryDirectory() as tmp:
+        recpath = make_recording(tmp)
+        outputs = []
+        statuses = []
+        for argv in (["recid", "-i", "10766", "-s", str(TEST_START)], ["start", "-i", recpath],
+                     ["start", "-i", os.path.join(tmp, "missing")], ["recid", "-i", "10766", "-s", "1", "-x"],
+                     ["tojson", "-i", os.path.join(recpath, "stats"), "-o", os.path.join(tmp, "stats.json"), "-s", "1", "-e", "3"],
+                     ["survey", "-i", tmp, "-o", os.path.join(tmp, "survey.npz"), "-p", "1", "--profile", os.path.join(tmp, "profile.json")]):
+            stdout = io.StringIO()
+            with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(io.StringIO()):
+                statuses.append(phx.run(argv))
+            outputs.append(stdout.getvalue())
+        with open(os.path.join(tmp, "stats.json")) as file:
+            minutes = json.load(file)[phrec.stats.JSON_NAME_PER_MIN_STATS]
+        with open(os.path.join(tmp, "profile.json")) as file:
+            profile = json.load(file)
+    if statuses != [0, 0, 2, 2, 0, 0 if phrec.stats.np is not None else 1] or "stats.survey" not in json.dumps(profile) or outputs[0] != phrec.getrecid(10766, TEST_START) + "\n" or outputs[1] != f"{TEST_START}\n":
+        return "fail"
+    if len(minutes) != 2:
+        return "fail"
+    loaded = subprocess.run([sys.executable, "-c", "import sys, phxrecording; print(sorted(set(sys.argv[1:]) & set(sys.modules)))",
+                             "json", "hashlib", "shutil", "zoneinfo", "pathlib", "csv", "asyncio", "concurrent.futures"],
+                            cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True)
+    if loaded.stdout.strip() != "[]":
+        return "fail"
+    return "pass"
+
+# Segment index test: gaps of a channel with a missing file, and a shrink of a recording with 60s data files
+def test5():
+    with tempfile.TemporaryDirectory() as tmp:
+        recpath = make_recording(tmp, files=6, duration=60)
+        os.remove(os.path.join(recpath, "0", f"10766_{TEST_START:X}_0_00000003.td_24k"))
+        index = phrec.recording_segmentindex(recpath, 60)
+        gaps = index.gaps(TEST_START, TEST_START + 420)
+        covering = [found[2] for found in index.covering(TEST_START + 100, TEST_START + 200) if found[0] == "1"]
+        os.makedirs(os.path.join(tmp, "out"))
+        result = phrec.shrink_recording(recpath, os.path.join(tmp, "out"), TEST_START + 60, TEST_START + 240, duration=60)
+        folder = os.path.join(result["destpath"], "1")
+        names = sorted(os.listdir(folder))
+        frames = [read_frames(os.path.join(folder, name)) for name in names]
+        with open(os.path.join(folder, names[0]), "rb") as file:
+            recid = struct.unpack_from('<I', file.read(TEST_HEADER_LENGTH), phrec.DATAFILE_RECID_OFFSET)[0]
+        missing = sorted(os.listdir(os.path.join(result["destpath"], "0")))
+    if gaps != [("0", "td_24k", TEST_START + 120, TEST_START + 180), ("0", "td_24k", TEST_START + 360, TEST_START + 420),
+                ("1", "td_24k", TEST_START + 360, TEST_START + 420)]:
+        return "fail"
+    if covering != [f"10766_{TEST_START:X}_1_0000000{seq}.td_24k" for seq in (2, 3, 4)]:
+        return "fail"
+    if names != [f"10766_{TEST_START + 60:X}_1_0000000{seq}.td_24k" for seq in (1, 2, 3)] or recid != TEST_START + 60:
+        return "fail"
+    if frames != [list(range(60, 120)), list(range(120, 180)), list(range(180, 240))]:
+        return "fail"
+    if missing != [f"10766_{TEST_START + 60:X}_0_0000000{seq}.td_24k" for seq in (1, 3)]:
+        return "fail"
+    return "pass"
+
+# Merge test: two recordings one data file apart joined into one, the missing minutes of stats filled with gap blocks
+def test6():
+    with tempfile.TemporaryDirectory() as tmp:
+        first = make_recording(os.path.join(tmp, "a"), files=2)
+        second = make_recording(os.path.join(tmp, "b"), TEST_START + 1080, files=2)
+        shifted = make_recording(os.path.join(tmp, "c"), TEST_START + 1090, files=2)
+        os.makedirs(os.path.join(tmp, "out"))
+        result = phrec.merge_recordings([second, first], os.path.join(tmp, "out"), link="hard")
+        bad = phrec.merge_recordings([first, shifted], os.path.join(tmp, "out"))
+        # Into the folder of the earliest recording the merged recording would take its name
+        sources = listfiles(first)
+        inplace = phrec.merge_recordings([first, second], os.path.join(tmp, "a"), link="hard")
+        again = phrec.merge_recordings([first, second], os.path.join(tmp, "out"))
+        if "source recording" not in str(inplace.get("error")) or "already exists" not in str(again.get("error")):
+            return "fail"
+        if listfiles(first) != sources:
+            return "fail"
+        folder = os.path.join(result["destpath"], "1")
+        names = sorted(os.listdir(folder))
+        frames = [read_frames(os.path.join(folder, name)) for name in names]
+        recids = []
+        for name in names:
+            with open(os.path.join(folder, name), "rb") as file:
+                recids.append(struct.unpack_from('<I', file.read(TEST_HEADER_LENGTH), phrec.DATAFILE_RECID_OFFSET)[0])
+        with open(os.path.join(result["destpath"], "recmeta.json")) as file:
+            rj = json.load(file)
+        minutes = phrec.stats.getstatsdata(os.path.join(result["destpath"], "stats"))[phrec.stats.JSON_NAME_PER_MIN_STATS]
+        gaps = phrec.recording_segmentindex(result["destpath"]).gaps(TEST_START, TEST_START + 1800)
+    if os.path.basename(result["destpath"]) != phrec.getrecid(10766, TEST_START) or "error" not in bad:
+        return "fail"
+    if names != [f"10766_{TEST_START:X}_1_0000000{seq}.td_24k" for seq in (1, 2, 4, 5)]:
+        return "fail"
+    if frames != [list(range(0, 360)), list(range(360, 720)), list(range(0, 360)), list(range(360, 720))]:
+        return "fail"
+    if recids != [TEST_START, TEST_START, TEST_START + 1080, TEST_START + 1080]:
+        return "fail"
+    if rj[phrec.JSON_NAME_START] != TEST_START or rj[phrec.JSON_NAME_STOP] != TEST_START + 1800 or len(minutes) != 30:
+        return "fail"
+    filled = [minute for minute in range(30)
+              if all(channel[phrec.stats.JSON_NAME_MISF_COUNT] == phrec.stats.MISSING_FRAME_MARK
+                     for channel in minutes[minute][phrec.stats.JSON_NAME_CHAN_STATS])]
+    if filled != list(range(12, 18)):
+        return "fail"
+    if gaps != [("0", "td_24k", TEST_START + 720, TEST_START + 1080), ("1", "td_24k", TEST_START + 720, TEST_START + 1080)]:
+        return "fail"
+    return "pass"
+
+def legacy_shrink(recpath, destparent, start, stop):
+    """! Shrink a recording step by step like phxrecshrink.sh did before shrink_recording"""
+    destpath = os.path.join(destparent, phrec.getrecid(os.path.basename(recpath).split("_")[0], start))
+    os.makedirs(destpath)
+    phrec.recmetafile_changestartstop(os.path.join(recpath, "recmeta.json"), os.path.join(destpath, "recmeta.json"), start, stop)
+    org_starttime = phrec.recmetafile_getstarttimestamp(os.path.join(recpath, "recmeta.json"))
+    phrec.stats.shrinkcopyto(os.path.join(recpath, "stats"), os.path.join(destpath, "stats"),
+                             (start - org_starttime) // 60, (stop - org_starttime) // 60)
+    for name in os.listdir(recpath):
+        if os.path.isdir(os.path.join(recpath, name)):
+            os.makedirs(os.path.join(destpath, name))
+    for name in phrec.shrink_sourcefilelist(recpath, start, stop):
+        if os.path.isfile(os.path.join(recpath, name)):
+            with open(os.path.join(recpath, name), "rb") as src, open(os.path.join(destpath, name), "wb") as dest:
+                dest.write(src.read())
+    phrec.shrink_destfilerename(recpath, destpath, start, stop)
+    phrec.shrink_moddatafilerecid(destpath, start)
+    return destpath
+
+# Single process shrink test: the same files as the step by step shrink, for windows starting on the first, a middle
+# and the last data file. The step by step shrink only patches one first file per channel folder, shrink_recording the
+# first file of each extension
+def test7():
+    with tempfile.TemporaryDirectory() as tmp:
+        recpath = make_recording(tmp, extensions=("td_24k", "td_150"))
+        for window in ((TEST_START, TEST_START + 720), (TEST_START + 360, TEST_START + 1080), (TEST_START + 1080, TEST_START + 1440)):
+            name = str(window[0])
+            os.makedirs(os.path.join(tmp, "new" + name))
+            os.makedirs(os.path.join(tmp, "old" + name))
+            result = phrec.shrink_recording(recpath, os.path.join(tmp, "new" + name), *window)
+            with contextlib.redirect_stdout(io.StringIO()):
+                expected = listfiles(legacy_shrink(recpath, os.path.join(tmp, "old" + name), *window))
+            for filename, data in expected.items():
+                if "_00000001." in filename:
+                    data = bytearray(data)
+                    struct.pack_into('<I', data, phrec.DATAFILE_RECID_OFFSET, window[0])
+                    expected[filename] = bytes(data)
+            if "error" in result or result["files"] != len(expected) - 2 or listfiles(result["destpath"]) != expected:
+                return "fail"
+    return "pass"
+
+# Parallel copy test: several files at a time under a byte budget smaller than one file writes the same recording
+def test8():
+    with tempfile.TemporaryDirectory() as tmp:
+        recpath = make_recording(tmp, channels=3)
+        os.makedirs(os.path.join(tmp, "serial"))
+        os.makedirs(os.path.join(tmp, "parallel"))
+        serial = phrec.shrink_recording(recpath, os.path.join(tmp, "serial"), TEST_START + 360, TEST_START + 1440)
+        parallel = phrec.shrink_recording(recpath, os.path.join(tmp, "parallel"), TEST_START + 360, TEST_START + 1440,
+                                          jobs=4, maxinflight=1024)
+        if "error" in parallel or parallel["files"] != serial["files"]:
+            return "fail"
+        if listfiles(parallel["destpath"]) != listfiles(serial["destpath"]):
+            return "fail"
+    return "pass"
+
+# Link mode test: the unchanged data files are hard links to the source, the first files are copies so patching their
+# recording ID leaves the source recording untouched, and reflink falls back to a copy where it is not supported
+def test9():
+    with tempfile.TemporaryDirectory() as tmp:
+        recpath = make_recording(tmp)
+        # Build the recording index first, it is the one file a shrink may add to the source recording
+        phrec.recording_index(recpath)
+        before = listfiles(recpath)
+        results = {}
+        for link in phrec.LINK_MODES:
+            os.makedirs(os.path.join(tmp, link))
+            results[link] = phrec.shrink_recording(recpath, os.path.join(tmp, link), TEST_START + 360, TEST_START + 1440,
+                                                   link=link)
+        linked = {}
+        for folder in ("0", "1"):
+            for name in os.listdir(os.path.join(results["hard"]["destpath"], folder)):
+                seq = phrec.datafile_parsename(name)["seq"]
+                srcname = f"10766_{TEST_START:X}_{folder}_{seq + 1:08X}.td_24k"
+                linked[(folder, seq)] = os.path.samefile(os.path.join(results["hard"]["destpath"], folder, name),
+                                                         os.path.join(recpath, folder, srcname))
+        expected = listfiles(results["copy"]["destpath"])
+        same = all(listfiles(results[link]["destpath"]) == expected for link in phrec.LINK_MODES)
+        unchanged = listfiles(recpath) == before
+    if linked != {(folder, seq): seq != 1 for folder in ("0", "1") for seq in (1, 2, 3)} or not same or not unchanged:
+        return "fail"
+    return "pass"
+
+# Batch shrink test: a CSV manifest of two good jobs and one with a missing source, run over two worker processes
+def test10():
+    with tempfile.TemporaryDirectory() as tmp:
+        recpath = make_recording(tmp)
+        for name in ("batch1", "batch2", "single"):
+            os.makedirs(os.path.join(tmp, name))
+        manifestpath = os.path.join(tmp, "jobs.csv")
+        with open(manifestpath, "w") as file:
+            file.write("source,dest,start,stop\n")
+            file.write(f"{recpath},{os.path.join(tmp, 'batch1')},{TEST_START + 360},{TEST_START + 1080}\n")
+            file.write(f"{os.path.join(tmp, 'missing')},{os.path.join(tmp, 'batch2')},{TEST_START},{TEST_START + 360}\n")
+            file.write(f"# commented out\n{recpath},{os.path.join(tmp, 'batch2')},{TEST_START},{TEST_START + 720}\n")
+        progress = []
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = phrec.shrink_batch(phrec.shrink_readmanifest(manifestpath), 2,
+                                         progress=lambda finished, total, result: progress.append((finished, total)))
+        single = phrec.shrink_recording(recpath, os.path.join(tmp, "single"), TEST_START + 360, TEST_START + 1080)
+        if [result["source"] for result in results] != [recpath, os.path.join(tmp, "missing"), recpath]:
+            return "fail"
+        if "error" in results[0] or not isinstance(results[1].get("error"), str) or "error" in results[2]:
+            return "fail"
+        if listfiles(results[0]["destpath"]) != listfiles(single["destpath"]):
+            return "fail"
+        if os.path.basename(results[2]["destpath"]) != phrec.getrecid(10766, TEST_START) or progress != [(1, 3), (2, 3), (3, 3)]:
+            return "fail"
+    return "pass"
+
+# Event loop shrink test: the same recordings as shrink_recording, on and off the data file boundaries, with a manifest
+def test11():
+    with tempfile.TemporaryDirectory() as tmp:
+        recpath = make_recording(tmp, extensions=("bin",))
+        for window, trim in (((TEST_START + 360, TEST_START + 1080), False), ((TEST_START + 100, TEST_START + 500), True)):
+            name = str(window[0])
+            os.makedirs(os.path.join(tmp, "sync" + name))
+            os.makedirs(os.path.join(tmp, "async" + name))
+            expected = phrec.shrink_recording(recpath, os.path.join(tmp, "sync" + name), *window, trim=trim, checksum="sha256")
+            result = asyncio.run(phrec.shrink_recording_async(recpath, os.path.join(tmp, "async" + name), *window,
+                                                              concurrency=4, trim=trim, checksum="sha256"))
+            if "error" in result or result["files"] != expected["files"]:
+                return "fail"
+            if listfiles(result["destpath"]) != listfiles(expected["destpath"]):
+                return "fail"
+        index = asyncio.run(phrec.recording_index_async(recpath))
+        data = asyncio.run(phrec.stats.getstatsdata_async(os.path.join(recpath, "stats"), 2, 5))
+        if index != phrec.recording_index(recpath) or data != phrec.stats.getstatsdata(os.path.join(recpath, "stats"), 2, 5):
+            return "fail"
+    return "pass"
+
+# Checksum manifest test: the checksums computed while copying and linking match the files on disk, and verify finds a
+# changed byte and a deleted file
+def test12():
+    with tempfile.TemporaryDirectory() as tmp:
+        recpath = make_recording(tmp)
+        os.makedirs(os.path.join(tmp, "out"))
+        result = phrec.shrink_recording(recpath, os.path.join(tmp, "out"), TEST_START + 360, TEST_START + 1440,
+                                        link="hard", checksum="sha256")
+        destpath = result["destpath"]
+        with open(os.path.join(destpath, phrec.CHECKSUM_MANIFEST_FILENAME)) as file:
+            manifest = json.load(file)
+        files = listfiles(destpath)
+        del files[phrec.CHECKSUM_MANIFEST_FILENAME]
+        ondisk = {name.replace(os.sep, "/"): {"size": len(data), "checksum": hashlib.sha256(data).hexdigest()}
+                  for name, data in files.items()}
+        clean = phrec.recording_verify(destpath)
+
+        # Break the hard link before changing the file, the source recording is shared with it
+        changed = os.path.join(destpath, "1", f"10766_{TEST_START + 360:X}_1_00000002.td_24k")
+        with open(changed, "rb") as file:
+            data = bytearray(file.read())
+        data[-1] ^= 0xFF
+        os.remove(changed)
+        with open(changed, "wb") as file:
+            file.write(data)
+        os.remove(os.path.join(destpath, "0", f"10766_{TEST_START + 360:X}_0_00000003.td_24k"))
+        broken = phrec.recording_verify(destpath, 2)
+    if manifest["files"] != ondisk or manifest["algorithm"] != "sha256":
+        return "fail"
+    if clean["checked"] != len(ondisk) or clean["missing"] != [] or clean["mismatch"] != []:
+        return "fail"
+    if broken["missing"] != [f"0/10766_{TEST_START + 360:X}_0_00000003.td_24k"]:
+        return "fail"
+    if broken["mismatch"] != [f"1/10766_{TEST_START + 360:X}_1_00000002.td_24k"]:
+        return "fail"
+    return "pass"
+
+# Archive index test: covering gives the same recordings as checking every one, including a long recording hiding
+# behind shorter later ones and a recording still in progress, and a scanned archive is saved and loaded back
+def test13():
+    rng = random.Random(1)
+    records = [{"path": f"r{i}", "instrument": str(rng.choice((10766, 10399))), "start": start,
+                "stop": start + rng.choice((60, 600, 3600))} for i, start in enumerate(rng.sample(range(0, 20000, 10), 300))]
+    records.append({"path": "long", "instrument": "10766", "start": 500, "stop": 30000})
+    records.append({"path": "live", "instrument": "10399", "start": 15000, "stop": None})
+    records.append({"path": "broken", "instrument": "10766", "error": "Expecting value"})
+    index = phrec.ArchiveIndex(records)
+    for t0, t1, instruments in ((0, 100, None), (5000, 5001, None), (9000, 12000, [10766]), (19990, 40000, ["10399"]),
+                                (30000, 40000, None), (0, 2**63, [12345])):
+        found = index.covering(t0, t1, instruments)
+        expected = [record for record in records if "error" not in record
+                    and (instruments is None or record["instrument"] in map(str, instruments))
+                    and record["start"] < t1 and (record["stop"] or 2**63) > t0]
+        if sorted(record["path"] for record in found) != sorted(record["path"] for record in expected):
+            return "fail"
+        if found != sorted(found, key=lambda record: (record["instrument"], record["start"])):
+            return "fail"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        first = make_recording(os.path.join(tmp, "archive", "site1"))
+        second = make_recording(os.path.join(tmp, "archive", "site2", "day2"), TEST_START + 86400, instid=10399)
+        os.makedirs(os.path.join(tmp, "archive", ".hidden"))
+        make_recording(os.path.join(tmp, "archive", ".hidden"), TEST_START)
+        indexpath = os.path.join(tmp, "archive.json")
+        scanned = phrec.archive_index(os.path.join(tmp, "archive"), indexpath)
+        loaded = phrec.archive_index(os.path.join(tmp, "archive"), indexpath)
+        found = [record["path"] for record in loaded.covering(TEST_START + 86400, TEST_START + 86460)]
+    if [record["path"] for record in scanned.records] != [first, second] or loaded.records != scanned.records:
+        return "fail"
+    if found != [second] or loaded.instruments != ["10399", "10766"]:
+        return "fail"
+    return "pass"
+
+# Destination test: a shrink keeping the start time into the folder of its source, or over an existing recording, is
+# refused before anything is written
+def test14():
+    with tempfile.TemporaryDirectory() as tmp:
+        recpath = make_recording(tmp)
+        phrec.recording_index(recpath)
+        before = listfiles(recpath)
+        errors = [phrec.shrink_recording(recpath, tmp, TEST_START, TEST_START + 720),
+                  phrec.shrink_recording(recpath, tmp, TEST_START, TEST_START + 720, journal=True),
+                  asyncio.run(phrec.shrink_recording_async(recpath, tmp, TEST_START, TEST_START + 720))]
+        os.makedirs(os.path.join(tmp, "out"))
+        first = phrec.shrink_recording(recpath, os.path.join(tmp, "out"), TEST_START + 360, TEST_START + 720)
+        again = phrec.shrink_recording(recpath, os.path.join(tmp, "out"), TEST_START + 360, TEST_START + 1080)
+        if listfiles(recpath) != before or any("source recording" not in str(error.get("error")) for error in errors):
+            return "fail"
+        if "error" in first or "already exists" not in str(again.get("error")) or len(listfiles(first["destpath"])) != 5:
+            return "fail"
+    return "pass"
+
+# Read-only archive test: a journaled shrink hard linking the data files of a recording whose files and folders can not
+# be written (only meaningful when not run as root)
+def test15():
+    with tempfile.TemporaryDirectory() as tmp:
+        recpath = make_recording(tmp)
+        phrec.recording_index(recpath)
+        for root, dirs, files in os.walk(recpath):
+            for name in files:
+                os.chmod(os.path.join(root, name), 0o444)
+        for root, dirs, files in os.walk(recpath, topdown=False):
+            os.chmod(root, 0o555)
+        os.makedirs(os.path.join(tmp, "out"))
+        try:
+            result = phrec.shrink_recording(recpath, os.path.join(tmp, "out"), TEST_START + 360, TEST_START + 1440,
+                                            link="hard", journal=True)
+        finally:
+            for root, dirs, files in os.walk(recpath):
+                os.chmod(root, 0o755)
+        if "error" in result or result["files"] != 7:
+            return "fail"
+    return "pass"
+
+# Data file header test: headers laid out byte for byte as the Phoenix readers(PhoenixGeoPy, mth5) read them, not from
+# the phrec constants, with the footer flags in the top byte of the frame size
+def test16():
+    def write_header(filepath, rate_base, rate_exponent, bytes_per_sample, frame_size, data_length):
+        header = bytearray(128)
+        header[2:4] = (128).to_bytes(2, "little")
+        header[20:24] = TEST_START.to_bytes(4, "little")
+        header[59:61] = rate_base.to_bytes(2, "little")
+        header[61:62] = rate_exponent.to_bytes(1, "little", signed=True)
+        header[62] = bytes_per_sample
+        header[63:67] = frame_size.to_bytes(4, "little")
+        header[67:69] = (1).to_bytes(2, "little")
+        with open(filepath, "wb") as file:
+            file.write(header + bytes(data_length))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        native = os.path.join(tmp, f"10766_{TEST_START:X}_0_00000001.bin")
+        write_header(native, 24000, 0, 3, 0x03000040, 64 * 1200)
+        continuous = os.path.join(tmp, f"10766_{TEST_START:X}_0_00000001.td_30")
+        write_header(continuous, 3, 1, 4, 0x00000004, 4 * 30)
+        segmented = os.path.join(tmp, f"10766_{TEST_START:X}_0_00000001.td_24k")
+        write_header(segmented, 24000, 0, 4, 0x00000004, 32 + 4 * 24000)
+        layouts = [phrec.datafile_layout(path) for path in (native, continuous, segmented)]
+    if layouts[0] != {"headerlength": 128, "framesize": 64, "datalength": 64 * 1200, "framespersecond": 1200}:
+        return "fail"
+    if layouts[1] != {"headerlength": 128, "framesize": 4, "datalength": 4 * 30, "framespersecond": 30}:
+        return "fail"
+    if "error" not in layouts[2]:
+        return "fail"
+    return "pass"
+
+def run_tests():
+    print("Test 1: " + test1())
+    print("Test 2: " + test2())
+    print("Test 3: " + test3())
+    print("Test 4: " + test4())
+    print("Test 5: " + test5())
+    print("Test 6: " + test6())
+    print("Test 7: " + test7())
+    print("Test 8: " + test8())
+    print("Test 9: " + test9())
+    print("Test 10: " + test10())
+    print("Test 11: " + test11())
+    print("Test 12: " + test12())
+    print("Test 13: " + test13())
+    print("Test 14: " + test14())
+    print("Test 15: " + test15())
+    print("Test 16: " + test16())
+
+if __name__ == "__main__":
+    run_tests()